@@ -6,12 +6,34 @@
 записи в базе данных для всех основных сущностей системы.
 """
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Doctor, StudyType, Schedule, Study
+from .models import Doctor, StudyType, Schedule, Study, RotationTemplate
+from .reference import invalidate_reference_data
+from .rotations import allocate_schedule_ids, lock_schedules
+
+
+class ReferenceDataAdminMixin:
+    """
+    Сбрасывает справочник врачей и типов в памяти процессов после изменений
+    через админку (включая редактирование прямо в списке и массовое удаление).
+    """
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_reference_data()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_reference_data()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_reference_data()
 
 
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(ReferenceDataAdminMixin, admin.ModelAdmin):
     """
     Настройка админки для модели Врач.
     """
@@ -39,7 +61,7 @@ class DoctorAdmin(admin.ModelAdmin):
 
 
 @admin.register(StudyType)
-class StudyTypeAdmin(admin.ModelAdmin):
+class StudyTypeAdmin(ReferenceDataAdminMixin, admin.ModelAdmin):
     """
     Настройка админки для типов исследований.
     """
@@ -70,6 +92,23 @@ class ScheduleAdmin(admin.ModelAdmin):
     def is_day_off_status(self, obj):
         return bool(obj.is_day_off)
 
+    def save_model(self, request, obj, form, change):
+        # У schedules нет последовательности: id новой строки выделяется под блокировкой
+        with transaction.atomic():
+            if obj.id is None:
+                lock_schedules()
+                obj.id = allocate_schedule_ids(1)[0]
+            super().save_model(request, obj, form, change)
+
+
+@admin.register(RotationTemplate)
+class RotationTemplateAdmin(admin.ModelAdmin):
+    """
+    Настройка админки для шаблонов графиков смен.
+    """
+    list_display = ('name', 'pattern', 'day_start', 'day_end', 'night_start', 'night_end', 'planned_up')
+    search_fields = ('name',)
+
 
 @admin.register(Study)
 class StudyAdmin(admin.ModelAdmin):
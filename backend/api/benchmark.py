@@ -0,0 +1,319 @@
+"""
+Модуль нагрузочных замеров API.
+
+Выполняет запросы ко всем эндпоинтам api/urls.py внутри процесса (через
+тестовый клиент Django, без сетевого сервера) и для каждого собирает
+перцентили времени ответа, количество и время SQL-запросов и размер
+ответа. Результаты сохраняются в JSON, чтобы прогоны можно было сравнить
+и поймать регрессию.
+
+Изменяющие эндпоинты вызываются идемпотентно: назначение исследования
+тому же врачу, статус, который уже стоит, автораспределение в режиме
+dry_run. Push-канал events/ бесконечен и в замеры не входит.
+"""
+
+import json
+import platform
+import time
+from datetime import timedelta
+from statistics import mean, median
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from . import urls as api_urls
+from .metrics import count_queries
+from .models import RotationTemplate, Schedule, Study
+from .reference import reference_data
+
+# Эндпоинты, которые не замеряются, и причина
+EXCLUDED_URL_NAMES = {
+    "events": "бесконечный поток SSE, работает только под ASGI",
+    "metrics": "служебный эндпоинт метрик",
+    "study-claim-next": "назначает исследование из очереди, неидемпотентен",
+    "schedule-accept-plan": "записывает расписание, путь записи тот же, что у rotation-template-apply",
+    "study-ingest": "добавляет исследования в базу, скорость загрузки — командой ingest_studies",
+}
+# Пакет для пакетных эндпоинтов
+BULK_SAMPLE_SIZE = 100
+
+
+def url_names(patterns=None):
+    """Имена всех маршрутов api/urls.py."""
+    names = set()
+    for pattern in api_urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def percentile(values, q):
+    """Перцентиль q (0..100) с линейной интерполяцией."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def benchmark_endpoints(include_writes=True):
+    """
+    Список замеров: словари name (имя маршрута), label, method, url, body.
+
+    Параметры подставляются из текущих данных базы.
+    """
+    today = timezone.localdate()
+    month_start = today.replace(day=1).isoformat()
+    week_end = (today + timedelta(days=6)).isoformat()
+    study = Study.objects.order_by("-created_at").first()
+    confirmed = list(
+        Study.objects.filter(status="confirmed", diagnostician_id__isnull=False)
+        .order_by("-created_at")
+        .values_list("id", "diagnostician_id")[:BULK_SAMPLE_SIZE]
+    )
+    queued = (
+        Study.objects.filter(diagnostician_id__isnull=True, created_at__isnull=False)
+        .values_list("id", flat=True)
+        .first()
+    )
+    schedule = Schedule.objects.order_by("-work_date").first()
+    template = RotationTemplate.objects.first()
+
+    def endpoint(name, method="get", args=None, query="", body=None, label=None):
+        return {
+            "name": name,
+            "label": label or name,
+            "method": method,
+            "url": reverse(name, args=args) + query,
+            "body": body,
+        }
+
+    endpoints = [
+        endpoint("api-root"),
+        endpoint("doctor-list"),
+        endpoint("doctor-detail", args=[confirmed[0][1]] if confirmed else [1]),
+        endpoint("doctor-with-load"),
+        endpoint(
+            "doctor-with-load",
+            query=f"?date_from={month_start}&date_to={today.isoformat()}",
+            label="doctor-with-load (range)",
+        ),
+        endpoint("doctor-export-loads"),
+        endpoint("study-type-list"),
+        endpoint("study-type-detail", args=[study.study_type_id or 1] if study else [1]),
+        endpoint("schedule-list", query=f"?date_from={today.isoformat()}"),
+        endpoint("schedule-detail", args=[schedule.id] if schedule else [1]),
+        endpoint("schedule-by-date", query=f"?date={today.isoformat()}"),
+        endpoint("schedule-week-grid"),
+        endpoint("schedule-sync"),
+        endpoint("rotation-template-list"),
+        endpoint("rotation-template-detail", args=[template.id] if template else [1]),
+        endpoint("study-list", query="?page_size=100", label="study-list (page)"),
+        endpoint(
+            "study-list", query="?page_size=100&layout=flat", label="study-list (flat page)"
+        ),
+        endpoint("study-detail", args=[study.id] if study else [1]),
+        endpoint("study-pending", query="?page_size=100", label="study-pending (page)"),
+        endpoint("study-pending", label="study-pending (full)"),
+        endpoint("study-cito"),
+        endpoint("study-asap"),
+        endpoint("study-queue", query="?limit=100", label="study-queue (top 100)"),
+        endpoint("study-queue-position", args=[queued or 1]),
+        endpoint("study-sla"),
+        endpoint("study-export", query=f"?date_from={today.isoformat()}"),
+        endpoint("study-sync"),
+        endpoint(
+            "study-auto-distribute",
+            method="post",
+            body={"dry_run": True},
+            label="study-auto-distribute (dry_run)",
+        ),
+        endpoint(
+            "study-rebalance",
+            method="post",
+            body={"dry_run": True},
+            label="study-rebalance (dry_run)",
+        ),
+        endpoint(
+            "rotation-template-apply",
+            method="post",
+            args=[template.id] if template else [1],
+            body={
+                "date_from": month_start,
+                "date_to": today.isoformat(),
+                "doctor_ids": [doctor.id for doctor in reference_data().doctor_list(True)],
+                "dry_run": True,
+            },
+            label="rotation-template-apply (dry_run)",
+        ),
+        endpoint(
+            "schedule-optimize",
+            method="post",
+            body={"date_from": today.isoformat(), "date_to": week_end},
+            label="schedule-optimize (week)",
+        ),
+        endpoint("dashboard-stats"),
+        endpoint("chart-data"),
+        endpoint("forecast"),
+        endpoint(
+            "chart-data",
+            query=f"?date_from={today.replace(year=today.year - 1).isoformat()}"
+            f"&date_to={today.isoformat()}&granularity=week&breakdown=modality",
+            label="chart-data (year by week, modality)",
+        ),
+        endpoint("reports"),
+        endpoint(
+            "reports",
+            query=f"?date_from={today.replace(year=today.year - 1).isoformat()}"
+            f"&date_to={today.isoformat()}",
+            label="reports (year)",
+        ),
+    ]
+
+    if include_writes and confirmed:
+        study_id, doctor_id = confirmed[0]
+        endpoints += [
+            endpoint(
+                "study-assign", "post", args=[study_id], body={"doctor_id": doctor_id}
+            ),
+            endpoint(
+                "study-update-status", "put", args=[study_id], body={"status": "confirmed"}
+            ),
+            endpoint(
+                "study-bulk-assign",
+                "post",
+                body={
+                    "assignments": [
+                        {"study_id": study_id, "doctor_id": doctor_id}
+                        for study_id, doctor_id in confirmed
+                    ]
+                },
+            ),
+            endpoint(
+                "study-bulk-update-status",
+                "post",
+                body={
+                    "updates": [
+                        {"study_id": study_id, "status": "confirmed"}
+                        for study_id, _ in confirmed
+                    ]
+                },
+            ),
+        ]
+    return endpoints
+
+
+def _request(client, endpoint):
+    method = getattr(client, endpoint["method"])
+    if endpoint["body"] is None:
+        response = method(endpoint["url"])
+    else:
+        response = method(
+            endpoint["url"], json.dumps(endpoint["body"]), content_type="application/json"
+        )
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def measure(client, endpoint, repeat=20, warmup=2):
+    """Замер одного эндпоинта: перцентили (мс), SQL-запросы и размер ответа."""
+    for _ in range(warmup):
+        _request(client, endpoint)
+
+    latencies, query_counts, query_times = [], [], []
+    for _ in range(repeat):
+        # count_queries учитывает и запросы из пула асинхронных представлений
+        with count_queries() as queries:
+            started = time.perf_counter()
+            status, size = _request(client, endpoint)
+            latencies.append((time.perf_counter() - started) * 1000)
+        query_counts.append(queries.count)
+        query_times.append(queries.seconds * 1000)
+
+    return {
+        "name": endpoint["name"],
+        "method": endpoint["method"].upper(),
+        "url": endpoint["url"],
+        "status": status,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p90": round(percentile(latencies, 90), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+            "mean": round(mean(latencies), 2),
+        },
+        "queries": median(query_counts),
+        "query_time_ms": round(median(query_times), 2),
+        "payload_bytes": size,
+    }
+
+
+def run_benchmark(repeat=20, warmup=2, include_writes=True, log=lambda message: None):
+    """
+    Замеряет все эндпоинты и возвращает результат прогона для сохранения в JSON.
+    """
+    client = Client()
+    endpoints = benchmark_endpoints(include_writes)
+
+    results = {}
+    # Тестовый клиент обращается к хосту testserver
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+        for endpoint in endpoints:
+            result = measure(client, endpoint, repeat, warmup)
+            results[endpoint["label"]] = result
+            log(
+                f"{endpoint['label']}: p50 {result['latency_ms']['p50']} мс, "
+                f"p95 {result['latency_ms']['p95']} мс, запросов {result['queries']}, "
+                f"{result['payload_bytes']} байт"
+            )
+
+    covered = {endpoint["name"] for endpoint in endpoints}
+    return {
+        "started_at": timezone.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "postgresql": connection.pg_version,
+        },
+        "repeat": repeat,
+        "endpoints": results,
+        "not_measured": {
+            name: EXCLUDED_URL_NAMES.get(name, "нет замера")
+            for name in sorted(url_names() - covered)
+        },
+    }
+
+
+def compare_runs(previous, current, threshold=0.2):
+    """
+    Регрессии текущего прогона относительно предыдущего.
+
+    Регрессия — рост p95 более чем на threshold (доля) или рост числа
+    SQL-запросов. Возвращает список строк с описанием.
+    """
+    regressions = []
+    for label, result in current["endpoints"].items():
+        before = previous["endpoints"].get(label)
+        if before is None:
+            continue
+        p95_before = before["latency_ms"]["p95"]
+        p95_after = result["latency_ms"]["p95"]
+        if p95_before and p95_after > p95_before * (1 + threshold):
+            regressions.append(f"{label}: p95 {p95_before} -> {p95_after} мс")
+        if result["queries"] > before["queries"]:
+            regressions.append(
+                f"{label}: SQL-запросов {before['queries']} -> {result['queries']}"
+            )
+    return regressions
@@ -0,0 +1,178 @@
+"""
+Модуль пакетных изменений исследований.
+
+Назначение врачей и смена статусов для списка исследований выполняются
+одним UPDATE ... FROM unnest(...) в рамках одной транзакции. Обновляются
+только изменяемые колонки, а строки, в которых ничего не меняется,
+не трогаются вовсе. Назначаются только исследования в статусах
+ASSIGNABLE_STATUSES — подписанное не переоткрывается, как и при
+назначении одного исследования. По каждому элементу пакета возвращается
+результат.
+"""
+
+from django.db import connection, transaction
+
+from .loads import doctors_with_load, month_bounds
+from .models import ASSIGNABLE_STATUSES, Study
+from .reference import reference_data, reload_reference_data
+
+# Максимальный размер одного пакета
+BULK_MAX_ITEMS = 10000
+
+ASSIGN_SQL = """
+    UPDATE studies
+    SET diagnostician_id = batch.doctor_id, status = 'confirmed'
+    FROM unnest(%s::integer[], %s::integer[]) AS batch(study_id, doctor_id),
+         studies AS previous
+    WHERE studies.id = batch.study_id
+      AND previous.id = batch.study_id
+      AND studies.status = ANY(%s::varchar[])
+      AND (studies.diagnostician_id IS DISTINCT FROM batch.doctor_id
+           OR studies.status IS DISTINCT FROM 'confirmed')
+      {extra}
+    RETURNING studies.id, previous.diagnostician_id
+"""
+
+STATUS_SQL = """
+    UPDATE studies
+    SET status = batch.status
+    FROM unnest(%s::integer[], %s::varchar[]) AS batch(study_id, status)
+    WHERE studies.id = batch.study_id
+      AND studies.status IS DISTINCT FROM batch.status
+    RETURNING studies.id, studies.diagnostician_id
+"""
+
+
+def assign_studies(pairs, only_unassigned=False):
+    """
+    Назначает исследования врачам одним запросом.
+
+    pairs — список (study_id, doctor_id). Исследования не в статусах
+    ASSIGNABLE_STATUSES не меняются; при only_unassigned=True не
+    перезаписываются и исследования, у которых уже есть врач.
+    Возвращает словарь {study_id: прежний diagnostician_id} для
+    фактически изменённых строк.
+    """
+    if not pairs:
+        return {}
+    extra = "AND studies.diagnostician_id IS NULL" if only_unassigned else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ASSIGN_SQL.format(extra=extra),
+            [
+                [pair[0] for pair in pairs],
+                [pair[1] for pair in pairs],
+                list(ASSIGNABLE_STATUSES),
+            ],
+        )
+        return dict(cursor.fetchall())
+
+
+def set_statuses(pairs):
+    """
+    Меняет статусы исследований одним запросом.
+
+    pairs — список (study_id, status). Возвращает словарь
+    {study_id: diagnostician_id} для фактически изменённых строк.
+    """
+    if not pairs:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            STATUS_SQL,
+            [[pair[0] for pair in pairs], [pair[1] for pair in pairs]],
+        )
+        return dict(cursor.fetchall())
+
+
+def _affected_loads(doctor_ids):
+    """Нагрузка затронутых врачей за текущий месяц (как в with_load)."""
+    doctor_ids = {doctor_id for doctor_id in doctor_ids if doctor_id is not None}
+    if not doctor_ids:
+        return []
+    start, end = month_bounds()
+    return doctors_with_load(reference_data().doctors_by_ids(sorted(doctor_ids)), start, end)
+
+
+def _existing_studies(study_ids):
+    """Статусы существующих исследований: {study_id: status}."""
+    return dict(Study.objects.filter(id__in=study_ids).values_list("id", "status"))
+
+
+def bulk_assign(items):
+    """
+    Пакетное назначение исследований врачам.
+
+    items — список (study_id, doctor_id); при повторе study_id действует
+    последняя пара. Результат по элементу: assigned, unchanged,
+    study_not_found, doctor_not_found или not_assignable (исследование
+    уже подписано).
+    """
+    batch = dict(items)
+    requested = set(batch.values())
+    known_doctors = requested & reference_data().doctors.keys()
+    if known_doctors != requested:
+        # Врача могли добавить в базу в обход API — перечитываем справочник
+        known_doctors = requested & reload_reference_data().doctors.keys()
+
+    with transaction.atomic():
+        updated = assign_studies(
+            [
+                (study_id, doctor_id)
+                for study_id, doctor_id in batch.items()
+                if doctor_id in known_doctors
+            ]
+        )
+        existing = _existing_studies(set(batch) - set(updated))
+
+    results = []
+    for study_id, doctor_id in batch.items():
+        if study_id in updated:
+            result = "assigned"
+        elif study_id not in existing:
+            result = "study_not_found"
+        elif doctor_id not in known_doctors:
+            result = "doctor_not_found"
+        elif existing[study_id] not in ASSIGNABLE_STATUSES:
+            result = "not_assignable"
+        else:
+            result = "unchanged"
+        results.append({"study_id": study_id, "doctor_id": doctor_id, "result": result})
+
+    affected = set(updated.values()) | {batch[study_id] for study_id in updated}
+    return {
+        "updated": len(updated),
+        "results": results,
+        "doctors": _affected_loads(affected),
+    }
+
+
+def bulk_update_status(items):
+    """
+    Пакетная смена статусов исследований.
+
+    items — список (study_id, status); при повторе study_id действует
+    последняя пара. Результат по элементу: updated, unchanged или
+    study_not_found.
+    """
+    batch = dict(items)
+
+    with transaction.atomic():
+        updated = set_statuses(list(batch.items()))
+        existing = _existing_studies(set(batch) - set(updated))
+
+    results = []
+    for study_id, status in batch.items():
+        if study_id in updated:
+            result = "updated"
+        elif study_id in existing:
+            result = "unchanged"
+        else:
+            result = "study_not_found"
+        results.append({"study_id": study_id, "status": status, "result": result})
+
+    return {
+        "updated": len(updated),
+        "results": results,
+        "doctors": _affected_loads(updated.values()),
+    }
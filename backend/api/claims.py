@@ -0,0 +1,142 @@
+"""
+Модуль захвата исследований из очереди.
+
+Врач (или координатор за него) забирает следующее подходящее ему
+исследование очереди:
+- подходят только исследования модальностей врача, вес которых (УП типа)
+  помещается в остаток его ёмкости на день — как в автораспределении
+  (api.distribution): ёмкость смены минус набранные за день УП;
+- из подходящих берётся первое в порядке очереди с учётом SLA
+  (api.priority_queue).
+
+Захват выполняется одной транзакцией. Смена врача на день блокируется
+(SELECT ... FOR UPDATE), поэтому параллельные захваты одного врача идут
+по очереди и не превышают его ёмкость. Кандидаты читаются из очереди
+с FOR UPDATE SKIP LOCKED: строки, которые в этот момент захватывает
+кто-то другой, пропускаются без ожидания, так что параллельные вызовы
+получают разные исследования и не блокируют друг друга.
+
+Назначение — условный UPDATE (только если у исследования по-прежнему
+ожидаемый врач), поэтому устаревшее изменение отклоняется, а не
+перезаписывает чужое. Подписанное исследование не назначается заново
+ни условно, ни безусловно: UPDATE проверяет и статус.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import assign_studies
+from .distribution import shift_capacity
+from .loads import date_window, doctor_loads
+from .models import ASSIGNABLE_STATUSES, Schedule, Study
+from .priority_queue import pending_queue, queue_key, sla_targets
+from .reference import reference_data, reload_reference_data
+
+
+# expected_doctor_id для назначения без проверки текущего врача
+ANY_DOCTOR = object()
+
+
+def compare_and_assign(study_id, doctor_id, expected_doctor_id=ANY_DOCTOR):
+    """
+    Назначает исследование врачу doctor_id, только если оно ещё не подписано
+    и сейчас у него врач expected_doctor_id (None — исследование не
+    назначено, ANY_DOCTOR — любой врач).
+
+    Возвращает True, если назначение выполнено.
+    """
+    studies = Study.objects.filter(id=study_id, status__in=ASSIGNABLE_STATUSES)
+    if expected_doctor_id is not ANY_DOCTOR:
+        studies = studies.filter(diagnostician_id=expected_doctor_id)
+    return bool(studies.update(diagnostician_id=doctor_id, status="confirmed"))
+
+
+def claim_next(doctor_id, work_date=None, now=None):
+    """
+    Назначает врачу следующее подходящее исследование очереди.
+
+    Возвращает словарь с result: claimed (и study_id, срок SLA, ёмкость
+    смены), no_shift (у врача нет смены в work_date), no_modality (нет
+    типов исследований его модальностей), no_capacity (ни одно
+    исследование не помещается в остаток ёмкости) или queue_empty.
+    Неизвестный или неактивный врач — ValueError.
+    """
+    work_date = work_date or timezone.localdate()
+    now = now or timezone.now()
+    reference = reference_data()
+    if doctor_id not in reference.doctors:
+        # Врача могли добавить в базу в обход API — перечитываем справочник
+        reference = reload_reference_data()
+    doctor = reference.doctors.get(doctor_id)
+    if doctor is None:
+        raise ValueError(f"Unknown doctor: {doctor_id}")
+    if not doctor.is_active:
+        raise ValueError(f"Doctor {doctor_id} is not active")
+
+    modalities = reference.doctor_modalities[doctor_id]
+    study_types = {
+        study_type_id: float(reference.study_type_up[study_type_id])
+        for study_type_id, modality in reference.study_type_modality.items()
+        if modality in modalities
+    }
+    if not study_types:
+        return {"result": "no_modality"}
+
+    with transaction.atomic():
+        # Смена блокируется до конца транзакции: параллельные захваты
+        # одного врача выполняются по очереди и видят набранные УП друг друга
+        shifts = list(
+            Schedule.objects.select_for_update()
+            .filter(doctor_id=doctor_id, work_date=work_date, is_day_off=0)
+            .order_by("time_start")
+            .values_list("planned_up", flat=True)
+        )
+        if not shifts:
+            return {"result": "no_shift"}
+
+        capacity = shift_capacity(doctor, shifts[0])
+        load = doctor_loads(*date_window(work_date, work_date), doctor_ids=[doctor_id])
+        used = float(load.get(doctor_id, {}).get("total_up", 0))
+        fitting = [
+            study_type_id
+            for study_type_id, up_value in study_types.items()
+            if up_value <= capacity - used
+        ]
+        if not fitting:
+            return {"result": "no_capacity", "capacity_up": capacity, "used_up": used}
+
+        # Голова каждого ранга среди подходящих исследований; строки, которые
+        # сейчас захватывают другие, пропускаются (SKIP LOCKED)
+        targets = sla_targets()
+        candidates = []
+        for rank in targets:
+            head = (
+                pending_queue()
+                .filter(priority_rank=rank, study_type_id__in=fitting)
+                .order_by("created_at", "id")
+                .select_for_update(skip_locked=True)
+                .values_list("created_at", "id", "study_type_id")
+                .first()
+            )
+            if head is not None:
+                created_at, study_id, study_type_id = head
+                candidates.append(
+                    (queue_key(rank, created_at, study_id, targets, now), study_type_id)
+                )
+        if not candidates:
+            return {"result": "queue_empty"}
+
+        (_, due_at, rank, _, study_id), study_type_id = min(candidates)
+        # Строка заблокирована этой транзакцией, условие — страховка
+        assign_studies([(study_id, doctor_id)], only_unassigned=True)
+
+    used += study_types[study_type_id]
+    return {
+        "result": "claimed",
+        "study_id": study_id,
+        "priority_rank": rank,
+        "sla_due_at": timezone.localtime(due_at),
+        "overdue": due_at < now,
+        "capacity_up": capacity,
+        "used_up": round(used, 2),
+    }
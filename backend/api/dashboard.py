@@ -0,0 +1,110 @@
+"""
+Модуль снимков статистики дашборда.
+
+Показатели дашборда считаются двумя независимыми запросами к studies
+с условной агрегацией — счётчики за период и количество активных врачей
+за месяц, — которые выполняются одновременно в пуле соединений
+(api/parallel.py). Результат сохраняется в кэше Django как снимок,
+привязанный к месяцу или конкретной дате. Снимки помечены номером версии: любое
+изменение исследования через API увеличивает версию, и следующий запрос
+пересчитывает снимок один раз для всех открытых дашбордов.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .loads import ACTIVE_STATUSES, date_window, month_bounds
+from .models import Study
+from .parallel import run_parallel
+
+VERSION_KEY = "dashboard_stats:version"
+
+
+def stats_version():
+    """Текущая версия статистики (растёт при каждом изменении исследований)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add() не перезапишет версию, если её успел создать другой процесс
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_dashboard_stats():
+    """Сбрасывает все снимки дашборда (вызывается при изменении исследований)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def stat_queries(date=None):
+    """
+    Независимые запросы статистики за текущий месяц или за конкретную дату:
+    функции без аргументов, каждая возвращает словарь показателей.
+    """
+    month_start, _ = month_bounds()
+    month = Q(created_at__gte=month_start)
+    window = month
+    if date:
+        # Диапазон вместо created_at::date, чтобы работал индекс по created_at
+        day_start, day_end = date_window(date, date)
+        window = Q(created_at__gte=day_start, created_at__lt=day_end)
+
+    counters = Study.objects.filter(window)
+    return [
+        partial(
+            counters.aggregate,
+            total_studies=Count("id"),
+            completed_studies=Count("id", filter=Q(status="signed")),
+            pending_studies=Count(
+                "id",
+                filter=Q(status__in=ACTIVE_STATUSES, diagnostician_id__isnull=False),
+            ),
+            cito_studies=Count("id", filter=Q(priority="cito")),
+            asap_studies=Count("id", filter=Q(priority="asap")),
+        ),
+        # Врачи, которые были активны в этом месяце
+        partial(
+            Study.objects.filter(month).aggregate,
+            active_doctors=Count("diagnostician_id", distinct=True),
+        ),
+    ]
+
+
+async def compute_dashboard_stats(date=None):
+    """Статистика дашборда: запросы stat_queries выполняются одновременно."""
+    stats = {}
+    for part in await run_parallel(*stat_queries(date)):
+        stats.update(part)
+
+    active_doctors = stats["active_doctors"]
+    stats["avg_load_per_doctor"] = (
+        int(stats["pending_studies"] / active_doctors * 1.5) if active_doctors else 0
+    )
+    return stats
+
+
+async def dashboard_snapshot(date=None):
+    """
+    Снимок статистики из кэша; при отсутствии — пересчёт и сохранение.
+
+    К показателям добавляются computed_at (момент расчёта) и age_seconds
+    (возраст снимка на момент ответа).
+    """
+    scope = date.isoformat() if date else "month:" + month_bounds()[0].strftime("%Y-%m")
+    key = f"dashboard_stats:{await sync_to_async(stats_version)()}:{scope}"
+
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await compute_dashboard_stats(date)
+        snapshot["computed_at"] = timezone.now()
+        await cache.aset(key, snapshot, timeout=settings.DASHBOARD_STATS_TTL)
+
+    age = (timezone.now() - snapshot["computed_at"]).total_seconds()
+    return {**snapshot, "age_seconds": round(age, 1)}
@@ -0,0 +1,262 @@
+"""
+Модуль автоматического распределения исследований.
+
+Берёт всю очередь ожидающих исследований (без врача) и за один проход
+распределяет её между врачами, работающими в указанный день:
+- исследование назначается только врачу с подходящей модальностью
+  (Doctor.modality содержит StudyType.modality);
+- учитывается остаток ёмкости врача на день: planned_up из расписания
+  (или max_up_per_day) минус уже набранные за день УП;
+- очередь обрабатывается в порядке CITO → ASAP → плановые, внутри
+  приоритета — сначала старые;
+- среди подходящих врачей выбирается наименее загруженный (в долях от
+  ёмкости), поэтому нагрузка выравнивается.
+
+Для каждой модальности держится куча врачей по доле загрузки, так что
+проход по N исследованиям и D врачам стоит порядка N·log D. Результат
+применяется одним UPDATE на весь план.
+"""
+
+import heapq
+from collections import defaultdict
+from statistics import mean, pstdev
+
+from django.db import transaction
+from django.db.models import F
+
+from .bulk import assign_studies
+from .loads import date_window, doctor_loads, norm_up_for
+from .models import PRIORITY_RANK, Schedule, Study
+from .reference import reference_data, reload_reference_data
+
+
+def pending_queue():
+    """
+    Очередь ожидающих исследований в порядке обработки.
+
+    Возвращает кортежи (id, priority, modality, up_value) — только нужные
+    колонки, без создания объектов моделей. Модальность и вес типа
+    исследования берутся из справочника, без соединения с study_types.
+    """
+    rows = list(
+        Study.objects.filter(diagnostician_id__isnull=True)
+        .order_by(F("created_at").asc(nulls_last=True), "id")
+        .values_list("id", "priority", "study_type_id")
+        .iterator(chunk_size=5000)
+    )
+    reference = reference_data()
+    if any(
+        study_type_id is not None and study_type_id not in reference.study_types
+        for _, _, study_type_id in rows
+    ):
+        reference = reload_reference_data()
+
+    modality = reference.study_type_modality
+    up_value = reference.study_type_up
+    queue = [
+        (
+            study_id,
+            priority,
+            modality.get(study_type_id),
+            float(up_value.get(study_type_id, 0)),
+        )
+        for study_id, priority, study_type_id in rows
+    ]
+    # Сортировка устойчивая: внутри приоритета сохраняется порядок по created_at
+    queue.sort(key=lambda row: PRIORITY_RANK.get(row[1], PRIORITY_RANK["normal"]))
+    return queue
+
+
+def shift_capacity(doctor, planned_up):
+    """Ёмкость врача на смену, УП: planned_up смены или его дневной максимум."""
+    return float(planned_up or doctor.max_up_per_day or norm_up_for(doctor.position_type))
+
+
+def working_doctors(work_date):
+    """
+    Врачи, работающие в указанный день, с ёмкостью и текущей нагрузкой.
+
+    Возвращает словарь {doctor_id: {...}} с полями fio_alias, modality,
+    capacity и used (УП, уже набранные за день).
+    """
+    schedules = list(
+        Schedule.objects.filter(work_date=work_date, is_day_off=0)
+        .order_by("doctor_id", "time_start")
+        .values_list("doctor_id", "planned_up")
+    )
+    reference = reference_data()
+    if any(doctor_id not in reference.doctors for doctor_id, _ in schedules):
+        reference = reload_reference_data()
+
+    doctors = {}
+    for doctor_id, planned_up in schedules:
+        doctor = reference.doctors.get(doctor_id)
+        if doctor is None or not doctor.is_active or doctor.id in doctors:
+            continue
+        doctors[doctor.id] = {
+            "fio_alias": doctor.fio_alias or f"Врач {doctor.id}",
+            "modality": set(reference.doctor_modalities[doctor.id]),
+            "capacity": shift_capacity(doctor, planned_up),
+            "used": 0.0,
+        }
+
+    start, end = date_window(work_date, work_date)
+    for doctor_id, load in doctor_loads(start, end, doctor_ids=list(doctors)).items():
+        doctors[doctor_id]["used"] = float(load["total_up"])
+    return doctors
+
+
+def build_plan(queue, doctors):
+    """
+    Распределяет очередь между врачами, не обращаясь к базе данных.
+
+    Изменяет поле used у врачей и возвращает пару (plan, skipped):
+    plan — список (study_id, doctor_id, up_value, priority),
+    skipped — словарь {причина: количество}.
+    """
+    heaps = defaultdict(list)
+    for doctor_id, doctor in doctors.items():
+        if doctor["capacity"] <= 0:
+            continue
+        for modality in doctor["modality"]:
+            heaps[modality].append((doctor["used"] / doctor["capacity"], doctor_id))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    # Врачи, у которых остаток меньше самого лёгкого исследования очереди,
+    # больше никому не подходят и убираются из куч насовсем
+    min_up = min((row[3] for row in queue), default=0)
+
+    plan = []
+    skipped = defaultdict(int)
+    for study_id, priority, modality, up_value in queue:
+        heap = heaps.get(modality)
+        if not heap:
+            skipped["no_doctor_for_modality"] += 1
+            continue
+
+        # Достаём врачей по возрастанию загрузки, пока не найдём того,
+        # у кого хватает остатка; устаревшие записи кучи отбрасываем.
+        deferred = []
+        chosen = None
+        while heap:
+            ratio, doctor_id = heapq.heappop(heap)
+            doctor = doctors[doctor_id]
+            if ratio != doctor["used"] / doctor["capacity"]:
+                continue
+            remaining = doctor["capacity"] - doctor["used"]
+            if remaining >= up_value:
+                chosen = doctor_id
+                break
+            if remaining >= min_up:
+                deferred.append((ratio, doctor_id))
+        for entry in deferred:
+            heapq.heappush(heap, entry)
+
+        if chosen is None:
+            skipped["no_capacity"] += 1
+            continue
+
+        doctor = doctors[chosen]
+        doctor["used"] += up_value
+        ratio = doctor["used"] / doctor["capacity"]
+        for doctor_modality in doctor["modality"]:
+            if doctor_modality in heaps:
+                heapq.heappush(heaps[doctor_modality], (ratio, chosen))
+        plan.append((study_id, chosen, up_value, priority))
+
+    return plan, dict(skipped)
+
+
+def balance_stats(doctors):
+    """Показатели равномерности загрузки врачей (в процентах от ёмкости)."""
+    percentages = [
+        doctor["used"] / doctor["capacity"] * 100
+        for doctor in doctors.values()
+        if doctor["capacity"] > 0
+    ]
+    if not percentages:
+        return {"doctors": 0}
+    avg = mean(percentages)
+    return {
+        "doctors": len(percentages),
+        "min_load_percentage": round(min(percentages), 1),
+        "max_load_percentage": round(max(percentages), 1),
+        "avg_load_percentage": round(avg, 1),
+        "stdev_load_percentage": round(pstdev(percentages), 1),
+        "variation": round(pstdev(percentages) / avg, 3) if avg else 0,
+    }
+
+
+def apply_plan(plan):
+    """
+    Назначает исследования по плану одним UPDATE.
+
+    Исследования, которые успели назначить параллельно, не трогаются.
+    Возвращает множество id фактически назначенных исследований.
+    """
+    with transaction.atomic():
+        updated = assign_studies(
+            [(row[0], row[1]) for row in plan], only_unassigned=True
+        )
+    return set(updated)
+
+
+def auto_distribute(work_date, dry_run=True):
+    """
+    Автоматическое распределение очереди ожидающих исследований.
+
+    При dry_run=True только возвращает предлагаемый план; иначе применяет
+    его. Ответ содержит план, причины пропуска и статистику баланса
+    нагрузки до и после распределения.
+    """
+    doctors = working_doctors(work_date)
+    before = balance_stats(doctors)
+    queue = pending_queue()
+    plan, skipped = build_plan(queue, doctors)
+
+    if not dry_run:
+        applied = apply_plan(plan)
+        conflicts = len(plan) - len(applied)
+        if conflicts:
+            skipped["already_assigned"] = conflicts
+        # Откатываем нагрузку по исследованиям, которые назначить не удалось
+        for study_id, doctor_id, up_value, _ in plan:
+            if study_id not in applied:
+                doctors[doctor_id]["used"] -= up_value
+        plan = [row for row in plan if row[0] in applied]
+
+    per_doctor = defaultdict(lambda: {"studies": 0, "up": 0.0})
+    for _, doctor_id, up_value, _ in plan:
+        per_doctor[doctor_id]["studies"] += 1
+        per_doctor[doctor_id]["up"] += up_value
+
+    return {
+        "date": work_date,
+        "dry_run": dry_run,
+        "queue_size": len(queue),
+        "assigned": len(plan),
+        "skipped": skipped,
+        "plan": [
+            {
+                "study_id": study_id,
+                "doctor_id": doctor_id,
+                "up_value": up_value,
+                "priority": priority,
+            }
+            for study_id, doctor_id, up_value, priority in plan
+        ],
+        "doctors": [
+            {
+                "id": doctor_id,
+                "fio_alias": doctor["fio_alias"],
+                "capacity": doctor["capacity"],
+                "load": round(doctor["used"], 3),
+                "assigned_studies": per_doctor[doctor_id]["studies"],
+                "assigned_up": round(per_doctor[doctor_id]["up"], 3),
+            }
+            for doctor_id, doctor in doctors.items()
+        ],
+        "balance_before": before,
+        "balance_after": balance_stats(doctors),
+    }
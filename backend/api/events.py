@@ -0,0 +1,204 @@
+"""
+Модуль событий для push-канала (Server-Sent Events через ASGI).
+
+Изменения очереди и нагрузки публикуются небольшими событиями
+(«исследование назначено врачу», «нагрузка врача изменилась»,
+«поступило CITO-исследование») после фиксации транзакции.
+
+Доставка между процессами идёт через PostgreSQL LISTEN/NOTIFY
+(EVENTS_BACKEND = "postgres"): publish() выполняет pg_notify, а в каждом
+процессе с подключёнными клиентами фоновый поток слушает канал и
+раздаёт события локальным подписчикам. При EVENTS_BACKEND = "local"
+события раздаются только внутри процесса (один воркер, разработка).
+Внешние системы могут публиковать события тем же NOTIFY в канал
+EVENTS_CHANNEL. Событие study_created в режиме postgres отправляет сама
+база — триггер на INSERT в studies (миграция 0004), поэтому оно приходит
+и для исследований, которые РИС вставляет напрямую.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "rad_events"
+# Сколько событий держать для одного медленного клиента
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Крупные пакеты заменяются одним событием queue_changed
+# (тот же порог в триггере studies_notify_created)
+MAX_EVENTS_PER_BATCH = 500
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener = None
+
+
+def _json_default(value):
+    # Decimal (УП) отдаём числом, как это делает JSON-рендерер DRF
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _deliver(queue, event):
+    """Кладёт событие в очередь подписчика (выполняется в его event loop)."""
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # Клиент не успевает: сбрасываем накопленное и просим перечитать данные
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({"type": "resync", "data": {}})
+
+
+def dispatch(event):
+    """Раздаёт событие всем подписчикам текущего процесса."""
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+        except RuntimeError:
+            # Цикл событий уже закрыт, подписчик будет удалён при отписке
+            pass
+
+
+def _notify(events):
+    payloads = [json.dumps(event, default=_json_default) for event in events]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            [EVENTS_CHANNEL, payloads],
+        )
+
+
+def publish(events):
+    """
+    Публикует события после фиксации текущей транзакции.
+
+    events — список словарей {"type": ..., "data": {...}}.
+    """
+    events = list(events)
+    if not events:
+        return
+    if len(events) > MAX_EVENTS_PER_BATCH:
+        events = [{"type": "queue_changed", "data": {"count": len(events)}}]
+
+    if settings.EVENTS_BACKEND == "postgres":
+        transaction.on_commit(lambda: _notify(events))
+    else:
+        transaction.on_commit(lambda: [dispatch(event) for event in events])
+
+
+def assignment_events(pairs, loads=()):
+    """События назначения: пары (study_id, doctor_id) и новая нагрузка врачей."""
+    events = [
+        {"type": "study_assigned", "data": {"study_id": study_id, "doctor_id": doctor_id}}
+        for study_id, doctor_id in pairs
+    ]
+    events += [{"type": "doctor_load", "data": entry} for entry in loads]
+    return events
+
+
+def status_events(pairs, loads=()):
+    """События смены статуса: пары (study_id, status) и новая нагрузка врачей."""
+    events = [
+        {"type": "study_status", "data": {"study_id": study_id, "status": status}}
+        for study_id, status in pairs
+    ]
+    events += [{"type": "doctor_load", "data": entry} for entry in loads]
+    return events
+
+
+def created_events(rows):
+    """События поступления: тройки (study_id, priority, study_type_id)."""
+    return [
+        {
+            "type": "study_created",
+            "data": {"study_id": study_id, "priority": priority, "study_type_id": study_type_id},
+        }
+        for study_id, priority, study_type_id in rows
+    ]
+
+
+def publish_created(rows):
+    """
+    Публикует события поступления исследований rows (как в created_events).
+
+    В режиме postgres ничего не делает: такие же события уже отправил
+    триггер на studies, повторная публикация задвоила бы их у клиентов.
+    """
+    if settings.EVENTS_BACKEND != "postgres":
+        publish(created_events(rows))
+
+
+class _PostgresListener(threading.Thread):
+    """Фоновый поток LISTEN на отдельном соединении с базой."""
+
+    daemon = True
+
+    def run(self):
+        import psycopg2
+
+        params = connection.get_connection_params()
+        while True:
+            try:
+                conn = psycopg2.connect(**params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+                self._listen(conn)
+            except Exception:
+                logger.exception("Events listener failed, reconnecting")
+                threading.Event().wait(5)
+
+    def _listen(self, conn):
+        while True:
+            if select.select([conn], [], [], 30) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    dispatch(json.loads(notify.payload))
+                except ValueError:
+                    logger.warning("Skipping malformed event: %s", notify.payload)
+
+
+def _ensure_listener():
+    global _listener
+    if settings.EVENTS_BACKEND != "postgres":
+        return
+    with _subscribers_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = _PostgresListener(name="events-listener")
+            _listener.start()
+
+
+def subscribe():
+    """Регистрирует подписчика в текущем event loop и возвращает его очередь."""
+    _ensure_listener()
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(queue):
+    with _subscribers_lock:
+        for subscriber in list(_subscribers):
+            if subscriber[1] is queue:
+                _subscribers.discard(subscriber)
+
+
+def format_sse(event):
+    """Событие в формате text/event-stream."""
+    data = json.dumps(event.get("data", {}), ensure_ascii=False, default=_json_default)
+    return f"event: {event['type']}\ndata: {data}\n\n"
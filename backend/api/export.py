@@ -0,0 +1,155 @@
+"""
+Модуль потоковой выгрузки данных в CSV и NDJSON.
+
+Строки читаются из базы серверным курсором (QuerySet.iterator) и сразу
+отдаются клиенту через генератор StreamingHttpResponse, поэтому расход
+памяти не зависит от объёма выгрузки. Строки выбираются кортежами через
+values_list, без создания объектов моделей и вложенных сериализаторов.
+
+Под ASGI Django не итерирует синхронный генератор по частям, а собирает
+его целиком (sync_to_async(list)), поэтому там ответ получает асинхронный
+итератор: каждый кусок вычисляется в потоке через sync_to_async, в том же
+потоке, что и представление, — серверный курсор остаётся на своём соединении.
+"""
+
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+# Сколько строк склеивать в один кусок ответа
+CHUNK_ROWS = 1000
+# Размер порции серверного курсора
+CURSOR_CHUNK_SIZE = 2000
+
+# Колонки выгрузки исследований: (заголовок, поле для values_list)
+STUDY_COLUMNS = (
+    ("id", "id"),
+    ("research_number", "research_number"),
+    ("status", "status"),
+    ("priority", "priority"),
+    ("created_at", "created_at"),
+    ("planned_at", "planned_at"),
+    ("study_type_id", "study_type_id"),
+    ("study_type_name", "study_type__name"),
+    ("modality", "study_type__modality"),
+    ("up_value", "study_type__up_value"),
+    ("diagnostician_id", "diagnostician_id"),
+    ("diagnostician_name", "diagnostician__fio_alias"),
+)
+
+LOAD_COLUMNS = (
+    "id",
+    "fio_alias",
+    "position_type",
+    "specialty",
+    "is_active",
+    "max_up_per_day",
+    "current_load",
+    "max_load",
+    "active_studies",
+    "load_percentage",
+)
+
+
+def _plain(value):
+    """Приведение значения к виду, пригодному для CSV/JSON."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([_plain(value) for value in row]))
+        if len(chunk) >= CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _ndjson_lines(header, rows):
+    chunk = []
+    for row in rows:
+        record = {key: _plain(value) for key, value in zip(header, row)}
+        chunk.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(chunk) >= CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+async def _async_chunks(chunks):
+    """Асинхронный итератор по кускам синхронного генератора."""
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Закрывает серверный курсор, если клиент отключился раньше конца
+        await sync_to_async(chunks.close)()
+
+
+def is_asgi(request):
+    """Обрабатывается ли запрос (DRF или Django) под ASGI."""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def streaming_export(header, rows, export_format, filename, asynchronous=False):
+    """
+    Потоковый ответ с выгрузкой.
+
+    rows — любой итерируемый объект кортежей в порядке header;
+    export_format — ключ EXPORT_FORMATS; asynchronous — ответ для ASGI
+    (асинхронный итератор по кускам).
+    """
+    lines = _csv_lines if export_format == "csv" else _ndjson_lines
+    chunks = lines(header, rows)
+    response = StreamingHttpResponse(
+        _async_chunks(chunks) if asynchronous else chunks,
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
+
+
+def export_studies(queryset, export_format, asynchronous=False):
+    """Выгрузка исследований с типом, врачом и статусом."""
+    rows = (
+        queryset.select_related(None)
+        .values_list(*[lookup for _, lookup in STUDY_COLUMNS])
+        .iterator(chunk_size=CURSOR_CHUNK_SIZE)
+    )
+    header = [name for name, _ in STUDY_COLUMNS]
+    return streaming_export(header, rows, export_format, "studies", asynchronous)
+
+
+def export_loads(loads, export_format, asynchronous=False):
+    """Выгрузка сводки нагрузки врачей (строки в формате with_load)."""
+    rows = ([entry[column] for column in LOAD_COLUMNS] for entry in loads)
+    return streaming_export(LOAD_COLUMNS, rows, export_format, "doctor_loads", asynchronous)
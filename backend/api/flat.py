@@ -0,0 +1,87 @@
+"""
+Модуль плоской сериализации списков исследований.
+
+Во вложенном виде (StudyWithDetailsSerializer) для каждой строки заново
+сериализуются врач и тип исследования, хотя в списке повторяются одни и
+те же несколько сотен врачей и типов. В плоском виде строки выбираются
+из базы только нужными колонками через values(), врач и тип в строке
+заданы идентификаторами (как в StudySerializer), а каждый встретившийся
+врач и тип попадает один раз в раздел included — готовое представление
+берётся из справочника в памяти (api.reference), без запросов к базе:
+
+    {
+        "results": [{"id": 1, ..., "study_type": 3, "diagnostician": 7}],
+        "included": {"study_types": {"3": {...}}, "doctors": {"7": {...}}}
+    }
+"""
+
+from rest_framework import serializers
+
+from .reference import reference_data, reload_reference_data
+
+# Колонки строки в плоском виде (совпадают с полями StudySerializer)
+STUDY_FIELDS = (
+    "id",
+    "research_number",
+    "status",
+    "priority",
+    "created_at",
+    "planned_at",
+    "study_type",
+    "diagnostician",
+)
+DATETIME_FIELDS = ("created_at", "planned_at")
+
+# Одно поле на все строки: формат и часовой пояс такие же, как у сериализаторов
+_datetime_field = serializers.DateTimeField()
+
+
+def study_rows(queryset, extra_fields=()):
+    """
+    QuerySet строк для плоского вида.
+
+    extra_fields — дополнительные колонки (например, поля сортировки для
+    курсора пагинации); из ответа их убирает flat_studies.
+    """
+    return queryset.values(*STUDY_FIELDS, *extra_fields)
+
+
+def flat_studies(rows, extra_fields=()):
+    """Строки исследований и раздел included с уникальными врачами и типами."""
+    to_representation = _datetime_field.to_representation
+    study_type_ids = set()
+    doctor_ids = set()
+
+    for row in rows:
+        for field in extra_fields:
+            row.pop(field, None)
+        for field in DATETIME_FIELDS:
+            if row[field] is not None:
+                row[field] = to_representation(row[field])
+        study_type_ids.add(row["study_type"])
+        doctor_ids.add(row["diagnostician"])
+
+    study_type_ids.discard(None)
+    doctor_ids.discard(None)
+    reference = reference_data()
+    if not (
+        study_type_ids <= reference.study_type_repr.keys()
+        and doctor_ids <= reference.doctor_repr.keys()
+    ):
+        reference = reload_reference_data()
+
+    return {
+        "results": rows,
+        "included": {
+            "study_types": {
+                study_type_id: reference.study_type_repr[study_type_id]
+                for study_type_id in study_type_ids
+                if study_type_id in reference.study_type_repr
+            },
+            "doctors": {
+                doctor_id: reference.doctor_repr[doctor_id]
+                for doctor_id in doctor_ids
+                if doctor_id in reference.doctor_repr
+            },
+        },
+    }
@@ -0,0 +1,279 @@
+"""
+Модуль прогноза потока исследований по модальностям.
+
+История — количество исследований и сумма УП по дням (местная дата
+created_at) и модальностям типов исследований за FORECAST_HISTORY_WEEKS
+закрытых недель, до вчерашнего дня включительно. Для каждой модальности
+и дня недели по истории строится взвешенная линейная регрессия по
+номеру недели: свежие недели весят больше (полураспад веса —
+HALF_LIFE_WEEKS), наклон учитывает рост или спад потока. Прогноз на день —
+значение регрессии для его недели, границы — интервал предсказания
+с вероятностью FORECAST_INTERVAL по взвешенному разбросу остатков.
+Все модальности и дни недели считаются разом операциями NumPy над
+массивом «модальность × неделя × день недели».
+
+История и коэффициенты хранятся в кэше Django и обновляются
+инкрементально: когда закрываются новые дни, перечитываются только они
+(и последние REFRESH_OVERLAP_DAYS дней — на случай исследований,
+поступивших задним числом), а не вся история. Полностью история
+перечитывается не реже чем раз в HISTORY_TTL.
+"""
+
+from datetime import timedelta
+from functools import partial
+from itertools import chain
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .parallel import run_parallel
+from .timeseries import SERIES_CHUNK_DAYS, series_rows, split_period
+
+FORECAST_HISTORY_WEEKS = 26
+HALF_LIFE_WEEKS = 8
+REFRESH_OVERLAP_DAYS = 3
+# Вероятность попадания фактического значения в границы прогноза
+FORECAST_INTERVAL = 0.8
+# Насколько дней вперёд от сегодняшнего можно запросить прогноз
+MAX_FORECAST_DAYS = 62
+HISTORY_KEY = "forecast:history"
+HISTORY_TTL = 7 * 24 * 3600
+
+HISTORY_DAYS = FORECAST_HISTORY_WEEKS * 7
+BAND_FIELDS = ("studies", "studies_low", "studies_high", "up", "up_low", "up_high")
+Z_SCORE = NormalDist().inv_cdf(0.5 + FORECAST_INTERVAL / 2)
+
+
+def _modality_key(modality):
+    # Исследования без типа (модальность None) — в конце списка
+    return (modality is None, modality or "")
+
+
+async def history_rows(date_from, date_to):
+    """Строки «день × модальность» за [date_from, date_to] (части — параллельно)."""
+    parts = min(
+        settings.DB_POOL_SIZE,
+        ((date_to - date_from).days + 1) // SERIES_CHUNK_DAYS,
+    )
+    results = await run_parallel(
+        *(
+            partial(series_rows, chunk_from, chunk_to, "day", "modality")
+            for chunk_from, chunk_to in split_period(date_from, date_to, "day", parts)
+        )
+    )
+    return list(chain.from_iterable(results))
+
+
+def merge_history(history, rows, start, through, fetched_from):
+    """
+    История за [start, through]: дни до fetched_from берутся из прежней
+    истории (если она есть), остальные — из свежих строк rows.
+    """
+    modalities = {row["study_type__modality"] for row in rows}
+    if history is not None:
+        modalities.update(history["modalities"])
+    modalities = sorted(modalities, key=_modality_key)
+    index = {modality: position for position, modality in enumerate(modalities)}
+
+    days = (through - start).days + 1
+    counts = np.zeros((len(modalities), days))
+    up = np.zeros((len(modalities), days))
+
+    if history is not None:
+        first = max(start, history["start"])
+        if first < fetched_from:
+            source = slice((first - history["start"]).days, (fetched_from - history["start"]).days)
+            target = slice((first - start).days, (fetched_from - start).days)
+            positions = [index[modality] for modality in history["modalities"]]
+            counts[positions, target] = history["counts"][:, source]
+            up[positions, target] = history["up"][:, source]
+
+    for row in rows:
+        position = index[row["study_type__modality"]]
+        day = (row["bucket"] - start).days
+        counts[position, day] = row["plan"]
+        up[position, day] = float(row["plan_up"] or 0)
+
+    # Модальности, по которым за всю историю не было исследований, не прогнозируем
+    present = counts.sum(axis=1) > 0
+    return {
+        "start": start,
+        "through": through,
+        "modalities": [modality for modality, keep in zip(modalities, present) if keep],
+        "counts": counts[present],
+        "up": up[present],
+    }
+
+
+def fit_weekly(values):
+    """
+    Коэффициенты взвешенной регрессии по неделям для каждой строки values
+    (модальность × дни, число дней кратно 7) и каждого дня недели.
+
+    Возвращает словарь массивов «модальность × позиция в неделе»: mean
+    (взвешенное среднее), slope (прирост за неделю), sigma (разброс
+    остатков) и общие для всех скаляры k_mean, k_var, n_eff.
+    """
+    weeks = values.shape[1] // 7
+    series = values[:, -weeks * 7:].reshape(len(values), weeks, 7)
+
+    k = np.arange(weeks, dtype=float)
+    weights = 0.5 ** ((weeks - 1 - k) / HALF_LIFE_WEEKS)
+    weights /= weights.sum()
+    k_mean = weights @ k
+    dk = k - k_mean
+    k_var = weights @ dk**2
+    # Эффективное число наблюдений при неравных весах
+    n_eff = 1 / (weights @ weights)
+
+    mean = np.einsum("k,mkd->md", weights, series)
+    slope = np.einsum("k,mkd->md", weights * dk, series) / k_var
+    residuals = series - mean[:, None, :] - slope[:, None, :] * dk[None, :, None]
+    variance = np.einsum("k,mkd->md", weights, residuals**2) * n_eff / max(n_eff - 2, 1)
+    return {
+        "mean": mean,
+        "slope": slope,
+        "sigma": np.sqrt(variance),
+        "k_mean": k_mean,
+        "k_var": k_var,
+        "n_eff": n_eff,
+    }
+
+
+def predict(fit, start, days):
+    """
+    Прогноз на даты days по коэффициентам fit_weekly истории, начатой
+    в start. Возвращает массивы «модальность × дата»: значение и
+    стандартную ошибку предсказания.
+    """
+    offsets = np.array([(day - start).days for day in days])
+    position = offsets % 7
+    dk = offsets // 7 - fit["k_mean"]
+
+    value = fit["mean"][:, position] + fit["slope"][:, position] * dk
+    error = fit["sigma"][:, position] * np.sqrt(
+        1 + 1 / fit["n_eff"] + dk**2 / (fit["n_eff"] * fit["k_var"])
+    )
+    return np.clip(value, 0, None), error
+
+
+async def load_history(today=None):
+    """
+    История с коэффициентами прогноза до вчерашнего дня из кэша.
+
+    Если в кэше история до более ранней даты, дочитываются только
+    закрывшиеся с тех пор дни (с перекрытием REFRESH_OVERLAP_DAYS).
+    """
+    today = today or timezone.localdate()
+    through = today - timedelta(days=1)
+    start = through - timedelta(days=HISTORY_DAYS - 1)
+
+    history = await cache.aget(HISTORY_KEY)
+    if history is not None and history["through"] == through:
+        return history
+
+    fetch_from = start
+    if history is not None and start <= history["through"] < through:
+        fetch_from = max(
+            start, history["through"] - timedelta(days=REFRESH_OVERLAP_DAYS - 1)
+        )
+    else:
+        history = None
+
+    rows = await history_rows(fetch_from, through)
+    history = merge_history(history, rows, start, through, fetch_from)
+    history["fit"] = {
+        "counts": fit_weekly(history["counts"]),
+        "up": fit_weekly(history["up"]),
+    }
+    history["computed_at"] = timezone.now()
+    await cache.aset(HISTORY_KEY, history, timeout=HISTORY_TTL)
+    return history
+
+
+def _band(value, error):
+    """Прогноз, нижняя и верхняя границы интервала, округлённые до 0.1."""
+    return (
+        np.round(value, 1),
+        np.round(np.clip(value - Z_SCORE * error, 0, None), 1),
+        np.round(value + Z_SCORE * error, 1),
+    )
+
+
+def _band_fields(bands, index):
+    return {field: float(band[index]) for field, band in zip(BAND_FIELDS, bands)}
+
+
+async def demand_forecast(date_from, date_to, modality=None):
+    """
+    Прогноз количества исследований и УП по дням и модальностям за
+    [date_from, date_to] с границами интервала FORECAST_INTERVAL.
+
+    Для закрытых дней из истории добавляется факт (actual_studies,
+    actual_up). totals — сумма по модальностям (границы — в предположении
+    независимости модальностей). Даты вне истории и горизонта — ValueError.
+    """
+    today = timezone.localdate()
+    history = await load_history(today)
+    if date_from > date_to:
+        raise ValueError("date_from must not be after date_to")
+    if date_from < history["start"]:
+        raise ValueError(f"date_from must not be before {history['start'].isoformat()}")
+    if date_to > today + timedelta(days=MAX_FORECAST_DAYS):
+        raise ValueError(f"date_to must be within {MAX_FORECAST_DAYS} days from today")
+
+    modalities = history["modalities"]
+    selected = [
+        position
+        for position, item in enumerate(modalities)
+        if modality is None or item == modality
+    ]
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+
+    studies, studies_error = predict(history["fit"]["counts"], history["start"], days)
+    up, up_error = predict(history["fit"]["up"], history["start"], days)
+    studies, studies_error = studies[selected], studies_error[selected]
+    up, up_error = up[selected], up_error[selected]
+
+    bands = _band(studies, studies_error) + _band(up, up_error)
+    series = []
+    for row, position in enumerate(selected):
+        for column, day in enumerate(days):
+            closed = day <= history["through"]
+            history_day = (day - history["start"]).days
+            series.append(
+                {
+                    "date": day,
+                    "modality": modalities[position],
+                    **_band_fields(bands, (row, column)),
+                    "actual_studies": (
+                        int(history["counts"][position, history_day]) if closed else None
+                    ),
+                    "actual_up": (
+                        round(float(history["up"][position, history_day]), 2) if closed else None
+                    ),
+                }
+            )
+
+    # Границы суммы — по сумме дисперсий модальностей
+    total_bands = _band(studies.sum(axis=0), np.sqrt((studies_error**2).sum(axis=0))) + _band(
+        up.sum(axis=0), np.sqrt((up_error**2).sum(axis=0))
+    )
+    totals = [
+        {"date": day, **_band_fields(total_bands, column)} for column, day in enumerate(days)
+    ]
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "history_from": history["start"],
+        "history_to": history["through"],
+        "interval": FORECAST_INTERVAL,
+        "computed_at": history["computed_at"],
+        "modalities": [modalities[position] for position in selected],
+        "series": series,
+        "totals": totals,
+    }
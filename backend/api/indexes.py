@@ -0,0 +1,146 @@
+"""
+Модуль рекомендуемых индексов для горячих запросов API.
+
+Все модели приложения неуправляемые (managed = False), поэтому индексы
+не объявляются в Meta, а перечислены здесь и создаются командой
+``python manage.py ensure_indexes``. Выражения индексов совпадают с SQL,
+который генерирует Django для соответствующих запросов, иначе PostgreSQL
+не сможет их использовать.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .loads import load_queryset, month_bounds
+from .models import Schedule, Study
+from .pagination import NULL_DATETIME_ASC, NULL_DATETIME_DESC, keyset_order_by
+from .priority_queue import pending_queue
+from .rollup import day_range, rollup_queryset
+from .timeseries import series_queryset
+
+# Ранг приоритета в том виде, в каком его строит StudyQuerySet.with_priority_rank
+PRIORITY_RANK_SQL = (
+    "(CASE WHEN priority = 'cito' THEN 0 WHEN priority = 'asap' THEN 1 ELSE 2 END)"
+)
+
+# Ключ даты keyset-пагинации (api.pagination.keyset_key) при сортировке
+# по убыванию и по возрастанию
+KEYSET_CREATED_DESC_SQL = (
+    f"COALESCE(created_at, '{NULL_DATETIME_DESC.isoformat()}'::timestamptz)"
+)
+KEYSET_CREATED_ASC_SQL = (
+    f"COALESCE(created_at, '{NULL_DATETIME_ASC.isoformat()}'::timestamptz)"
+)
+
+# (имя, таблица, тело определения после ON <таблица>, назначение)
+RECOMMENDED_INDEXES = (
+    (
+        "studies_diag_created_status_idx",
+        "studies",
+        "(diagnostician_id, created_at, status) INCLUDE (study_type_id)",
+        "нагрузка врачей: diagnostician_id + created_at + status",
+    ),
+    (
+        "studies_pending_queue_idx",
+        "studies",
+        f"({PRIORITY_RANK_SQL}, created_at, id) WHERE diagnostician_id IS NULL",
+        "очередь pending по (приоритет, created_at, id)",
+    ),
+    (
+        "studies_pending_keyset_idx",
+        "studies",
+        f"({PRIORITY_RANK_SQL}, {KEYSET_CREATED_ASC_SQL}, id) WHERE diagnostician_id IS NULL",
+        "страницы pending по курсору (приоритет, created_at, id)",
+    ),
+    (
+        "studies_pending_created_idx",
+        "studies",
+        "(created_at DESC) WHERE diagnostician_id IS NULL",
+        "очередь pending по убыванию created_at",
+    ),
+    (
+        "studies_priority_keyset_idx",
+        "studies",
+        f"(priority, {KEYSET_CREATED_DESC_SQL} DESC, id DESC)",
+        "выборки и страницы по курсору cito/asap",
+    ),
+    (
+        "studies_created_idx",
+        "studies",
+        "(created_at DESC NULLS LAST, id DESC)",
+        "диапазоны дат (chart_data, дашборд)",
+    ),
+    (
+        "studies_created_keyset_idx",
+        "studies",
+        f"({KEYSET_CREATED_DESC_SQL} DESC, id DESC)",
+        "страницы списка исследований по курсору",
+    ),
+    (
+        "schedules_doctor_date_idx",
+        "schedules",
+        "(doctor_id, work_date)",
+        "расписание врача по датам",
+    ),
+    (
+        "schedules_date_working_idx",
+        "schedules",
+        "(work_date, doctor_id) WHERE is_day_off = 0",
+        "рабочие смены на дату (by_date, автораспределение)",
+    ),
+    (
+        "doctors_modality_gin_idx",
+        "doctors",
+        "USING gin (modality)",
+        "поиск врачей по модальности",
+    ),
+)
+
+
+def create_index_sql(name, table, definition):
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"
+
+
+def hot_queries():
+    """
+    Горячие запросы API в виде QuerySet — те же, что выполняют представления.
+
+    Возвращает список пар (название, QuerySet).
+    """
+    month_start, month_end = month_bounds()
+    today = timezone.localdate()
+    year_ago = timezone.now() - timedelta(days=365)
+
+    return [
+        ("with_load (rollup)", rollup_queryset(*day_range(month_start, month_end))),
+        ("loads (raw studies)", load_queryset(month_start, month_end)),
+        (
+            "pending (queue page)",
+            keyset_order_by(
+                Study.objects.filter(diagnostician_id__isnull=True).with_priority_rank(),
+                ("priority_rank", "created_at", "id"),
+            )[:50],
+        ),
+        (
+            "queue head (SLA, per rank)",
+            pending_queue().filter(priority_rank=0).order_by("created_at", "id")[:50],
+        ),
+        (
+            "pending (full list)",
+            Study.objects.filter(diagnostician_id__isnull=True).order_by("-created_at"),
+        ),
+        (
+            "cito (page)",
+            keyset_order_by(Study.objects.filter(priority="cito"), ("-created_at", "-id"))[:50],
+        ),
+        (
+            "studies list (page)",
+            keyset_order_by(Study.objects.all(), ("-created_at", "-id"))[:50],
+        ),
+        ("chart_data (year by day)", series_queryset(year_ago, timezone.now())),
+        (
+            "schedules by_date",
+            Schedule.objects.filter(work_date=today, is_day_off=0),
+        ),
+    ]
@@ -0,0 +1,267 @@
+"""
+Модуль пакетного приёма исследований из РИС.
+
+Пакет — CSV с заголовком или NDJSON (JSON-объект на строку) с полями
+research_number, study_type_id, priority, created_at, planned_at.
+Строки проверяются по справочнику типов исследований и допустимым
+приоритетам (как в StudySerializer), корректные загружаются порциями:
+COPY во временную таблицу и один INSERT ... ON CONFLICT (research_number)
+в studies на порцию. Поэтому пакет в десятки тысяч строк занимает доли
+секунды, а не тысячи отдельных INSERT.
+
+Загрузка идемпотентна: по номеру исследования новые строки вставляются
+(статус pending, без врача), у известных обновляются только поля РИС
+(тип, приоритет, планируемая дата) и только если они изменились —
+повторная доставка того же пакета ничего не меняет. Статус и врач,
+которыми управляет приложение, не перезаписываются. Отклонённые строки
+возвращаются с номером строки и причиной.
+"""
+
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PRIORITY_RANK
+from .reference import reference_data, reload_reference_data
+
+INGEST_FORMATS = ("csv", "ndjson")
+INGEST_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+FIELDS = ("research_number", "study_type_id", "priority", "created_at", "planned_at")
+# Строк в одной порции (одна транзакция)
+INGEST_BATCH_ROWS = 50000
+# Сколько отклонённых строк перечислять в ответе
+MAX_REPORTED_REJECTS = 1000
+
+CREATE_TEMP_SQL = """
+    CREATE TEMP TABLE ingest_studies (
+        line integer,
+        research_number varchar(50),
+        study_type_id integer,
+        priority varchar(20),
+        created_at timestamptz,
+        planned_at timestamptz
+    ) ON COMMIT DROP
+"""
+
+# id новых строк выделяются подряд после max(id) под блокировкой таблицы
+# (Study.id назначается вручную, последовательности нет)
+UPSERT_SQL = """
+    INSERT INTO studies AS s
+        (id, research_number, study_type_id, status, priority, created_at, planned_at)
+    SELECT last.id + row_number() OVER (ORDER BY i.line),
+           i.research_number, i.study_type_id, 'pending', i.priority,
+           i.created_at, i.planned_at
+    FROM ingest_studies i,
+         (SELECT coalesce(max(id), 0) AS id FROM studies) last
+    ORDER BY i.line
+    ON CONFLICT (research_number) DO UPDATE
+    SET study_type_id = EXCLUDED.study_type_id,
+        priority = EXCLUDED.priority,
+        planned_at = EXCLUDED.planned_at
+    WHERE (s.study_type_id, s.priority, s.planned_at)
+          IS DISTINCT FROM (EXCLUDED.study_type_id, EXCLUDED.priority, EXCLUDED.planned_at)
+    RETURNING s.id, s.priority, s.study_type_id, (s.xmax = 0) AS inserted
+"""
+
+
+class RowError(ValueError):
+    """Строка пакета не прошла проверку."""
+
+
+class UnknownStudyType(RowError):
+    pass
+
+
+def read_rows(stream, input_format):
+    """
+    Строки пакета из бинарного потока: пары (номер строки, словарь полей).
+
+    Строка NDJSON, которая не разбирается, отдаётся как RowError вместо словаря.
+    """
+    text = codecs.getreader("utf-8")(stream)
+    if input_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, RowError("invalid JSON")
+            continue
+        if not isinstance(row, dict):
+            row = RowError("JSON object expected")
+        yield line_number, row
+
+
+def _datetime(value, field, tz):
+    if value in (None, ""):
+        return None
+    try:
+        # fromisoformat в разы быстрее parse_datetime на типичных значениях РИС
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = parse_datetime(str(value))
+        except ValueError:
+            # Формат верный, но даты не существует (например, 30 февраля)
+            raise RowError(f"{field}: invalid datetime")
+    if parsed is None:
+        raise RowError(f"{field}: ISO datetime expected")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, tz)
+    return parsed
+
+
+def clean_row(row, study_types, now, tz):
+    """
+    Проверенная строка (кортеж FIELDS) или RowError с причиной.
+
+    Время без часового пояса считается временем в поясе tz.
+    """
+    research_number = str(row.get("research_number") or "").strip()
+    if not research_number:
+        raise RowError("research_number is required")
+    if len(research_number) > 50:
+        raise RowError("research_number longer than 50 characters")
+
+    try:
+        study_type_id = int(row.get("study_type_id"))
+    except (TypeError, ValueError, OverflowError):
+        raise RowError("study_type_id must be an integer")
+    if study_type_id not in study_types:
+        raise UnknownStudyType(f"unknown study_type_id {study_type_id}")
+
+    priority = row.get("priority") or "normal"
+    if not isinstance(priority, str) or priority not in PRIORITY_RANK:
+        raise RowError(f"priority must be one of: {', '.join(PRIORITY_RANK)}")
+
+    return (
+        research_number,
+        study_type_id,
+        priority,
+        _datetime(row.get("created_at"), "created_at", tz) or now,
+        _datetime(row.get("planned_at"), "planned_at", tz),
+    )
+
+
+def _load_batch(batch):
+    """
+    Загружает порцию {research_number: (line, row)} одной транзакцией.
+
+    Возвращает строки RETURNING: (id, priority, study_type_id, inserted).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line, row in batch.values():
+        research_number, study_type_id, priority, created_at, planned_at = row
+        writer.writerow(
+            (
+                line,
+                research_number,
+                study_type_id,
+                priority,
+                created_at.isoformat(),
+                planned_at.isoformat() if planned_at else None,
+            )
+        )
+    buffer.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Внутри внешней транзакции ON COMMIT DROP не срабатывает между порциями
+        cursor.execute("DROP TABLE IF EXISTS ingest_studies")
+        cursor.execute(CREATE_TEMP_SQL)
+        cursor.copy_expert(
+            f"COPY ingest_studies (line, {', '.join(FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        cursor.execute("LOCK TABLE studies IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(UPSERT_SQL)
+        return cursor.fetchall()
+
+
+def ingest_studies(rows, batch_size=INGEST_BATCH_ROWS, on_batch=lambda result: None):
+    """
+    Проверяет и загружает строки пакета (пары из read_rows) порциями.
+
+    При повторе номера исследования в порции действует последняя строка.
+    Возвращает счётчики received, inserted, updated, unchanged, rejected,
+    список отклонённых строк (не больше MAX_REPORTED_REJECTS) и created —
+    (id, priority, study_type_id) вставленных исследований.
+    """
+    result = {
+        "received": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "rejected": 0,
+        "rejected_rows": [],
+        "created": [],
+    }
+    reference = reference_data()
+    reloaded = False
+    now = timezone.now()
+    tz = timezone.get_current_timezone()
+    batch = {}
+
+    def flush():
+        returned = _load_batch(batch)
+        inserted = [
+            (study_id, priority, study_type_id)
+            for study_id, priority, study_type_id, is_new in returned
+            if is_new
+        ]
+        result["inserted"] += len(inserted)
+        result["updated"] += len(returned) - len(inserted)
+        result["unchanged"] += len(batch) - len(returned)
+        result["created"] += inserted
+        batch.clear()
+        on_batch(result)
+
+    for line, row in rows:
+        result["received"] += 1
+        try:
+            if isinstance(row, RowError):
+                raise row
+            try:
+                cleaned = clean_row(row, reference.study_types, now, tz)
+            except UnknownStudyType:
+                if reloaded:
+                    raise
+                # Тип мог появиться в базе в обход API — перечитываем справочник
+                # (один раз за пакет)
+                reference, reloaded = reload_reference_data(), True
+                cleaned = clean_row(row, reference.study_types, now, tz)
+        except RowError as error:
+            result["rejected"] += 1
+            if len(result["rejected_rows"]) < MAX_REPORTED_REJECTS:
+                result["rejected_rows"].append(
+                    {
+                        "line": line,
+                        "research_number": row.get("research_number") if isinstance(row, dict) else None,
+                        "error": str(error),
+                    }
+                )
+            continue
+
+        batch.pop(cleaned[0], None)
+        batch[cleaned[0]] = (line, cleaned)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return result
@@ -0,0 +1,147 @@
+"""
+Модуль расчёта нагрузки врачей.
+
+Нагрузка врача считается в условных пунктах (УП): сумма весовых
+коэффициентов StudyType.up_value по исследованиям, назначенным врачу
+в заданном окне дат. Все показатели по всем врачам собираются одним
+сгруппированным запросом к таблице studies, без отдельного запроса
+на каждого врача, поэтому модуль можно использовать из любых представлений.
+Веса типов исследований берутся из справочника в памяти (api.reference),
+так что запрос не соединяется с таблицей study_types.
+
+Окна, совпадающие с границами суток (месяц, диапазон дат), читаются
+из свёртки doctor_day_loads (api.rollup) — несколько сотен строк вместо
+всех исследований периода.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Study
+from .reference import reference_data, reload_reference_data
+from .rollup import day_range, rollup_loads
+
+# Статусы, которые входят в нагрузку врача (все описанные исследования)
+LOAD_STATUSES = ("confirmed", "pending", "signed")
+# Статусы «в работе» — ещё не подписанные исследования
+ACTIVE_STATUSES = ("confirmed", "pending")
+
+
+def month_bounds(moment=None):
+    """
+    Начало текущего и следующего месяца для переданного момента времени
+    (полночь по местному времени).
+    """
+    month_start = timezone.localdate(moment).replace(day=1)
+    if month_start.month == 12:
+        month_end = month_start.replace(year=month_start.year + 1, month=1)
+    else:
+        month_end = month_start.replace(month=month_start.month + 1)
+    return date_window(month_start, month_end - timedelta(days=1))
+
+
+def date_window(date_from, date_to):
+    """
+    Превращает даты (включительно) в полуинтервал [start, end) осведомлённых
+    datetime, пригодный для фильтрации по created_at без приведения к date.
+    """
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def norm_up_for(position_type):
+    """Норма УП в месяц согласно положению."""
+    return 40 if position_type == "head" else 50
+
+
+def load_queryset(start, end, doctor_ids=None):
+    """
+    Сгруппированный по врачам и типам исследований запрос за период [start, end).
+
+    Строк в результате не больше, чем пар «врач — тип исследования».
+    """
+    studies = Study.objects.filter(
+        diagnostician_id__isnull=False,
+        created_at__gte=start,
+        created_at__lt=end,
+        status__in=LOAD_STATUSES,
+    )
+    if doctor_ids is not None:
+        studies = studies.filter(diagnostician_id__in=doctor_ids)
+
+    return (
+        studies.order_by()
+        .values("diagnostician_id", "study_type_id")
+        .annotate(
+            study_count=Count("id"),
+            active_count=Count("id", filter=Q(status__in=ACTIVE_STATUSES)),
+        )
+    )
+
+
+def doctor_loads(start, end, doctor_ids=None):
+    """
+    Нагрузка врачей за период [start, end).
+
+    Возвращает словарь {doctor_id: {"total_up": Decimal, "active_count": int}}.
+    Врачи без исследований за период в словарь не попадают.
+    """
+    days = day_range(start, end)
+    if days is not None:
+        return rollup_loads(*days, LOAD_STATUSES, ACTIVE_STATUSES, doctor_ids)
+
+    rows = list(load_queryset(start, end, doctor_ids))
+    study_type_up = reference_data().study_type_up
+    if any(
+        row["study_type_id"] is not None and row["study_type_id"] not in study_type_up
+        for row in rows
+    ):
+        study_type_up = reload_reference_data().study_type_up
+
+    loads = {}
+    for row in rows:
+        load = loads.setdefault(
+            row["diagnostician_id"], {"total_up": 0, "active_count": 0}
+        )
+        load["total_up"] += study_type_up.get(row["study_type_id"], 0) * row["study_count"]
+        load["active_count"] += row["active_count"]
+    return loads
+
+
+def load_entry(doctor, load=None):
+    """Строка ответа «врач с нагрузкой» в формате DoctorViewSet.with_load."""
+    load = load or {}
+    current_load = round(load.get("total_up") or 0, 3)
+    norm_up = norm_up_for(doctor.position_type)
+
+    return {
+        "id": doctor.id,
+        "fio_alias": doctor.fio_alias or f"Врач {doctor.id}",
+        "position_type": doctor.position_type,
+        "max_up_per_day": doctor.max_up_per_day or norm_up,
+        "is_active": doctor.is_active if doctor.is_active is not None else True,
+        "specialty": (
+            "Рентгенолог" if doctor.position_type == "radiologist" else "КТ-диагност"
+        ),
+        "current_load": current_load,
+        "max_load": norm_up,
+        "active_studies": load.get("active_count") or 0,
+        "load_percentage": (
+            round((current_load / norm_up) * 100, 1) if norm_up > 0 else 0
+        ),
+    }
+
+
+def doctors_with_load(doctors, start, end):
+    """
+    Список врачей с нагрузкой за период [start, end).
+
+    doctors — врачи (QuerySet или список, например из справочника
+    reference_data); по исследованиям выполняется одна агрегация.
+    """
+    doctors = list(doctors)
+    loads = doctor_loads(start, end, doctor_ids=[doctor.id for doctor in doctors])
+    return [load_entry(doctor, loads.get(doctor.id)) for doctor in doctors]
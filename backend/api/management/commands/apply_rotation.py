@@ -0,0 +1,89 @@
+"""
+Команда генерации расписания по шаблону графика смен.
+
+Разворачивает шаблон (по названию или id) на период для выбранных врачей
+(по умолчанию — для всех активных) и записывает расписание одной
+транзакцией. Дни, на которые расписание уже есть, по умолчанию
+пропускаются.
+
+Примеры:
+    python manage.py apply_rotation --template 5/2 --date-from 2025-02-01 --date-to 2025-02-28
+    python manage.py apply_rotation --template 2/2 --date-from 2025-02-01 --date-to 2025-02-28 \
+        --doctors 1,2,3,4 --stagger --on-conflict replace
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import RotationTemplate
+from api.reference import reference_data
+from api.rotations import ON_CONFLICT, RotationConflict, apply_rotation
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Дата должна быть в формате YYYY-MM-DD: {value}")
+
+
+def parse_ids(value):
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise CommandError(f"Список id врачей через запятую: {value}")
+
+
+class Command(BaseCommand):
+    help = "Генерирует расписание врачей по шаблону графика смен"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--template", required=True, help="Название или id шаблона")
+        parser.add_argument("--date-from", type=parse_date, required=True, help="Первая дата (YYYY-MM-DD)")
+        parser.add_argument("--date-to", type=parse_date, required=True, help="Последняя дата (YYYY-MM-DD)")
+        parser.add_argument(
+            "--doctors", type=parse_ids, help="id врачей через запятую (по умолчанию все активные)"
+        )
+        parser.add_argument(
+            "--stagger", action="store_true", help="Сдвигать фазу цикла каждого следующего врача на день"
+        )
+        parser.add_argument("--on-conflict", choices=ON_CONFLICT, default="skip")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не записывать")
+
+    def handle(self, *args, **options):
+        templates = RotationTemplate.objects.filter(name=options["template"])
+        if options["template"].isdigit():
+            templates = templates | RotationTemplate.objects.filter(id=options["template"])
+        template = templates.first()
+        if template is None:
+            raise CommandError(f"Шаблон не найден: {options['template']}")
+
+        doctor_ids = options["doctors"] or [
+            doctor.id for doctor in reference_data().doctor_list(is_active=True)
+        ]
+        try:
+            result = apply_rotation(
+                template,
+                [{"doctor_id": doctor_id} for doctor_id in doctor_ids],
+                options["date_from"],
+                options["date_to"],
+                stagger=options["stagger"],
+                on_conflict=options["on_conflict"],
+                dry_run=options["dry_run"],
+            )
+        except RotationConflict as conflict:
+            for item in conflict.conflicts[:20]:
+                self.stderr.write(f"  врач {item['doctor_id']}, {item['work_date']}")
+            raise CommandError(f"Расписание уже есть: {conflict}")
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        prefix = "Проверка (ничего не записано): " if result["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}шаблон {template}, врачей {result['doctors']}: "
+                f"создано {result['created']}, перезаписано дней {result['replaced']}, "
+                f"пропущено дней {result['skipped']}"
+            )
+        )
@@ -0,0 +1,105 @@
+"""
+Команда проверки и создания рекомендуемых индексов.
+
+Сравнивает индексы живых таблиц studies, schedules и doctors со списком
+api.indexes.RECOMMENDED_INDEXES, печатает недостающие и по флагу --create
+создаёт их через CREATE INDEX CONCURRENTLY (без блокировки записи).
+С флагом --explain печатает время EXPLAIN ANALYZE горячих запросов
+до и после создания индексов.
+
+Примеры:
+    python manage.py ensure_indexes
+    python manage.py ensure_indexes --create --explain
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.indexes import RECOMMENDED_INDEXES, create_index_sql, hot_queries
+from api.pagination import query_plan
+
+TABLES = ("studies", "schedules", "doctors")
+
+
+def plan_indexes(node):
+    """Имена индексов, используемых в узле плана и его потомках."""
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+
+class Command(BaseCommand):
+    help = "Проверяет и создаёт рекомендуемые индексы для горячих запросов API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--create",
+            action="store_true",
+            help="Создать недостающие индексы (CREATE INDEX CONCURRENTLY)",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Напечатать время EXPLAIN ANALYZE горячих запросов до и после",
+        )
+
+    def existing_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT tablename, indexname, indexdef
+                FROM pg_indexes
+                WHERE schemaname = current_schema() AND tablename = ANY(%s)
+                ORDER BY tablename, indexname
+                """,
+                [list(TABLES)],
+            )
+            return cursor.fetchall()
+
+    def explain_timings(self):
+        timings = {}
+        for name, queryset in hot_queries():
+            plan = query_plan(queryset, analyze=True)
+            used = ", ".join(sorted(plan_indexes(plan["Plan"]))) or "без индексов"
+            timings[name] = (plan["Execution Time"], used)
+        return timings
+
+    def handle(self, *args, **options):
+        existing = self.existing_indexes()
+        existing_names = {name for _, name, _ in existing}
+
+        self.stdout.write("Существующие индексы:")
+        for table, name, definition in existing:
+            self.stdout.write(f"  [{table}] {definition}")
+
+        missing = [
+            index for index in RECOMMENDED_INDEXES if index[0] not in existing_names
+        ]
+        if not missing:
+            self.stdout.write(self.style.SUCCESS("Все рекомендуемые индексы на месте"))
+        else:
+            self.stdout.write(self.style.WARNING("Недостающие индексы:"))
+            for name, table, definition, purpose in missing:
+                self.stdout.write(f"  {name} — {purpose}")
+                self.stdout.write(f"    {create_index_sql(name, table, definition)};")
+
+        before = self.explain_timings() if options["explain"] else None
+
+        if options["create"] and missing:
+            with connection.cursor() as cursor:
+                for name, table, definition, _ in missing:
+                    self.stdout.write(f"Создание {name}...")
+                    cursor.execute(create_index_sql(name, table, definition))
+                    cursor.execute(f"ANALYZE {table}")
+            self.stdout.write(self.style.SUCCESS(f"Создано индексов: {len(missing)}"))
+
+        if before is not None:
+            after = self.explain_timings() if options["create"] and missing else before
+            self.stdout.write("EXPLAIN ANALYZE горячих запросов (мс, индексы плана):")
+            for name, (time_before, used_before) in before.items():
+                time_after, used_after = after[name]
+                self.stdout.write(
+                    f"  {name}: {time_before:.2f} ({used_before})"
+                    f" -> {time_after:.2f} ({used_after})"
+                )
@@ -0,0 +1,64 @@
+"""
+Команда генерации синтетического набора данных для замеров.
+
+ВНИМАНИЕ: очищает таблицы doctors, study_types, schedules, studies,
+doctor_day_loads и change_log. Запускать только на локальной базе.
+
+Примеры:
+    python manage.py generate_synthetic_data --yes
+    python manage.py generate_synthetic_data --doctors 300 --studies 5000000 --yes
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.synthetic import dataset_counts, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими врачами, расписанием и исследованиями"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=300, help="Количество врачей")
+        parser.add_argument(
+            "--study-types", type=int, default=200, help="Количество типов исследований"
+        )
+        parser.add_argument(
+            "--studies", type=int, default=1_000_000, help="Количество исследований"
+        )
+        parser.add_argument(
+            "--history-days", type=int, default=365, help="Глубина истории, дней"
+        )
+        parser.add_argument(
+            "--days-ahead", type=int, default=30, help="Расписание вперёд, дней"
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help="Подтвердить очистку таблиц с существующими данными",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("doctors", "study_types", "studies", "history_days"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} должно быть больше нуля")
+
+        existing = sum(dataset_counts().values())
+        if existing and not options["yes"]:
+            raise CommandError(
+                f"В таблицах уже есть данные ({existing} строк). "
+                "Они будут удалены — повторите с --yes"
+            )
+
+        counts = generate_dataset(
+            doctors=options["doctors"],
+            study_types=options["study_types"],
+            studies=options["studies"],
+            history_days=options["history_days"],
+            days_ahead=options["days_ahead"],
+            seed=options["seed"],
+            log=self.stdout.write,
+        )
+        for table, count in counts.items():
+            self.stdout.write(f"  {table}: {count}")
+        self.stdout.write(self.style.SUCCESS("Синтетические данные загружены"))
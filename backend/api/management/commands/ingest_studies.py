@@ -0,0 +1,73 @@
+"""
+Команда пакетного приёма исследований из файла (CSV или NDJSON).
+
+Формат определяется по расширению файла (.csv, .ndjson, .jsonl) или
+задаётся --format; «-» вместо пути читает стандартный ввод. Загрузка
+идемпотентна: повторный запуск на том же файле ничего не меняет.
+
+Примеры:
+    python manage.py ingest_studies studies.csv
+    python manage.py ingest_studies - --format ndjson < studies.ndjson
+"""
+
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dashboard import invalidate_dashboard_stats
+from api.events import publish_created
+from api.ingest import INGEST_BATCH_ROWS, INGEST_FORMATS, ingest_studies, read_rows
+
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Command(BaseCommand):
+    help = "Загружает пакет исследований из CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл пакета или - для стандартного ввода")
+        parser.add_argument("--format", choices=INGEST_FORMATS, help="Формат (по умолчанию по расширению)")
+        parser.add_argument(
+            "--batch-size", type=int, default=INGEST_BATCH_ROWS, help="Строк в одной транзакции"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        ingest_format = options["format"] or EXTENSIONS.get(Path(path).suffix.lower())
+        if ingest_format is None:
+            raise CommandError("Не удалось определить формат по расширению, укажите --format")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+
+        def progress(result):
+            self.stderr.write(
+                f"  обработано строк {result['received']}, отклонено {result['rejected']}"
+            )
+
+        try:
+            stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        except OSError as error:
+            raise CommandError(str(error))
+        with stream:
+            try:
+                result = ingest_studies(
+                    read_rows(stream, ingest_format), options["batch_size"], progress
+                )
+            except UnicodeDecodeError:
+                raise CommandError("Файл должен быть в кодировке UTF-8")
+
+        created = result.pop("created")
+        if result["inserted"] or result["updated"]:
+            invalidate_dashboard_stats()
+            publish_created(created)
+
+        for row in result["rejected_rows"][:20]:
+            self.stderr.write(f"  строка {row['line']} ({row['research_number']}): {row['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Получено {result['received']}: добавлено {result['inserted']}, "
+                f"обновлено {result['updated']}, без изменений {result['unchanged']}, "
+                f"отклонено {result['rejected']}"
+            )
+        )
@@ -0,0 +1,34 @@
+"""
+Команда очистки журнала изменений change_log.
+
+Удаляет записи старше заданного количества дней. Клиенты, чей токен
+синхронизации старше очищенной части журнала, получат reset=True
+и перечитают данные целиком.
+
+Пример:
+    python manage.py prune_change_log --days 7
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.sync import prune_change_log
+
+
+class Command(BaseCommand):
+    help = "Удаляет старые записи журнала изменений для дельта-синхронизации"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=7,
+            help="Хранить изменения за последние N дней (по умолчанию 7)",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        deleted = prune_change_log(cutoff)
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей журнала: {deleted}"))
@@ -0,0 +1,36 @@
+"""
+Команда перестройки свёртки нагрузки врачей doctor_day_loads.
+
+Пересчитывает строки свёртки из исследований за указанный период
+(по умолчанию — за всю историю). Нужна после изменения весов типов
+исследований или при подключении свёртки к базе с историей.
+
+Примеры:
+    python manage.py rebuild_load_rollup
+    python manage.py rebuild_load_rollup --date-from 2025-01-01 --date-to 2025-01-31
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rollup import rebuild_rollup
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Дата должна быть в формате YYYY-MM-DD: {value}")
+
+
+class Command(BaseCommand):
+    help = "Перестраивает свёртку нагрузки врачей по дням из исследований"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", type=parse_date, help="Первая дата (YYYY-MM-DD)")
+        parser.add_argument("--date-to", type=parse_date, help="Последняя дата (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollup(options["date_from"], options["date_to"])
+        self.stdout.write(self.style.SUCCESS(f"Строк свёртки за период: {rows}"))
@@ -0,0 +1,77 @@
+"""
+Команда замера эндпоинтов API.
+
+Замеряет все эндпоинты api/urls.py (перцентили времени ответа, SQL-запросы,
+размер ответа) и сохраняет результат в JSON. С --compare сравнивает прогон
+с предыдущим и завершается с ошибкой при регрессии.
+
+Примеры:
+    python manage.py run_benchmark --output benchmarks/baseline.json
+    python manage.py run_benchmark --output benchmarks/new.json --compare benchmarks/baseline.json
+"""
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.benchmark import compare_runs, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Замеряет время ответа, SQL-запросы и размер ответа всех эндпоинтов API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Замеров на эндпоинт (по умолчанию 20)"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=2, help="Прогревочных запросов на эндпоинт"
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл результата (по умолчанию benchmarks/benchmark-<время>.json)",
+        )
+        parser.add_argument("--compare", help="Файл предыдущего прогона для сравнения")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Допустимый рост p95 при сравнении, доля (по умолчанию 0.2)",
+        )
+        parser.add_argument(
+            "--skip-writes",
+            action="store_true",
+            help="Не замерять изменяющие эндпоинты (назначения, статусы)",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должно быть больше нуля")
+
+        result = run_benchmark(
+            repeat=options["repeat"],
+            warmup=options["warmup"],
+            include_writes=not options["skip_writes"],
+            log=self.stdout.write,
+        )
+        for name, reason in result["not_measured"].items():
+            self.stdout.write(self.style.WARNING(f"Без замера: {name} ({reason})"))
+
+        output = Path(
+            options["output"]
+            or f"benchmarks/benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Результат сохранён: {output}"))
+
+        if options["compare"]:
+            previous = json.loads(Path(options["compare"]).read_text())
+            regressions = compare_runs(previous, result, options["threshold"])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(line))
+                raise CommandError(f"Регрессий: {len(regressions)}")
+            self.stdout.write(self.style.SUCCESS("Регрессий нет"))
@@ -0,0 +1,302 @@
+"""
+Модуль метрик запросов API.
+
+RequestMetricsMiddleware для каждого запроса определяет имя маршрута
+(например, doctor-with-load) и накапливает по нему:
+- гистограмму времени ответа;
+- количество и суммарное время SQL-запросов, гистограмму числа запросов
+  на один ответ;
+- количество строк, возвращённых базой;
+- размер ответа.
+
+SQL-запросы считаются обёрткой выполнения (execute_wrapper), которая
+ставится на каждое соединение при его открытии и пишет в счётчики,
+открытые count_queries в текущем контексте, — без DEBUG и без сохранения
+текста запросов. Контекст переходит в потоки sync_to_async, поэтому
+учитываются и синхронные представления под ASGI, и запросы из пула
+api/parallel.py. Накладные расходы малы, middleware можно держать
+включённым в продакшене.
+Медленные запросы (дольше SLOW_REQUEST_MS) пишутся в лог api.metrics
+вместе с самыми долгими SQL-запросами.
+
+Метрики хранятся в памяти процесса и отдаются в текстовом формате
+Prometheus эндпоинтом /api/metrics/ (только с адресов METRICS_ALLOWED_IPS).
+При нескольких воркерах каждый отдаёт свои метрики.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм: время ответа (секунды) и число SQL-запросов
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Сколько самых долгих SQL-запросов писать в лог медленного ответа
+SLOW_LOG_TOP_QUERIES = 5
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.total}"
+
+
+class _ViewMetrics:
+    def __init__(self):
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.queries_per_request = _Histogram(QUERY_COUNT_BUCKETS)
+        self.responses = defaultdict(int)  # (method, status) -> количество
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+
+
+_metrics = defaultdict(_ViewMetrics)
+_lock = threading.Lock()
+# Счётчики SQL, открытые в текущем контексте (переходят в потоки sync_to_async)
+_counters = ContextVar("metrics_query_counters", default=())
+
+
+class QueryCounter:
+    """Счётчик SQL-запросов: количество, время, строки и самые долгие запросы."""
+
+    def __init__(self, keep_top=0):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.keep_top = keep_top
+        self.top = []
+        # Запросы одного ответа могут идти из нескольких потоков пула
+        self.lock = threading.Lock()
+
+    def add(self, elapsed, rowcount, sql):
+        with self.lock:
+            self.count += 1
+            self.seconds += elapsed
+            if rowcount and rowcount > 0:
+                self.rows += rowcount
+            if self.keep_top:
+                item = (elapsed, self.count, sql)
+                if len(self.top) < self.keep_top:
+                    heapq.heappush(self.top, item)
+                elif elapsed > self.top[0][0]:
+                    heapq.heapreplace(self.top, item)
+
+
+@contextmanager
+def count_queries(keep_top=0):
+    """
+    Считает SQL-запросы блока, включая выполненные в потоках, куда
+    переходит контекст (sync_to_async, пул api/parallel.py).
+    """
+    counter = QueryCounter(keep_top)
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+def _count_query(execute, sql, params, many, context):
+    counters = _counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        rowcount = getattr(context["cursor"], "rowcount", -1)
+        for counter in counters:
+            counter.add(elapsed, rowcount, sql)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает обёртки с конца
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_install_query_counter)
+# Соединения этого потока, созданные до импорта модуля
+for _connection in connections.all(initialized_only=True):
+    _install_query_counter(None, _connection)
+
+
+def record(view, method, status, seconds, counter, response_bytes):
+    """Добавляет результат запроса в метрики маршрута."""
+    with _lock:
+        metrics = _metrics[view]
+        metrics.latency.observe(seconds)
+        metrics.queries_per_request.observe(counter.count)
+        metrics.responses[(method, status)] += 1
+        metrics.queries += counter.count
+        metrics.query_seconds += counter.seconds
+        metrics.rows += counter.rows
+        metrics.response_bytes += response_bytes
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.url_name or match.view_name or "unnamed"
+
+
+def _response_size(response):
+    # Размер потоковых ответов заранее неизвестен
+    if getattr(response, "streaming", False):
+        return 0
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики запроса по имени маршрута (синхронно и под ASGI)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = settings.SLOW_REQUEST_MS / 1000
+        self.keep_top = SLOW_LOG_TOP_QUERIES if self.slow_seconds else 0
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        with count_queries(self.keep_top) as counter:
+            response = self.get_response(request)
+        self._finish(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with count_queries(self.keep_top) as counter:
+            response = await self.get_response(request)
+        self._finish(request, response, time.perf_counter() - started, counter)
+        return response
+
+    def _finish(self, request, response, seconds, counter):
+        view = _view_name(request)
+        record(
+            view,
+            request.method,
+            response.status_code,
+            seconds,
+            counter,
+            _response_size(response),
+        )
+        if self.slow_seconds and seconds >= self.slow_seconds:
+            top = sorted(counter.top, reverse=True)
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in SQL%s",
+                request.method,
+                request.get_full_path(),
+                view,
+                seconds * 1000,
+                counter.count,
+                counter.seconds * 1000,
+                "".join(
+                    f"\n  {elapsed * 1000:.1f} ms: {sql[:500]}" for elapsed, _, sql in top
+                ),
+            )
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    with _lock:
+        snapshot = {
+            view: (
+                list(metrics.latency.samples(
+                    "rad_http_request_duration_seconds", f'view="{_label(view)}"'
+                )),
+                list(metrics.queries_per_request.samples(
+                    "rad_db_queries_per_request", f'view="{_label(view)}"'
+                )),
+                dict(metrics.responses),
+                metrics.queries,
+                metrics.query_seconds,
+                metrics.rows,
+                metrics.response_bytes,
+            )
+            for view, metrics in sorted(_metrics.items())
+        }
+
+    lines = [
+        "# HELP rad_http_requests_total Обработанные запросы по маршруту, методу и статусу",
+        "# TYPE rad_http_requests_total counter",
+    ]
+    for view, (_, _, responses, *_) in snapshot.items():
+        for (method, status), count in sorted(responses.items()):
+            lines.append(
+                f'rad_http_requests_total{{view="{_label(view)}",'
+                f'method="{method}",status="{status}"}} {count}'
+            )
+
+    lines += [
+        "# HELP rad_http_request_duration_seconds Время ответа",
+        "# TYPE rad_http_request_duration_seconds histogram",
+    ]
+    for view, (latency, *_) in snapshot.items():
+        lines += latency
+
+    lines += [
+        "# HELP rad_db_queries_per_request SQL-запросов на один ответ",
+        "# TYPE rad_db_queries_per_request histogram",
+    ]
+    for view, (_, per_request, *_) in snapshot.items():
+        lines += per_request
+
+    counters = (
+        ("rad_db_queries_total", "SQL-запросы", 3, "{}"),
+        ("rad_db_query_duration_seconds_total", "Время SQL-запросов, секунд", 4, "{:.6f}"),
+        ("rad_db_rows_total", "Строки, возвращённые или изменённые запросами", 5, "{}"),
+        ("rad_http_response_bytes_total", "Размер ответов (без потоковых)", 6, "{}"),
+    )
+    for name, help_text, index, value_format in counters:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for view, values in snapshot.items():
+            lines.append(
+                f'{name}{{view="{_label(view)}"}} {value_format.format(values[index])}'
+            )
+
+    return "\n".join(lines) + "\n"
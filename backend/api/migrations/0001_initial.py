@@ -0,0 +1,136 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:38
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Триггеры уровня оператора с переходными таблицами: один INSERT в журнал
+# на весь UPDATE/INSERT/DELETE, а не на каждую строку.
+CHANGE_LOG_SQL = """
+CREATE OR REPLACE FUNCTION change_log_capture() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO change_log (table_name, row_id, operation, xid, changed_at)
+        SELECT TG_TABLE_NAME, id, 'D', pg_current_xact_id()::text::bigint, now()
+        FROM old_rows;
+    ELSE
+        INSERT INTO change_log (table_name, row_id, operation, xid, changed_at)
+        SELECT TG_TABLE_NAME, id, left(TG_OP, 1), pg_current_xact_id()::text::bigint, now()
+        FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+""" + "".join(
+    f"""
+CREATE TRIGGER {table}_change_log_insert AFTER INSERT ON {table}
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION change_log_capture();
+CREATE TRIGGER {table}_change_log_update AFTER UPDATE ON {table}
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION change_log_capture();
+CREATE TRIGGER {table}_change_log_delete AFTER DELETE ON {table}
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION change_log_capture();
+"""
+    for table in ("studies", "schedules")
+)
+
+DROP_CHANGE_LOG_SQL = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {table}_change_log_insert ON {table};
+DROP TRIGGER IF EXISTS {table}_change_log_update ON {table};
+DROP TRIGGER IF EXISTS {table}_change_log_delete ON {table};
+"""
+    for table in ("studies", "schedules")
+) + "DROP FUNCTION IF EXISTS change_log_capture();"
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Doctor',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Идентификатор врача')),
+                ('fio_alias', models.CharField(blank=True, max_length=255, null=True, verbose_name='ФИО диагноста')),
+                ('position_type', models.CharField(blank=True, max_length=50, null=True, verbose_name='Должность')),
+                ('max_up_per_day', models.IntegerField(blank=True, default=120, null=True, verbose_name='Максимально УП в день')),
+                ('is_active', models.BooleanField(blank=True, default=True, null=True, verbose_name='Статус активности')),
+                ('modality', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None, verbose_name='Модальности')),
+            ],
+            options={
+                'db_table': 'doctors',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Schedule',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Идентификатор расписания')),
+                ('work_date', models.DateField(blank=True, null=True, verbose_name='Дата')),
+                ('time_start', models.TimeField(blank=True, null=True, verbose_name='Начало работы')),
+                ('time_end', models.TimeField(blank=True, null=True, verbose_name='Конец работы')),
+                ('is_day_off', models.IntegerField(blank=True, default=0, null=True, verbose_name='Статус выходного')),
+                ('planned_up', models.IntegerField(blank=True, null=True, verbose_name='План УП')),
+                ('doctor', models.ForeignKey(blank=True, db_column='doctor_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='api.doctor', verbose_name='Врач')),
+            ],
+            options={
+                'db_table': 'schedules',
+                'ordering': ['work_date', 'time_start'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StudyType',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Идентификатор типа исследований')),
+                ('name', models.CharField(blank=True, max_length=500, null=True, verbose_name='Название вида исследования')),
+                ('modality', models.CharField(blank=True, max_length=50, null=True, verbose_name='Модальность исследования')),
+                ('up_value', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='УП за исследование')),
+            ],
+            options={
+                'db_table': 'study_types',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Study',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Идентификатор исследования')),
+                ('research_number', models.CharField(max_length=50, unique=True, verbose_name='Номер исследования')),
+                ('status', models.CharField(blank=True, max_length=50, null=True, verbose_name='Статус исследования')),
+                ('priority', models.CharField(blank=True, default='normal', max_length=20, null=True, verbose_name='Приоритет исследования')),
+                ('created_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата создания')),
+                ('planned_at', models.DateTimeField(blank=True, null=True, verbose_name='Плановая дата исследования')),
+                ('study_type', models.ForeignKey(blank=True, db_column='study_type_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='api.studytype', verbose_name='Тип исследования')),
+                ('diagnostician', models.ForeignKey(blank=True, db_column='diagnostician_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='studies', to='api.doctor', verbose_name='Диагност')),
+            ],
+            options={
+                'db_table': 'studies',
+                'ordering': ['-created_at'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('table_name', models.CharField(max_length=50, verbose_name='Таблица')),
+                ('row_id', models.IntegerField(verbose_name='Идентификатор строки')),
+                ('operation', models.CharField(max_length=1, verbose_name='Операция')),
+                ('xid', models.BigIntegerField(verbose_name='Номер транзакции')),
+                ('changed_at', models.DateTimeField(verbose_name='Дата изменения')),
+            ],
+            options={
+                'db_table': 'change_log',
+                'indexes': [models.Index(fields=['table_name', 'xid'], name='change_log_table_xid_idx'), models.Index(fields=['changed_at'], name='change_log_changed_at_idx')],
+            },
+        ),
+        migrations.RunSQL(CHANGE_LOG_SQL, DROP_CHANGE_LOG_SQL),
+    ]
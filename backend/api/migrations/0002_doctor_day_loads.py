@@ -0,0 +1,107 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Триггер уровня оператора: изменения пакета исследований сворачиваются
+# в дельты по ключу (врач, местная дата, статус, приоритет) и одним
+# INSERT ... ON CONFLICT прибавляются к свёртке. Старые версии строк
+# вычитаются, новые прибавляются, поэтому переназначение и смена статуса
+# переносят исследование между ключами. Часовой пояс передаётся аргументом.
+ROLLUP_SQL = """
+CREATE OR REPLACE FUNCTION doctor_day_loads_apply() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT *, 1 AS sign FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT *, -1 AS sign FROM old_rows';
+    ELSE
+        changes := 'SELECT *, 1 AS sign FROM new_rows
+                    UNION ALL SELECT *, -1 AS sign FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO doctor_day_loads AS l
+            (doctor_id, work_date, status, priority, study_count, total_up)
+        SELECT c.diagnostician_id,
+               (c.created_at AT TIME ZONE %L)::date,
+               coalesce(c.status, ''),
+               coalesce(c.priority, ''),
+               sum(c.sign),
+               sum(c.sign * coalesce(t.up_value, 0))
+        FROM (%s) AS c
+        LEFT JOIN study_types t ON t.id = c.study_type_id
+        WHERE c.diagnostician_id IS NOT NULL AND c.created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        HAVING sum(c.sign) <> 0 OR sum(c.sign * coalesce(t.up_value, 0)) <> 0
+        ON CONFLICT (doctor_id, work_date, status, priority) DO UPDATE
+        SET study_count = l.study_count + EXCLUDED.study_count,
+            total_up = l.total_up + EXCLUDED.total_up
+    $sql$, TG_ARGV[0], changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER studies_day_loads_insert AFTER INSERT ON studies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION doctor_day_loads_apply(%(time_zone)s);
+CREATE TRIGGER studies_day_loads_update AFTER UPDATE ON studies
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION doctor_day_loads_apply(%(time_zone)s);
+CREATE TRIGGER studies_day_loads_delete AFTER DELETE ON studies
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION doctor_day_loads_apply(%(time_zone)s);
+
+INSERT INTO doctor_day_loads
+    (doctor_id, work_date, status, priority, study_count, total_up)
+SELECT s.diagnostician_id,
+       (s.created_at AT TIME ZONE %(time_zone)s)::date,
+       coalesce(s.status, ''),
+       coalesce(s.priority, ''),
+       count(*),
+       coalesce(sum(t.up_value), 0)
+FROM studies s
+LEFT JOIN study_types t ON t.id = s.study_type_id
+WHERE s.diagnostician_id IS NOT NULL AND s.created_at IS NOT NULL
+GROUP BY 1, 2, 3, 4;
+"""
+
+DROP_ROLLUP_SQL = """
+DROP TRIGGER IF EXISTS studies_day_loads_insert ON studies;
+DROP TRIGGER IF EXISTS studies_day_loads_update ON studies;
+DROP TRIGGER IF EXISTS studies_day_loads_delete ON studies;
+DROP FUNCTION IF EXISTS doctor_day_loads_apply();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDayLoad',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('doctor_id', models.IntegerField(verbose_name='Идентификатор врача')),
+                ('work_date', models.DateField(verbose_name='Дата')),
+                ('status', models.CharField(blank=True, default='', max_length=50, verbose_name='Статус')),
+                ('priority', models.CharField(blank=True, default='', max_length=20, verbose_name='Приоритет')),
+                ('study_count', models.IntegerField(default=0, verbose_name='Количество исследований')),
+                ('total_up', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Сумма УП')),
+            ],
+            options={
+                'db_table': 'doctor_day_loads',
+                'indexes': [models.Index(fields=['work_date', 'doctor_id'], name='doctor_day_loads_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor_id', 'work_date', 'status', 'priority'), name='doctor_day_loads_key')],
+            },
+        ),
+        migrations.RunSQL(
+            ROLLUP_SQL.replace("%(time_zone)s", "'%s'" % settings.TIME_ZONE),
+            DROP_ROLLUP_SQL,
+        ),
+    ]
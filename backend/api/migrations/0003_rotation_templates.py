@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:58
+
+import datetime
+
+from django.db import migrations, models
+
+# Типовые графики, доступные сразу после миграции
+DEFAULT_TEMPLATES = [
+    {"name": "5/2", "pattern": "DDDDD--", "day_start": datetime.time(8), "day_end": datetime.time(17)},
+    {"name": "2/2", "pattern": "DD--"},
+    {"name": "День-ночь-отсыпной-выходной", "pattern": "DN--"},
+    {"name": "Ночи 2/2", "pattern": "NN--"},
+]
+
+
+def create_default_templates(apps, schema_editor):
+    RotationTemplate = apps.get_model("api", "RotationTemplate")
+    for template in DEFAULT_TEMPLATES:
+        RotationTemplate.objects.get_or_create(
+            name=template["name"], defaults=template
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_doctor_day_loads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RotationTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('pattern', models.CharField(max_length=62, verbose_name='Цикл смен')),
+                ('day_start', models.TimeField(default=datetime.time(8, 0), verbose_name='Начало дневной смены')),
+                ('day_end', models.TimeField(default=datetime.time(20, 0), verbose_name='Конец дневной смены')),
+                ('night_start', models.TimeField(default=datetime.time(20, 0), verbose_name='Начало ночной смены')),
+                ('night_end', models.TimeField(default=datetime.time(8, 0), verbose_name='Конец ночной смены')),
+                ('planned_up', models.IntegerField(blank=True, null=True, verbose_name='Планируемые УП на смену')),
+            ],
+            options={
+                'db_table': 'rotation_templates',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(create_default_templates, migrations.RunPython.noop),
+    ]
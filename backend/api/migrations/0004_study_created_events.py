@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:20
+
+from django.db import migrations
+
+# Событие study_created публикует база: триггер срабатывает на любой INSERT
+# в studies — и из приёма пакетов, и прямую вставку РИС в обход API.
+# Канал и формат — как у api.events.publish (EVENTS_CHANNEL, события
+# {"type", "data"}); NOTIFY доставляется после фиксации транзакции.
+# Крупная вставка (больше MAX_EVENTS_PER_BATCH строк) — одно queue_changed.
+STUDY_CREATED_SQL = """
+CREATE OR REPLACE FUNCTION studies_notify_created() RETURNS trigger AS $$
+DECLARE
+    inserted integer;
+BEGIN
+    SELECT count(*) INTO inserted FROM new_rows;
+    IF inserted > 500 THEN
+        PERFORM pg_notify('rad_events', json_build_object(
+            'type', 'queue_changed',
+            'data', json_build_object('count', inserted)
+        )::text);
+    ELSE
+        PERFORM pg_notify('rad_events', json_build_object(
+            'type', 'study_created',
+            'data', json_build_object(
+                'study_id', id, 'priority', priority, 'study_type_id', study_type_id
+            )
+        )::text)
+        FROM new_rows
+        ORDER BY id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER studies_notify_created AFTER INSERT ON studies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION studies_notify_created();
+"""
+
+DROP_STUDY_CREATED_SQL = """
+DROP TRIGGER IF EXISTS studies_notify_created ON studies;
+DROP FUNCTION IF EXISTS studies_notify_created();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_rotation_templates'),
+    ]
+
+    operations = [
+        migrations.RunSQL(STUDY_CREATED_SQL, DROP_STUDY_CREATED_SQL),
+    ]
@@ -8,13 +8,26 @@
 - Schedule: Управляет расписанием врачей, включая рабочие часы и выходные дни.
 - Study: Представляет отдельные медицинские исследования со статусом, приоритетом и назначениями.
 
+- ChangeLog: Журнал изменений строк studies и schedules для дельта-синхронизации.
+- DoctorDayLoad: Свёртка нагрузки врача по дням, статусам и приоритетам.
+- RotationTemplate: Шаблон графика смен (5/2, 2/2, сутки и т.п.).
+
 Каждая модель соответствует определённой таблице базы данных и включает соответствующие поля
 и метаданные для интеграции с существующей схемой базы данных.
 """
 
+from datetime import time
+
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
 
+# Порядок приоритетов в очереди: CITO → ASAP → плановые
+PRIORITY_RANK = {"cito": 0, "asap": 1, "normal": 2}
+# Статусы, в которых исследование можно назначить врачу (подписанное — нельзя)
+ASSIGNABLE_STATUSES = ("pending", "confirmed")
+# Коды дней цикла шаблона смен: дневная смена, ночная смена, выходной
+SHIFT_CODES = {"D": "day", "N": "night", "-": None}
+
 class Doctor(models.Model):
     """
     Модель врача.
@@ -136,6 +149,24 @@ class Schedule(models.Model):
         return f"Schedule {self.id} - {self.work_date}"
 
 
+class StudyQuerySet(models.QuerySet):
+    """Выборки исследований с общими для API вычисляемыми полями."""
+
+    def with_priority_rank(self):
+        """Добавляет поле priority_rank (0 — CITO, 1 — ASAP, 2 — остальные)."""
+        return self.annotate(
+            priority_rank=models.Case(
+                *[
+                    models.When(priority=priority, then=models.Value(rank))
+                    for priority, rank in PRIORITY_RANK.items()
+                    if priority != "normal"
+                ],
+                default=models.Value(PRIORITY_RANK["normal"]),
+                output_field=models.IntegerField(),
+            )
+        )
+
+
 class Study(models.Model):
     """
     Модель исследования.
@@ -193,6 +224,8 @@ class Study(models.Model):
         verbose_name="Диагност",
     )
 
+    objects = StudyQuerySet.as_manager()
+
     class Meta:
         db_table = "studies"
         managed = False
@@ -200,3 +233,114 @@ class Study(models.Model):
 
     def __str__(self):
         return self.research_number
+
+
+class ChangeLog(models.Model):
+    """
+    Модель журнала изменений.
+
+    Фиксирует вставки, обновления и удаления строк таблиц studies и schedules
+    для дельта-синхронизации клиентов:
+    - table_name: Имя изменённой таблицы
+    - row_id: Идентификатор изменённой строки
+    - operation: Операция (I - вставка, U - обновление, D - удаление,
+      P - отметка очистки журнала)
+    - xid: Номер транзакции, в которой произошло изменение
+    - changed_at: Дата и время изменения
+
+    Журнал заполняется триггерами базы данных (см. миграцию), поэтому
+    в него попадают и изменения, сделанные в обход приложения.
+    В отличие от остальных моделей таблица управляется Django.
+    """
+    id = models.BigAutoField(primary_key=True)
+    table_name = models.CharField(max_length=50, verbose_name="Таблица")
+    row_id = models.IntegerField(verbose_name="Идентификатор строки")
+    operation = models.CharField(max_length=1, verbose_name="Операция")
+    xid = models.BigIntegerField(verbose_name="Номер транзакции")
+    changed_at = models.DateTimeField(verbose_name="Дата изменения")
+
+    class Meta:
+        db_table = "change_log"
+        indexes = [
+            models.Index(fields=["table_name", "xid"], name="change_log_table_xid_idx"),
+            models.Index(fields=["changed_at"], name="change_log_changed_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.table_name}:{self.row_id} {self.operation}"
+
+
+class DoctorDayLoad(models.Model):
+    """
+    Модель свёртки нагрузки врача по дням.
+
+    Хранит количество исследований и сумму УП врача за день (по местной
+    дате created_at) в разрезе статуса и приоритета:
+    - doctor_id: Идентификатор врача
+    - work_date: Дата
+    - status: Статус исследований ('' для пустого статуса)
+    - priority: Приоритет исследований ('' для пустого приоритета)
+    - study_count: Количество исследований
+    - total_up: Сумма УП
+
+    Свёртка обновляется триггером на таблице studies при каждом назначении,
+    переназначении и смене статуса (см. миграцию) и перестраивается
+    командой rebuild_load_rollup. Таблица управляется Django.
+    """
+    id = models.BigAutoField(primary_key=True)
+    doctor_id = models.IntegerField(verbose_name="Идентификатор врача")
+    work_date = models.DateField(verbose_name="Дата")
+    status = models.CharField(max_length=50, blank=True, default="", verbose_name="Статус")
+    priority = models.CharField(max_length=20, blank=True, default="", verbose_name="Приоритет")
+    study_count = models.IntegerField(default=0, verbose_name="Количество исследований")
+    total_up = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, verbose_name="Сумма УП"
+    )
+
+    class Meta:
+        db_table = "doctor_day_loads"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["doctor_id", "work_date", "status", "priority"],
+                name="doctor_day_loads_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["work_date", "doctor_id"], name="doctor_day_loads_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} {self.work_date} {self.status}/{self.priority}"
+
+
+class RotationTemplate(models.Model):
+    """
+    Модель шаблона графика смен.
+
+    Описывает повторяющийся цикл смен, из которого генерируется расписание:
+    - name: Название шаблона
+    - pattern: Цикл по дням: D - дневная смена, N - ночная, "-" - выходной
+      (например, "DDDDD--" для 5/2, "DD--" для 2/2, "DN--" для суток)
+    - day_start, day_end: Время дневной смены
+    - night_start, night_end: Время ночной смены (конец раньше начала -
+      смена заканчивается на следующий день)
+    - planned_up: Планируемое количество УП на смену
+
+    Цикл отсчитывается от эпохи api.rotations.ROTATION_EPOCH (понедельник),
+    поэтому соседние периоды продолжают цикл без разрыва. Таблица
+    управляется Django.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+    pattern = models.CharField(max_length=62, verbose_name="Цикл смен")
+    day_start = models.TimeField(default=time(8), verbose_name="Начало дневной смены")
+    day_end = models.TimeField(default=time(20), verbose_name="Конец дневной смены")
+    night_start = models.TimeField(default=time(20), verbose_name="Начало ночной смены")
+    night_end = models.TimeField(default=time(8), verbose_name="Конец ночной смены")
+    planned_up = models.IntegerField(blank=True, null=True, verbose_name="Планируемые УП на смену")
+
+    class Meta:
+        db_table = "rotation_templates"
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} ({self.pattern})"
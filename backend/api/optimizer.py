@@ -0,0 +1,296 @@
+"""
+Модуль оптимизации расписания смен под ожидаемый поток УП.
+
+Потребность — УП по дням и модальностям (по умолчанию прогноз
+api/forecast.py). Оптимизатор подбирает смены так, чтобы покрыть
+потребность с минимальным простоем: каждый день врачи добавляются
+жадно по одному — выбирается тот, кто закроет больше всего оставшейся
+потребности своих модальностей с наименьшим недоиспользованием
+max_up_per_day; его УП распределяются сначала на самые дефицитные
+модальности. Ограничения врача:
+- дни с выходным в расписании недоступны, уже назначенные рабочие смены
+  учитываются в покрытии и не меняются;
+- число смен за период — MONTH_SHIFTS на месяц, пропорционально норме
+  положения (40 у заведующего против 50, как в with_load) и длине периода;
+- не больше MAX_CONSECUTIVE_DAYS рабочих дней подряд (с учётом смен
+  перед периодом).
+Врачи с большим остатком нормы при прочих равных выбираются раньше,
+поэтому смены распределяются равномерно.
+
+Расчёт выполняется операциями NumPy над массивами «врач × модальность»
+и занимает доли секунды на месяц и сотни врачей. Оптимизатор ничего не
+пишет: план возвращается вместе с метриками покрытия и записывается
+отдельным запросом после утверждения (api.rotations.write_schedules).
+"""
+
+import math
+from collections import defaultdict
+from datetime import time, timedelta
+
+import numpy as np
+from asgiref.sync import async_to_sync
+
+from .forecast import demand_forecast
+from .loads import norm_up_for
+from .models import Schedule
+from .planning import DEFAULT_MAX_UP
+from .reference import reference_data
+from .rotations import ON_CONFLICT, unknown_doctors, write_schedules
+
+# Смен в месяц при полной норме положения
+MONTH_SHIFTS = 22
+MAX_CONSECUTIVE_DAYS = 5
+# Смена не открывается, если закроет меньше стольких УП потребности
+MIN_SHIFT_UP = 10
+# Вес недоиспользованных УП смены при выборе врача
+IDLE_PENALTY = 0.5
+# Надбавка к оценке врача с неизрасходованной нормой смен, УП
+FAIRNESS_BONUS = 5
+MAX_OPTIMIZE_DAYS = 31
+# Время смены в плане по умолчанию (дневная смена шаблонов графиков)
+SHIFT_START = time(8)
+SHIFT_END = time(20)
+DEMAND_LEVELS = ("forecast", "high")
+
+
+def forecast_demand(date_from, date_to, level="forecast"):
+    """Потребность {(дата, модальность): УП} по прогнозу (или его верхней границе)."""
+    if level not in DEMAND_LEVELS:
+        raise ValueError(f"demand_level must be one of: {', '.join(DEMAND_LEVELS)}")
+    field = "up_high" if level == "high" else "up"
+    forecast = async_to_sync(demand_forecast)(date_from, date_to)
+    return {
+        (point["date"], point["modality"]): point[field]
+        for point in forecast["series"]
+        if point["modality"] is not None
+    }
+
+
+def shift_budget(position_type, days):
+    """Сколько смен врач может получить за период из days дней."""
+    share = norm_up_for(position_type) / norm_up_for(None)
+    return math.ceil(MONTH_SHIFTS * share * days / 30)
+
+
+def _allocate(remaining, skills, capacity, available, position):
+    """
+    Распределяет УП смены врача position по его модальностям, уменьшая
+    remaining. Первыми закрываются самые дефицитные модальности — с
+    наибольшей долей потребности от мощности доступных врачей.
+    Возвращает {индекс модальности: УП}.
+    """
+    pool = capacity[available] @ skills[available] + capacity[position]
+    scarcity = remaining / pool
+    limit = capacity[position]
+    allocation = {}
+    for modality in sorted(np.flatnonzero(skills[position]), key=lambda m: -scarcity[m]):
+        share = min(remaining[modality], limit)
+        if share > 0:
+            allocation[int(modality)] = float(share)
+            remaining[modality] -= share
+            limit -= share
+    return allocation
+
+
+def optimize_shifts(date_from, date_to, demand, doctor_ids=None):
+    """
+    План смен за [date_from, date_to], покрывающий потребность demand
+    ({(дата, модальность): УП}).
+
+    doctor_ids — врачи, которым можно назначать смены (по умолчанию все
+    активные). Возвращает предлагаемые смены, покрытие по дням и итоговые
+    метрики; в базу ничего не пишет. Неверный период и неизвестные
+    врачи — ValueError.
+    """
+    days = (date_to - date_from).days + 1
+    if not 1 <= days <= MAX_OPTIMIZE_DAYS:
+        raise ValueError(f"date_to must be within {MAX_OPTIMIZE_DAYS} days after date_from")
+    if doctor_ids is None:
+        doctors = reference_data().doctor_list(is_active=True)
+    else:
+        missing = unknown_doctors(doctor_ids)
+        if missing:
+            raise ValueError(f"Unknown doctors: {', '.join(map(str, missing))}")
+        doctors = reference_data().doctors_by_ids(sorted(set(doctor_ids)))
+
+    dates = [date_from + timedelta(days=offset) for offset in range(days)]
+    modalities = sorted({modality for _, modality in demand})
+    modality_index = {modality: position for position, modality in enumerate(modalities)}
+    need = np.zeros((days, len(modalities)))
+    for (day, modality), up in demand.items():
+        if date_from <= day <= date_to:
+            need[(day - date_from).days, modality_index[modality]] += max(float(up), 0)
+
+    doctor_index = {doctor.id: position for position, doctor in enumerate(doctors)}
+    capacity = np.array([doctor.max_up_per_day or DEFAULT_MAX_UP for doctor in doctors], dtype=float)
+    skills = np.zeros((len(doctors), len(modalities)), dtype=bool)
+    for position, doctor in enumerate(doctors):
+        for modality in doctor.modality or ():
+            if modality in modality_index:
+                skills[position, modality_index[modality]] = True
+    budget = np.array([shift_budget(doctor.position_type, days) for doctor in doctors])
+
+    # Существующее расписание: выходные закрывают день, рабочие смены уже в плане
+    # (несколько строк врача на день — одна смена). Рабочие дни перед периодом
+    # продолжают серию подряд идущих смен.
+    day_off = np.zeros((len(doctors), days), dtype=bool)
+    worked_before = np.zeros((len(doctors), MAX_CONSECUTIVE_DAYS), dtype=bool)
+    existing = defaultdict(set)
+    for doctor_id, work_date, is_day_off in Schedule.objects.filter(
+        doctor_id__in=list(doctor_index),
+        work_date__gte=date_from - timedelta(days=MAX_CONSECUTIVE_DAYS),
+        work_date__lte=date_to,
+    ).values_list("doctor_id", "work_date", "is_day_off"):
+        position, day = doctor_index[doctor_id], (work_date - date_from).days
+        if day < 0:
+            # Последний столбец — день перед date_from
+            worked_before[position, day] |= not is_day_off
+        elif is_day_off:
+            day_off[position, day] = True
+        else:
+            existing[day].add(position)
+
+    left = budget.copy()
+    for positions in existing.values():
+        left[list(positions)] -= 1
+    streak = np.zeros(len(doctors), dtype=int)
+    for working in worked_before.T:
+        streak = np.where(working, streak + 1, 0)
+    proposed = []
+    covered = np.zeros_like(need)
+    staffed = np.zeros(days)
+
+    for day in range(days):
+        remaining = need[day].copy()
+        working = np.zeros(len(doctors), dtype=bool)
+
+        # Уже назначенные смены покрывают потребность в первую очередь
+        for position in sorted(existing[day]):
+            working[position] = True
+            staffed[day] += capacity[position]
+            _allocate(remaining, skills, capacity, ~day_off[:, day], position)
+
+        available = (
+            ~day_off[:, day]
+            & ~working
+            & (left > 0)
+            & (streak < MAX_CONSECUTIVE_DAYS)
+            & skills.any(axis=1)
+        )
+        while available.any():
+            useful = np.minimum(capacity, skills @ remaining)
+            score = (
+                useful
+                - IDLE_PENALTY * (capacity - useful)
+                + FAIRNESS_BONUS * left / np.maximum(budget, 1)
+            )
+            score[~available | (useful < MIN_SHIFT_UP)] = -np.inf
+            position = int(np.argmax(score))
+            if score[position] == -np.inf:
+                break
+            allocation = _allocate(remaining, skills, capacity, available, position)
+            available[position] = False
+            working[position] = True
+            left[position] -= 1
+            staffed[day] += capacity[position]
+            proposed.append(
+                {
+                    "doctor_id": doctors[position].id,
+                    "work_date": dates[day],
+                    "time_start": SHIFT_START,
+                    "time_end": SHIFT_END,
+                    "is_day_off": 0,
+                    "planned_up": math.ceil(sum(allocation.values())),
+                    "modalities": {
+                        modalities[modality]: round(up, 1)
+                        for modality, up in allocation.items()
+                    },
+                }
+            )
+
+        covered[day] = need[day] - remaining
+        streak = np.where(working, streak + 1, 0)
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "schedules": proposed,
+        "coverage": coverage_metrics(
+            need, covered, staffed, len(proposed), sum(map(len, existing.values()))
+        ),
+        "days": [
+            {
+                "date": dates[day],
+                "demand_up": round(float(need[day].sum()), 1),
+                "covered_up": round(float(covered[day].sum()), 1),
+                "staffed_up": round(float(staffed[day]), 1),
+                "modalities": {
+                    modality: {
+                        "demand_up": round(float(need[day, index]), 1),
+                        "covered_up": round(float(covered[day, index]), 1),
+                    }
+                    for modality, index in modality_index.items()
+                },
+            }
+            for day in range(days)
+        ],
+        "doctors": len(doctors),
+    }
+
+
+def coverage_metrics(need, covered, staffed, proposed, existing):
+    """
+    Итоги плана: потребность и покрытие УП, простой (мощность смен сверх
+    покрытой потребности) и количество смен.
+    """
+    demand_up = float(need.sum())
+    covered_up = float(covered.sum())
+    staffed_up = float(staffed.sum())
+    return {
+        "demand_up": round(demand_up, 1),
+        "covered_up": round(covered_up, 1),
+        "uncovered_up": round(demand_up - covered_up, 1),
+        "coverage_percentage": round(covered_up / demand_up * 100, 1) if demand_up else 100.0,
+        "staffed_up": round(staffed_up, 1),
+        "idle_up": round(staffed_up - covered_up, 1),
+        "overstaffing_percentage": (
+            round((staffed_up - covered_up) / covered_up * 100, 1) if covered_up else 0.0
+        ),
+        "proposed_shifts": proposed,
+        "existing_shifts": existing,
+    }
+
+
+def save_plan(schedules, on_conflict="skip", dry_run=False):
+    """
+    Записывает утверждённый план schedules (словари с doctor_id, work_date и
+    необязательными time_start, time_end, planned_up) одной транзакцией.
+
+    Занятые дни обрабатываются по on_conflict, как в apply_rotation.
+    Неверные параметры и неизвестные врачи — ValueError.
+    """
+    if on_conflict not in ON_CONFLICT:
+        raise ValueError(f"on_conflict must be one of: {', '.join(ON_CONFLICT)}")
+    doctor_ids = sorted({shift["doctor_id"] for shift in schedules})
+    missing = unknown_doctors(doctor_ids)
+    if missing:
+        raise ValueError(f"Unknown doctors: {', '.join(map(str, missing))}")
+    plan = {(shift["doctor_id"], shift["work_date"]): shift for shift in schedules}
+    if len(plan) < len(schedules):
+        raise ValueError("At most one shift per doctor and day")
+
+    rows = [
+        Schedule(
+            doctor_id=shift["doctor_id"],
+            work_date=shift["work_date"],
+            time_start=shift.get("time_start") or SHIFT_START,
+            time_end=shift.get("time_end") or SHIFT_END,
+            is_day_off=0,
+            planned_up=shift.get("planned_up"),
+        )
+        for shift in schedules
+    ]
+    date_from = min(shift["work_date"] for shift in schedules)
+    date_to = max(shift["work_date"] for shift in schedules)
+    result = write_schedules(rows, doctor_ids, date_from, date_to, on_conflict, dry_run)
+    return {**result, "doctors": len(doctor_ids), "dry_run": dry_run}
@@ -0,0 +1,252 @@
+"""
+Модуль keyset-пагинации (по курсору).
+
+Страница выбирается условием «ключ сортировки строго больше ключа последней
+строки предыдущей страницы», а не через OFFSET, поэтому время получения
+любой страницы не зависит от её номера при наличии индекса по ключу.
+Курсор — закодированные значения ключа последней строки.
+
+Условие записывается одним сравнением строк PostgreSQL
+(k1, k2, id) > (v1, v2, v3), которое читается как диапазон индекса по
+(k1, k2, id). Поэтому ключ не должен содержать NULL: поле даты, которое
+может быть NULL, входит в ключ как COALESCE(поле, граница), где граница —
+наименьшая дата при сортировке по убыванию и наибольшая при сортировке
+по возрастанию (строки без даты идут в конце). Индексы под эти ключи
+перечислены в api.indexes.
+
+Пагинация включается только если клиент передал page_size или cursor:
+без них эндпоинты отдают полный список, как и раньше.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import BooleanField, DateTimeField, Expression, F, Value
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Значения вместо NULL в ключе: строки без даты идут после всех остальных
+NULL_DATETIME_DESC = datetime.min.replace(tzinfo=timezone.utc)
+NULL_DATETIME_ASC = datetime.max.replace(tzinfo=timezone.utc)
+
+
+def query_plan(queryset, **options):
+    """План запроса PostgreSQL (EXPLAIN (FORMAT JSON)) в виде словаря."""
+    plan = json.loads(queryset.explain(format="json", **options))
+    # Драйвер отдаёт план списком из одного элемента или уже самим элементом
+    # (Django склеивает разобранный драйвером список в строку)
+    return plan[0] if isinstance(plan, list) else plan
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк выборки по плану запроса PostgreSQL.
+
+    Не выполняет COUNT(*): берёт «Plan Rows» из EXPLAIN, что стоит
+    одного обращения к планировщику независимо от размера таблицы.
+    """
+    return int(query_plan(queryset.order_by())["Plan"]["Plan Rows"])
+
+
+def keyset_key(queryset, ordering):
+    """
+    Выражения ключа сортировки ordering (поля, «-» — по убыванию) для
+    queryset: поле даты, допускающее NULL, заменяется на COALESCE с
+    границей. Все поля ключа должны сортироваться в одном направлении.
+    """
+    descending = {field.startswith("-") for field in ordering}
+    if len(descending) != 1:
+        raise ValueError("Keyset ordering fields must share one direction")
+    descending = descending.pop()
+
+    key = []
+    for field in ordering:
+        name = field.lstrip("-")
+        try:
+            model_field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Вычисляемое поле (annotate) — без NULL
+            key.append(F(name))
+            continue
+        if not model_field.null:
+            key.append(F(model_field.attname))
+        elif isinstance(model_field, DateTimeField):
+            bound = NULL_DATETIME_DESC if descending else NULL_DATETIME_ASC
+            key.append(Coalesce(F(name), Value(bound, output_field=DateTimeField())))
+        else:
+            raise ValueError(f"Keyset field {name} may be NULL")
+    return key, descending
+
+
+def keyset_order_by(queryset, ordering):
+    """queryset, упорядоченный по ключу keyset_key(ordering)."""
+    key, descending = keyset_key(queryset, ordering)
+    return queryset.order_by(
+        *(expression.desc() if descending else expression.asc() for expression in key)
+    )
+
+
+class RowAfter(Expression):
+    """Сравнение строк (k1, k2, ...) > (v1, v2, ...) (при descending — «<»)."""
+
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, key, values, descending):
+        super().__init__()
+        self.key = list(key)
+        self.values = list(values)
+        self.descending = descending
+
+    def get_source_expressions(self):
+        return [*self.key, *self.values]
+
+    def set_source_expressions(self, exprs):
+        self.key, self.values = list(exprs[: len(self.key)]), list(exprs[len(self.key) :])
+
+    def as_sql(self, compiler, connection):
+        parts, params = [], []
+        for expressions in (self.key, self.values):
+            sqls = []
+            for expression in expressions:
+                sql, expression_params = compiler.compile(expression)
+                sqls.append(sql)
+                params.extend(expression_params)
+            parts.append(f"({', '.join(sqls)})")
+        operator = "<" if self.descending else ">"
+        return f"{parts[0]} {operator} {parts[1]}", params
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по составному ключу сортировки.
+
+    Порядок задаётся атрибутом представления keyset_orderings
+    ({action: (поле, ...)}, «-» — по убыванию); последним полем ключа
+    должно быть уникальное поле (id), все поля сортируются в одном
+    направлении. Строки с NULL в поле даты идут в конце.
+    """
+
+    page_size = 50
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    default_ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, view):
+        orderings = getattr(view, "keyset_orderings", {})
+        return orderings.get(getattr(view, "action", None), self.default_ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor, ordering):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def after(self, key, descending, values):
+        """Условие «ключ строки строго после ключа values» (одно сравнение строк)."""
+        bounds = []
+        for expression, value in zip(key, values):
+            if isinstance(expression, Coalesce):
+                # NULL в курсоре — строка без даты, её ключ — граница COALESCE
+                null_bound = expression.source_expressions[1]
+                bounds.append(
+                    null_bound
+                    if value is None
+                    else Value(value, output_field=null_bound.output_field)
+                )
+            else:
+                bounds.append(Value(value))
+        return RowAfter(key, bounds, descending)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (
+            self.page_size_query_param not in params
+            and self.cursor_query_param not in params
+        ):
+            return None
+
+        self.request = request
+        ordering = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+
+        key, descending = keyset_key(queryset, ordering)
+        queryset = queryset.order_by(
+            *(expression.desc() if descending else expression.asc() for expression in key)
+        )
+
+        self.count_estimate = None
+        if params.get(self.count_query_param, "").lower() == "true":
+            self.count_estimate = estimate_count(queryset)
+
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                self.after(key, descending, self.decode_cursor(cursor, ordering))
+            )
+
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        page = rows[:page_size]
+
+        self.next_cursor = None
+        if self.has_next:
+            last = page[-1]
+            # Страница может состоять из объектов моделей или словарей values()
+            if isinstance(last, dict):
+                values = [last[field.lstrip("-")] for field in ordering]
+            else:
+                values = [getattr(last, field.lstrip("-")) for field in ordering]
+            self.next_cursor = self.encode_cursor(values)
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict(
+            [
+                ("next", self.get_next_link()),
+                ("next_cursor", self.next_cursor),
+                ("results", data),
+            ]
+        )
+        if self.count_estimate is not None:
+            payload["count_estimate"] = self.count_estimate
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        properties = {
+            "next": {"type": "string", "nullable": True, "format": "uri"},
+            "next_cursor": {"type": "string", "nullable": True},
+            "count_estimate": {"type": "integer"},
+            "results": schema,
+        }
+        return {"type": "object", "required": ["results"], "properties": properties}
@@ -0,0 +1,79 @@
+"""
+Модуль параллельного выполнения запросов к базе для асинхронных представлений.
+
+ORM Django синхронный, и sync_to_async по умолчанию выполняет все вызовы
+запроса в одном потоке — независимые агрегаты идут друг за другом.
+run_parallel раздаёт их потокам пула размером DB_POOL_SIZE: у каждого
+потока своё соединение с PostgreSQL, поэтому запросы выполняются
+одновременно и время ответа определяется самым долгим из них, а не суммой.
+
+Соединения потоков пула не закрываются после запроса и переиспользуются
+DB_POOL_CONN_MAX_AGE секунд (соединение с ошибкой закрывается сразу),
+то есть пул потоков служит и пулом соединений: больше DB_POOL_SIZE
+соединений на процесс он не открывает.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_POOL_SIZE, thread_name_prefix="db-pool"
+)
+# Соединения, для которых поток пула уже назначил срок жизни
+_local = threading.local()
+
+
+def _release_connections():
+    opened = getattr(_local, "opened", None)
+    if opened is None:
+        opened = _local.opened = {}
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None and opened.get(conn.alias) is not conn.connection:
+            # Новое соединение: срок жизни пула вместо CONN_MAX_AGE
+            opened[conn.alias] = conn.connection
+            conn.close_at = time.monotonic() + settings.DB_POOL_CONN_MAX_AGE
+        conn.close_if_unusable_or_obsolete()
+
+
+def _pooled(func):
+    def call():
+        try:
+            return func()
+        finally:
+            _release_connections()
+
+    return call
+
+
+async def run_parallel(*calls):
+    """
+    Выполняет функции без аргументов (например, functools.partial с запросами
+    ORM) одновременно в потоках пула. Возвращает результаты в том же порядке.
+    """
+    return await asyncio.gather(
+        *(
+            sync_to_async(_pooled(call), thread_sensitive=False, executor=_executor)()
+            for call in calls
+        )
+    )
+
+
+def close_pool_connections():
+    """
+    Закрывает соединения всех потоков пула (перед удалением базы, например
+    тестовой). Барьер занимает каждый поток пула ровно одной задачей.
+    """
+    barrier = threading.Barrier(settings.DB_POOL_SIZE)
+
+    def close():
+        barrier.wait()
+        connections.close_all()
+
+    for future in [_executor.submit(close) for _ in range(settings.DB_POOL_SIZE)]:
+        future.result()
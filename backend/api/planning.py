@@ -0,0 +1,132 @@
+"""
+Модуль сетки планирования смен «врачи × дни».
+
+Сетка собирается на сервере целиком: врачи берутся из справочника
+в памяти, смены — одним запросом к schedules за период, фактическая
+нагрузка и количество исследований — одним сгруппированным запросом
+к свёртке doctor_day_loads. Ячейка содержит смену, план и факт УП,
+количество исследований и статус загрузки, поэтому клиенту не нужно
+загружать исследования недели и сопоставлять их с ячейками.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Q, Sum
+
+from .loads import LOAD_STATUSES
+from .models import Schedule
+from .reference import reference_data
+from .rollup import rollup_queryset
+from .serializers import ScheduleSerializer
+
+# Пределы сетки по количеству дней
+DEFAULT_GRID_DAYS = 7
+MAX_GRID_DAYS = 31
+# Доля плановой загрузки от max_up_per_day для статусов ячейки, %
+WARNING_PERCENTAGE = 80
+OVERLOAD_PERCENTAGE = 95
+# max_up_per_day по умолчанию, как в модели врача
+DEFAULT_MAX_UP = 120
+
+
+def week_start(day):
+    """Понедельник недели, в которую входит day."""
+    return day - timedelta(days=day.weekday())
+
+
+def load_status(schedule, percentage):
+    """Статус ячейки: empty (нет смены или выходной), normal, warning, overload."""
+    if schedule is None or schedule["is_day_off"] != 0:
+        return "empty"
+    if percentage > OVERLOAD_PERCENTAGE:
+        return "overload"
+    if percentage >= WARNING_PERCENTAGE:
+        return "warning"
+    return "normal"
+
+
+def grid_cell(day, schedule, max_up, fact):
+    planned_up = (schedule["planned_up"] or 0) if schedule else 0
+    working = schedule is not None and schedule["is_day_off"] == 0
+    percentage = round(planned_up / max_up * 100, 1) if working and max_up else 0
+    return {
+        "date": day,
+        "schedule": schedule,
+        "planned_up": planned_up,
+        "actual_up": float(fact.get("actual_up") or 0),
+        "study_count": fact.get("study_count") or 0,
+        "load_percentage": percentage,
+        "load_status": load_status(schedule, percentage),
+    }
+
+
+def shift_grid(date_from, days=DEFAULT_GRID_DAYS, doctor_id=None, is_active=None):
+    """
+    Сетка смен за days дней начиная с date_from.
+
+    Возвращает {"dates": [...], "rows": [{врач, "cells": [...]}], "stats": {...}}.
+    """
+    dates = [date_from + timedelta(days=offset) for offset in range(days)]
+    date_to = dates[-1] + timedelta(days=1)
+
+    doctors = reference_data().doctor_list(is_active)
+    if doctor_id is not None:
+        doctors = [doctor for doctor in doctors if doctor.id == doctor_id]
+    doctor_ids = [doctor.id for doctor in doctors]
+
+    schedules = {}
+    rows = (
+        Schedule.objects.filter(
+            work_date__gte=date_from, work_date__lt=date_to, doctor_id__in=doctor_ids
+        )
+        .select_related("doctor")
+        .order_by("doctor_id", "work_date", "time_start", "id")
+    )
+    for schedule in ScheduleSerializer(rows, many=True).data:
+        # Если смен за день несколько, в ячейку попадает первая по времени
+        schedules.setdefault((schedule["doctor"], schedule["work_date"]), schedule)
+
+    facts = {
+        (row["doctor_id"], row["work_date"]): row
+        for row in rollup_queryset(date_from, date_to, doctor_ids)
+        .values("doctor_id", "work_date")
+        .annotate(
+            study_count=Sum("study_count"),
+            actual_up=Sum("total_up", filter=Q(status__in=LOAD_STATUSES)),
+        )
+    }
+
+    grid_rows = []
+    stats = {
+        "total_doctors": len(doctors),
+        "total_possible_shifts": len(doctors) * days,
+        "filled_shifts": 0,
+        "warning_shifts": 0,
+        "overload_shifts": 0,
+    }
+    for doctor in doctors:
+        max_up = doctor.max_up_per_day or DEFAULT_MAX_UP
+        cells = []
+        for day in dates:
+            cell = grid_cell(
+                day,
+                schedules.get((doctor.id, day.isoformat())),
+                max_up,
+                facts.get((doctor.id, day), {}),
+            )
+            if cell["load_status"] != "empty":
+                stats["filled_shifts"] += 1
+            if cell["load_status"] in ("warning", "overload"):
+                stats[f"{cell['load_status']}_shifts"] += 1
+            cells.append(cell)
+
+        grid_rows.append(
+            {
+                "doctor_id": doctor.id,
+                "fio_alias": doctor.fio_alias or f"Врач {doctor.id}",
+                "max_up_per_day": max_up,
+                "cells": cells,
+            }
+        )
+
+    return {"dates": dates, "rows": grid_rows, "stats": stats}
@@ -0,0 +1,200 @@
+"""
+Модуль серверной очереди ожидающих исследований с учётом SLA.
+
+У каждого приоритета есть норматив ожидания назначения врача
+(settings.STUDY_SLA_MINUTES), срок исследования — created_at + норматив.
+Порядок очереди — ранг приоритета с «возрастом»:
+- ярус исследования — его ранг (0 — CITO, 1 — ASAP, 2 — остальные), а
+  просроченное исследование поднимается на ярус выше: просроченные ASAP
+  стоят вместе с CITO, просроченные плановые — вместе с ASAP; выше
+  соседнего ранга просрочка не поднимает, поэтому накопившийся хвост
+  плановых не отодвигает CITO;
+- внутри яруса — по сроку (раньше срок — раньше в очереди), при равном
+  сроке — по рангу, затем по created_at и id.
+
+Внутри одного ранга этот порядок совпадает с порядком created_at,
+поэтому каждый ранг читается диапазоном индекса studies_pending_queue_idx
+(ранг, created_at, id): голова очереди — три выборки LIMIT N по индексу
+одним запросом и слияние отсортированных рангов в Python, позиция
+исследования и число просрочек — подсчёт по диапазонам created_at
+каждого ранга. Голова очереди не зависит от её длины, подсчёты проходят
+только ожидающие исследования (частичный индекс), а не всю таблицу.
+Исследования без created_at в очередь не попадают.
+"""
+
+import heapq
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import PRIORITY_RANK, Study
+
+DEFAULT_QUEUE_LIMIT = 50
+MAX_QUEUE_LIMIT = 500
+
+# Приоритет, которым называется ранг в ответах (ранг 2 — «normal» и прочие)
+RANK_PRIORITY = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+
+
+def sla_targets():
+    """Нормативы ожидания по рангам приоритета: {ранг: timedelta}."""
+    return {
+        rank: timedelta(minutes=settings.STUDY_SLA_MINUTES[priority])
+        for rank, priority in sorted(RANK_PRIORITY.items())
+    }
+
+
+def pending_queue():
+    """Ожидающие исследования с рангом приоритета (без врача, с created_at)."""
+    return Study.objects.filter(
+        diagnostician_id__isnull=True, created_at__isnull=False
+    ).with_priority_rank()
+
+
+def _tier(rank, created_at, targets, now):
+    if created_at + targets[rank] < now:
+        return max(rank - 1, 0)
+    return rank
+
+
+def queue_key(rank, created_at, study_id, targets, now):
+    """Ключ порядка очереди: (ярус, срок, ранг, created_at, id)."""
+    return (
+        _tier(rank, created_at, targets, now),
+        created_at + targets[rank],
+        rank,
+        created_at,
+        study_id,
+    )
+
+
+def queue_head(limit=DEFAULT_QUEUE_LIMIT, now=None):
+    """
+    Первые limit исследований очереди в порядке обслуживания.
+
+    Возвращает список словарей: study (с типом и врачом), position,
+    priority_rank, sla_due_at, overdue.
+    """
+    now = now or timezone.now()
+    targets = sla_targets()
+    # Внутри ранга ключ растёт вместе с (created_at, id), поэтому каждому
+    # рангу хватает limit первых строк индекса, а общий порядок — слияние.
+    # Порядок строк подзапросов UNION ALL не гарантирован: ранги
+    # сортируются перед слиянием (не больше limit строк каждый)
+    heads = [
+        pending_queue()
+        .filter(priority_rank=rank)
+        .order_by("created_at", "id")
+        .values_list("priority_rank", "created_at", "id")[:limit]
+        for rank in targets
+    ]
+    rows = heads[0].union(*heads[1:], all=True)
+
+    per_rank = {rank: [] for rank in targets}
+    for rank, created_at, study_id in rows:
+        per_rank[rank].append(queue_key(rank, created_at, study_id, targets, now))
+    head = list(islice(heapq.merge(*map(sorted, per_rank.values())), limit))
+
+    studies = Study.objects.select_related("study_type", "diagnostician").in_bulk(
+        [key[4] for key in head]
+    )
+    return [
+        {
+            "study": studies[study_id],
+            "position": position,
+            "priority_rank": rank,
+            "sla_due_at": timezone.localtime(due_at),
+            "overdue": due_at < now,
+        }
+        for position, (_, due_at, rank, _, study_id) in enumerate(head, start=1)
+        if study_id in studies
+    ]
+
+
+def queue_position(study, now=None):
+    """
+    Место исследования в очереди (с 1) и его срок SLA.
+
+    Назначенное врачу исследование (или без created_at) в очереди не
+    стоит — возвращается None.
+    """
+    if study.diagnostician_id is not None or study.created_at is None:
+        return None
+    now = now or timezone.now()
+    targets = sla_targets()
+    rank = PRIORITY_RANK.get(study.priority, PRIORITY_RANK["normal"])
+    tier, due_at, *_ = key = queue_key(rank, study.created_at, study.id, targets, now)
+
+    # Впереди — строки каждого ранга с меньшим ключом: это префикс ранга
+    # по created_at, отдельно для его просроченной и непросроченной частей
+    ahead = Q(pk__in=[])
+    for other, target in targets.items():
+        overdue_before = now - target
+        segments = (
+            (max(other - 1, 0), Q(created_at__lt=overdue_before)),
+            (other, Q(created_at__gte=overdue_before)),
+        )
+        bound = due_at - target
+        for segment_tier, segment in segments:
+            if segment_tier > tier:
+                continue
+            condition = Q(priority_rank=other) & segment
+            if segment_tier == tier:
+                if other < rank:
+                    condition &= Q(created_at__lte=bound)
+                elif other > rank:
+                    condition &= Q(created_at__lt=bound)
+                else:
+                    condition &= Q(created_at__lt=bound) | Q(
+                        created_at=bound, id__lt=study.id
+                    )
+            ahead |= condition
+
+    return {
+        "study_id": study.id,
+        "position": pending_queue().filter(ahead).count() + 1,
+        "priority_rank": key[2],
+        "sla_due_at": timezone.localtime(due_at),
+        "overdue": due_at < now,
+    }
+
+
+def sla_breaches(now=None):
+    """
+    Сводка SLA очереди: по каждому приоритету норматив, число ожидающих,
+    число просроченных и самое давнее ожидающее исследование; итоги.
+    """
+    now = now or timezone.now()
+    targets = sla_targets()
+    aggregates = {}
+    for rank, target in targets.items():
+        aggregates[f"pending_{rank}"] = Count("id", filter=Q(priority_rank=rank))
+        aggregates[f"breached_{rank}"] = Count(
+            "id", filter=Q(priority_rank=rank, created_at__lt=now - target)
+        )
+        aggregates[f"oldest_{rank}"] = Min("created_at", filter=Q(priority_rank=rank))
+    totals = pending_queue().aggregate(**aggregates)
+
+    priorities = [
+        {
+            "priority": RANK_PRIORITY[rank],
+            "sla_minutes": int(target.total_seconds() // 60),
+            "pending": totals[f"pending_{rank}"],
+            "breached": totals[f"breached_{rank}"],
+            "oldest_created_at": (
+                timezone.localtime(totals[f"oldest_{rank}"])
+                if totals[f"oldest_{rank}"]
+                else None
+            ),
+        }
+        for rank, target in targets.items()
+    ]
+    return {
+        "checked_at": timezone.localtime(now),
+        "pending": sum(item["pending"] for item in priorities),
+        "breached": sum(item["breached"] for item in priorities),
+        "priorities": priorities,
+    }
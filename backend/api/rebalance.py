@@ -0,0 +1,300 @@
+"""
+Модуль перераспределения уже назначенных исследований.
+
+Нагрузка и процент загрузки врачей считаются так же, как в with_load:
+УП исследований за период (по умолчанию текущий месяц) от нормы
+положения. Врачи выше целевого процента target отдают подтверждённые,
+но ещё не подписанные исследования (status = confirmed) этого периода
+врачам ниже target:
+- получатель работает в указанный день (смена без выходного в
+  расписании), активен и ведёт модальность исследования;
+- получатель не поднимается выше target, поэтому переносы не создают
+  новых перегруженных врачей;
+- исследования CITO не переносятся, при равном весе первыми уходят
+  плановые, затем ASAP.
+
+Число переносов минимизируется жадно: у перегруженного врача берётся
+самое лёгкое исследование, которое одно закрывает оставшийся перебор,
+а если такого нет — самое тяжёлое из помещающихся к получателю.
+Получатель — врач модальности с наибольшим запасом до target (куча на
+модальность, как в api.distribution). Проход по десяткам тысяч открытых
+исследований занимает доли секунды: данные читаются одним запросом по
+индексу (diagnostician_id, created_at, status), нагрузка — из свёртки.
+
+Переносы применяются одним UPDATE ... FROM unnest(...) с условием, что
+исследование всё ещё подтверждено и у прежнего врача: изменённые
+параллельно строки не трогаются.
+"""
+
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .distribution import balance_stats
+from .loads import doctor_loads, norm_up_for
+from .models import PRIORITY_RANK, Schedule, Study
+from .reference import reference_data, reload_reference_data
+
+DEFAULT_TARGET_PERCENTAGE = 100
+# Приоритеты, исследования которых не переносятся
+PINNED_PRIORITIES = ("cito",)
+# Погрешность сравнения сумм УП
+EPSILON = 1e-9
+
+MOVE_SQL = """
+    UPDATE studies
+    SET diagnostician_id = move.to_doctor_id
+    FROM unnest(%s::integer[], %s::integer[], %s::integer[])
+         AS move(study_id, from_doctor_id, to_doctor_id)
+    WHERE studies.id = move.study_id
+      AND studies.diagnostician_id = move.from_doctor_id
+      AND studies.status = 'confirmed'
+    RETURNING studies.id
+"""
+
+
+def movable_studies(start, end, doctor_ids, reference):
+    """
+    Подтверждённые исследования врачей doctor_ids за период [start, end),
+    которые можно переносить.
+
+    Возвращает {doctor_id: {модальность: [(up_value, -ранг, study_id), ...]}}
+    со списками по возрастанию веса.
+    """
+    rows = list(
+        Study.objects.filter(
+            diagnostician_id__in=doctor_ids,
+            created_at__gte=start,
+            created_at__lt=end,
+            status="confirmed",
+        )
+        .exclude(priority__in=PINNED_PRIORITIES)
+        .order_by()
+        .values_list("id", "diagnostician_id", "study_type_id", "priority")
+        .iterator(chunk_size=5000)
+    )
+    if any(
+        study_type_id is not None and study_type_id not in reference.study_types
+        for _, _, study_type_id, _ in rows
+    ):
+        reference = reload_reference_data()
+
+    studies = defaultdict(lambda: defaultdict(list))
+    for study_id, doctor_id, study_type_id, priority in rows:
+        modality = reference.study_type_modality.get(study_type_id)
+        up_value = float(reference.study_type_up.get(study_type_id, 0))
+        if modality is None or up_value <= 0:
+            continue
+        # При равном весе первыми уходят плановые (больший ранг)
+        rank = PRIORITY_RANK.get(priority, PRIORITY_RANK["normal"])
+        studies[doctor_id][modality].append((up_value, -rank, study_id))
+    for pools in studies.values():
+        for items in pools.values():
+            items.sort()
+    return studies
+
+
+def plan_moves(excess, studies, headroom, modalities):
+    """
+    Подбирает переносы, не обращаясь к базе данных.
+
+    excess — {donor_id: перебор УП}, studies — из movable_studies,
+    headroom — {receiver_id: запас УП до цели}, modalities —
+    {doctor_id: модальности}. Изменяет excess и headroom и возвращает
+    список (study_id, from_doctor_id, to_doctor_id, up_value, rank).
+    """
+    heaps = defaultdict(list)
+    for doctor_id, room in headroom.items():
+        for modality in modalities[doctor_id]:
+            heaps[modality].append((-room, doctor_id))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    def top_room(modality):
+        # Записи с устаревшим запасом отбрасываются при чтении
+        heap = heaps.get(modality)
+        while heap and -heap[0][0] != headroom[heap[0][1]]:
+            heapq.heappop(heap)
+        return -heap[0][0] if heap else 0
+
+    moves = []
+    for donor_id in sorted(excess, key=lambda doctor_id: -excess[doctor_id]):
+        pools = studies.get(donor_id, {})
+        while excess[donor_id] > EPSILON:
+            choice = None
+            for modality, items in pools.items():
+                room = top_room(modality)
+                fitting = bisect_right(items, (room + EPSILON, math.inf))
+                if not fitting:
+                    continue
+                covering = bisect_left(items, (excess[donor_id] - EPSILON, -math.inf))
+                if covering < fitting:
+                    # Одно исследование закрывает перебор: самое лёгкое из таких
+                    candidate = (0, items[covering][0], modality, covering)
+                else:
+                    candidate = (1, -items[fitting - 1][0], modality, fitting - 1)
+                if choice is None or candidate < choice:
+                    choice = candidate
+            if choice is None:
+                break
+
+            _, _, modality, index = choice
+            up_value, negative_rank, study_id = pools[modality].pop(index)
+            _, receiver_id = heapq.heappop(heaps[modality])
+            headroom[receiver_id] -= up_value
+            excess[donor_id] -= up_value
+            for receiver_modality in modalities[receiver_id]:
+                if headroom[receiver_id] > EPSILON and receiver_modality in heaps:
+                    heapq.heappush(
+                        heaps[receiver_modality], (-headroom[receiver_id], receiver_id)
+                    )
+            moves.append((study_id, donor_id, receiver_id, up_value, -negative_rank))
+    return moves
+
+
+def apply_moves(moves):
+    """
+    Переносит исследования одним UPDATE. Возвращает множество id
+    фактически перенесённых (не изменённых параллельно) исследований.
+    """
+    if not moves:
+        return set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            MOVE_SQL,
+            [
+                [move[0] for move in moves],
+                [move[1] for move in moves],
+                [move[2] for move in moves],
+            ],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def rebalance_loads(start, end, work_date, target=DEFAULT_TARGET_PERCENTAGE, dry_run=True):
+    """
+    Перераспределение нагрузки за период [start, end) до target процентов
+    нормы с получателями, работающими в work_date.
+
+    При dry_run=True только возвращает план переносов. Ответ содержит
+    переносы, затронутых врачей с нагрузкой до и после, врачей, перебор
+    которых снять не удалось, и статистику баланса.
+    """
+    reference = reference_data()
+    loads = doctor_loads(start, end)
+    if any(doctor_id not in reference.doctors for doctor_id in loads):
+        reference = reload_reference_data()
+
+    norms = {
+        doctor.id: norm_up_for(doctor.position_type) for doctor in reference.doctors.values()
+    }
+    load = {
+        doctor_id: float(loads.get(doctor_id, {}).get("total_up") or 0) for doctor_id in norms
+    }
+    limit = {doctor_id: norms[doctor_id] * target / 100 for doctor_id in norms}
+
+    excess = {
+        doctor_id: load[doctor_id] - limit[doctor_id]
+        for doctor_id in norms
+        if load[doctor_id] > limit[doctor_id] + EPSILON
+    }
+    working = set(
+        Schedule.objects.filter(work_date=work_date, is_day_off=0).values_list(
+            "doctor_id", flat=True
+        )
+    )
+    headroom = {
+        doctor_id: limit[doctor_id] - load[doctor_id]
+        for doctor_id in working
+        if doctor_id in norms
+        and reference.doctors[doctor_id].is_active is not False
+        and load[doctor_id] < limit[doctor_id] - EPSILON
+    }
+    active = [doctor.id for doctor in reference.doctor_list(is_active=True)]
+    before = balance_stats(
+        {doctor_id: {"used": load[doctor_id], "capacity": norms[doctor_id]} for doctor_id in active}
+    )
+    over_before = len(excess)
+
+    studies = movable_studies(start, end, list(excess), reference)
+    moves = plan_moves(excess, studies, headroom, reference.doctor_modalities)
+
+    skipped = 0
+    if not dry_run:
+        applied = apply_moves(moves)
+        skipped = len(moves) - len(applied)
+        # Возвращаем перебор и запас по исследованиям, которые успели изменить
+        for study_id, donor_id, receiver_id, up_value, _ in moves:
+            if study_id not in applied:
+                excess[donor_id] += up_value
+                headroom[receiver_id] += up_value
+        moves = [move for move in moves if move[0] in applied]
+
+    moved = defaultdict(lambda: {"out": 0, "in": 0, "up": 0.0})
+    for _, donor_id, receiver_id, up_value, _ in moves:
+        moved[donor_id]["out"] += 1
+        moved[donor_id]["up"] -= up_value
+        moved[receiver_id]["in"] += 1
+        moved[receiver_id]["up"] += up_value
+    after = dict(load)
+    for doctor_id, change in moved.items():
+        after[doctor_id] += change["up"]
+
+    def percentage(doctor_id, value):
+        return round(value / norms[doctor_id] * 100, 1) if norms[doctor_id] else 0
+
+    rank_priority = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+    return {
+        "date": work_date,
+        "target_percentage": target,
+        "dry_run": dry_run,
+        "moved": len(moves),
+        "moved_up": round(sum(move[3] for move in moves), 3),
+        "skipped_changed": skipped,
+        "over_target_before": over_before,
+        "over_target_after": sum(
+            1 for doctor_id in norms if after[doctor_id] > limit[doctor_id] + EPSILON
+        ),
+        "moves": [
+            {
+                "study_id": study_id,
+                "from_doctor_id": donor_id,
+                "to_doctor_id": receiver_id,
+                "up_value": up_value,
+                "priority": rank_priority[rank],
+            }
+            for study_id, donor_id, receiver_id, up_value, rank in moves
+        ],
+        "doctors": [
+            {
+                "id": doctor_id,
+                "fio_alias": reference.doctors[doctor_id].fio_alias or f"Врач {doctor_id}",
+                "studies_out": change["out"],
+                "studies_in": change["in"],
+                "load_before": round(load[doctor_id], 3),
+                "load_after": round(after[doctor_id], 3),
+                "load_percentage_before": percentage(doctor_id, load[doctor_id]),
+                "load_percentage_after": percentage(doctor_id, after[doctor_id]),
+            }
+            for doctor_id, change in sorted(moved.items())
+        ],
+        "unresolved": [
+            {
+                "doctor_id": doctor_id,
+                "excess_up": round(remaining, 3),
+                "load_percentage": percentage(doctor_id, after[doctor_id]),
+            }
+            for doctor_id, remaining in sorted(excess.items())
+            if remaining > EPSILON
+        ],
+        "balance_before": before,
+        "balance_after": balance_stats(
+            {
+                doctor_id: {"used": after[doctor_id], "capacity": norms[doctor_id]}
+                for doctor_id in active
+            }
+        ),
+    }
@@ -0,0 +1,139 @@
+"""
+Модуль справочных данных: врачи и типы исследований.
+
+Типы исследований и состав врачей меняются редко, а нужны почти каждому
+запросу (нагрузка, сериализация списков, распределение). Поэтому они
+загружаются в память процесса одним снимком вместе с производными
+данными: множествами модальностей, подписями специальности и готовыми
+представлениями сериализаторов.
+
+Актуальность снимка определяется номером версии в общем кэше Django:
+изменения через DoctorViewSet и админку увеличивают версию, и каждый
+процесс перечитывает справочники при следующем обращении. Записи в базу
+в обход API подхватываются не позже чем через REFERENCE_DATA_TTL секунд.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Doctor, StudyType
+from .serializers import DoctorSerializer, StudyTypeSerializer
+
+VERSION_KEY = "reference_data:version"
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+class ReferenceData:
+    """Снимок справочников процесса (только для чтения)."""
+
+    def __init__(self, version, doctors, study_types):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.doctors = {doctor.id: doctor for doctor in doctors}
+        self.study_types = {study_type.id: study_type for study_type in study_types}
+
+        self.doctor_repr = {
+            item["id"]: dict(item)
+            for item in DoctorSerializer(self.doctors.values(), many=True).data
+        }
+        self.study_type_repr = {
+            item["id"]: dict(item)
+            for item in StudyTypeSerializer(self.study_types.values(), many=True).data
+        }
+
+        self.doctor_modalities = {
+            doctor.id: frozenset(doctor.modality or ()) for doctor in doctors
+        }
+        self.study_type_modality = {
+            study_type.id: study_type.modality for study_type in study_types
+        }
+        self.study_type_up = {
+            study_type.id: study_type.up_value or 0 for study_type in study_types
+        }
+
+    def is_fresh(self, version):
+        age = time.monotonic() - self.loaded_at
+        return self.version == version and age < settings.REFERENCE_DATA_TTL
+
+    def doctor_list(self, is_active=None):
+        """Врачи по возрастанию id, при необходимости только (не)активные."""
+        doctors = self.doctors.values()
+        if is_active is None:
+            return list(doctors)
+        # is_active = NULL считается активным, как в ответах API
+        return [
+            doctor for doctor in doctors if (doctor.is_active is not False) == is_active
+        ]
+
+    def doctors_by_ids(self, doctor_ids):
+        """Известные справочнику врачи из переданных id (None пропускается)."""
+        return [
+            self.doctors[doctor_id] for doctor_id in doctor_ids if doctor_id in self.doctors
+        ]
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _load(version):
+    return ReferenceData(
+        version,
+        list(Doctor.objects.order_by("id")),
+        list(StudyType.objects.order_by("id")),
+    )
+
+
+def reference_data():
+    """Текущий снимок справочников; перечитывается при смене версии."""
+    global _snapshot
+    version = _version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(version):
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or not _snapshot.is_fresh(version):
+            _snapshot = _load(version)
+        return _snapshot
+
+
+def reload_reference_data():
+    """
+    Перечитывает справочники в текущем процессе.
+
+    Нужна, когда в данных встретился id, которого нет в снимке (строку
+    добавили в базу в обход API).
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = _load(_version())
+        return _snapshot
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_reference_data():
+    """
+    Сбрасывает снимки справочников во всех процессах.
+
+    Версия увеличивается после фиксации транзакции, чтобы другой процесс
+    не успел перечитать старые данные под новой версией.
+    """
+    transaction.on_commit(_bump_version)
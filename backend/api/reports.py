@@ -0,0 +1,274 @@
+"""
+Модуль отчётов по исследованиям за период.
+
+Отчёт за даты [date_from, date_to] — разбивки по модальностям, типам
+исследований и врачам: количество исследований (всего и подписанных)
+и сумма УП по весам типов (StudyType.up_value), а для модальностей
+и врачей — план УП по сменам расписания (Schedule.planned_up; смена без
+плана — ёмкость врача, как в автораспределении) и выполнение плана:
+доля УП подписанных исследований от плана.
+
+Исследования читаются двумя сгруппированными запросами с join к
+study_types — по типу исследования и по паре «врач × модальность», план —
+одним сгруппированным запросом к schedules. Длинный период делится на
+части, как в api.timeseries, и все запросы выполняются одновременно
+в пуле соединений (api/parallel.py). План врача делится между
+модальностями пропорционально УП его исследований за период (если
+исследований нет — поровну между модальностями врача).
+
+Готовый отчёт хранится в кэше Django. Период, в который входит
+сегодняшний день, ещё меняется: его снимок помечен версией статистики
+дашборда (изменение исследований через API сбрасывает его сразу) и живёт
+DASHBOARD_STATS_TTL секунд. Отчёт за прошедший период живёт REPORTS_TTL.
+"""
+
+from collections import defaultdict
+from functools import partial
+from itertools import chain
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .dashboard import stats_version
+from .distribution import shift_capacity
+from .loads import date_window
+from .models import Schedule, Study
+from .parallel import run_parallel
+from .reference import reference_data, reload_reference_data
+from .timeseries import SERIES_CHUNK_DAYS, split_period
+
+MAX_REPORT_DAYS = 366
+
+# Поля группировки запросов по исследованиям
+STUDY_TYPE_KEYS = ("study_type_id", "study_type__modality")
+DOCTOR_KEYS = ("diagnostician_id", "study_type__modality")
+COUNTERS = ("studies", "signed", "up", "signed_up")
+
+
+def _modality_key(modality):
+    # Исследования без типа (модальность None) — в конце списка
+    return (modality is None, modality or "")
+
+
+def study_groups(date_from, date_to, keys):
+    """Количество и УП исследований за даты [date_from, date_to] по полям keys."""
+    start, end = date_window(date_from, date_to)
+    signed = Q(status="signed")
+    return list(
+        Study.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by()
+        .values(*keys)
+        .annotate(
+            studies=Count("id"),
+            signed=Count("id", filter=signed),
+            up=Sum("study_type__up_value"),
+            signed_up=Sum("study_type__up_value", filter=signed),
+        )
+    )
+
+
+def plan_groups(date_from, date_to):
+    """Рабочие смены врачей за даты [date_from, date_to]: число, сумма плана, смены без плана."""
+    return list(
+        Schedule.objects.filter(work_date__gte=date_from, work_date__lte=date_to, is_day_off=0)
+        .order_by()
+        .values("doctor_id")
+        .annotate(
+            shifts=Count("id"),
+            plan_up=Sum("planned_up"),
+            unplanned=Count("id", filter=Q(planned_up__isnull=True)),
+        )
+    )
+
+
+def _accumulate(totals, row):
+    totals["studies"] += row["studies"]
+    totals["signed"] += row["signed"]
+    totals["up"] += float(row["up"] or 0)
+    totals["signed_up"] += float(row["signed_up"] or 0)
+
+
+def _counters():
+    return dict.fromkeys(COUNTERS, 0)
+
+
+def _summary(totals, plan_up=None):
+    """Показатели группы: счётчики, УП на исследование и выполнение плана."""
+    summary = {
+        "studies": totals["studies"],
+        "signed": totals["signed"],
+        "up": round(totals["up"], 2),
+        "signed_up": round(totals["signed_up"], 2),
+        "up_per_study": round(totals["up"] / totals["studies"], 2) if totals["studies"] else 0,
+    }
+    if plan_up is not None:
+        summary["plan_up"] = round(plan_up, 1)
+        summary["fulfillment"] = (
+            round(totals["signed_up"] / plan_up * 100, 1) if plan_up else None
+        )
+    return summary
+
+
+def build_report(date_from, date_to, type_rows, doctor_rows, plan_rows):
+    """
+    Отчёт из строк study_groups (по типам и по врачам) и plan_groups.
+
+    Возвращает итоги (totals) и списки modalities, study_types и doctors.
+    """
+    reference = reference_data()
+    doctor_ids = {row["doctor_id"] for row in plan_rows}
+    doctor_ids.update(row["diagnostician_id"] for row in doctor_rows)
+    doctor_ids.discard(None)
+    if any(doctor_id not in reference.doctors for doctor_id in doctor_ids) or any(
+        row["study_type_id"] not in reference.study_types
+        for row in type_rows
+        if row["study_type_id"] is not None
+    ):
+        reference = reload_reference_data()
+
+    totals = _counters()
+    modalities = defaultdict(_counters)
+    study_types = defaultdict(_counters)
+    for row in type_rows:
+        _accumulate(totals, row)
+        _accumulate(modalities[row["study_type__modality"]], row)
+        _accumulate(study_types[row["study_type_id"]], row)
+
+    doctors = defaultdict(_counters)
+    doctor_modality_up = defaultdict(lambda: defaultdict(float))
+    unassigned = 0
+    for row in doctor_rows:
+        doctor_id = row["diagnostician_id"]
+        if doctor_id is None:
+            unassigned += row["studies"]
+            continue
+        _accumulate(doctors[doctor_id], row)
+        doctor_modality_up[doctor_id][row["study_type__modality"]] += float(row["up"] or 0)
+
+    plans, shifts = {}, {}
+    for row in plan_rows:
+        doctor = reference.doctors.get(row["doctor_id"])
+        if doctor is None:
+            continue
+        plans[doctor.id] = float(row["plan_up"] or 0) + row["unplanned"] * shift_capacity(
+            doctor, None
+        )
+        shifts[doctor.id] = row["shifts"]
+
+    # План врача делится между модальностями пропорционально его УП за период
+    modality_plans = defaultdict(float)
+    for doctor_id, plan_up in plans.items():
+        weights = doctor_modality_up.get(doctor_id)
+        if not weights or not sum(weights.values()):
+            weights = dict.fromkeys(reference.doctor_modalities.get(doctor_id) or (None,), 1)
+        weight_total = sum(weights.values())
+        for modality, weight in weights.items():
+            modality_plans[modality] += plan_up * weight / weight_total
+    for modality in modality_plans:
+        # Модальность с планом, но без исследований за период
+        modalities.setdefault(modality, _counters())
+    plan_total = sum(plans.values())
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "totals": {
+            **_summary(totals, plan_total),
+            "shifts": sum(shifts.values()),
+            "doctors": len(doctors),
+            "unassigned": unassigned,
+        },
+        "modalities": [
+            {
+                "modality": modality,
+                **_summary(modalities[modality], modality_plans.get(modality, 0.0)),
+                "share": (
+                    round(modalities[modality]["studies"] / totals["studies"] * 100, 1)
+                    if totals["studies"]
+                    else 0
+                ),
+            }
+            for modality in sorted(modalities, key=_modality_key)
+        ],
+        "study_types": [
+            {
+                "id": study_type_id,
+                "name": (
+                    reference.study_types[study_type_id].name
+                    if study_type_id in reference.study_types
+                    else None
+                ),
+                "modality": reference.study_type_modality.get(study_type_id),
+                "up_value": float(reference.study_type_up.get(study_type_id, 0)),
+                **_summary(counters),
+            }
+            for study_type_id, counters in sorted(
+                study_types.items(), key=lambda item: -item[1]["up"]
+            )
+        ],
+        "doctors": [
+            {
+                "id": doctor_id,
+                "fio_alias": reference.doctors[doctor_id].fio_alias or f"Врач {doctor_id}",
+                "modality": sorted(reference.doctor_modalities.get(doctor_id, ())),
+                "shifts": shifts.get(doctor_id, 0),
+                **_summary(doctors[doctor_id], plans.get(doctor_id, 0.0)),
+            }
+            for doctor_id in sorted(set(doctors) | set(plans))
+            if doctor_id in reference.doctors
+        ],
+    }
+
+
+async def compute_report(date_from, date_to):
+    """Отчёт за даты [date_from, date_to]: все запросы выполняются одновременно."""
+    # Каждой части периода нужны два запроса, план — ещё один
+    parts = min(
+        max(settings.DB_POOL_SIZE // 2, 1),
+        ((date_to - date_from).days + 1) // SERIES_CHUNK_DAYS,
+    )
+    chunks = split_period(date_from, date_to, "day", parts)
+    plan_rows, *results = await run_parallel(
+        partial(plan_groups, date_from, date_to),
+        *(
+            partial(study_groups, chunk_from, chunk_to, keys)
+            for chunk_from, chunk_to in chunks
+            for keys in (STUDY_TYPE_KEYS, DOCTOR_KEYS)
+        ),
+    )
+    return await sync_to_async(build_report)(
+        date_from,
+        date_to,
+        list(chain.from_iterable(results[0::2])),
+        list(chain.from_iterable(results[1::2])),
+        plan_rows,
+    )
+
+
+async def report_snapshot(date_from, date_to):
+    """
+    Отчёт из кэша; при отсутствии — расчёт и сохранение.
+
+    Период, который не закончился к сегодняшнему дню, кэшируется с версией
+    статистики дашборда на DASHBOARD_STATS_TTL, прошедший — на REPORTS_TTL.
+    К отчёту добавляются computed_at и age_seconds, как у дашборда.
+    """
+    scope = f"{date_from.isoformat()}:{date_to.isoformat()}"
+    if date_to >= timezone.localdate():
+        key = f"reports:{await sync_to_async(stats_version)()}:{scope}"
+        timeout = settings.DASHBOARD_STATS_TTL
+    else:
+        key = f"reports:closed:{scope}"
+        timeout = settings.REPORTS_TTL
+
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await compute_report(date_from, date_to)
+        snapshot["computed_at"] = timezone.now()
+        await cache.aset(key, snapshot, timeout=timeout)
+
+    age = (timezone.now() - snapshot["computed_at"]).total_seconds()
+    return {**snapshot, "age_seconds": round(age, 1)}
@@ -0,0 +1,113 @@
+"""
+Модуль свёртки нагрузки врачей по дням (таблица doctor_day_loads).
+
+Строка свёртки — врач, местная дата created_at, статус и приоритет
+с количеством исследований и суммой УП. Триггер на studies поддерживает
+свёртку при каждом изменении исследований (см. миграцию 0002), так что
+нагрузка за месяц читается из нескольких сотен строк свёртки, а не из
+всех исследований месяца. Если свёртка разошлась с исследованиями
+(например, изменились веса типов исследований), её перестраивает
+команда ``python manage.py rebuild_load_rollup``.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import DoctorDayLoad
+
+# Та же свёртка, что строит триггер, но по исходным исследованиям периода
+REBUILD_SQL = """
+    INSERT INTO doctor_day_loads
+        (doctor_id, work_date, status, priority, study_count, total_up)
+    SELECT s.diagnostician_id,
+           (s.created_at AT TIME ZONE %(time_zone)s)::date,
+           coalesce(s.status, ''),
+           coalesce(s.priority, ''),
+           count(*),
+           coalesce(sum(t.up_value), 0)
+    FROM studies s
+    LEFT JOIN study_types t ON t.id = s.study_type_id
+    WHERE s.diagnostician_id IS NOT NULL AND s.created_at IS NOT NULL
+      {conditions}
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def day_range(start, end):
+    """
+    Даты [first, last) для окна [start, end), если оно совпадает с
+    границами местных суток, иначе None (окно нельзя читать из свёртки).
+    """
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.time() != time.min or end.time() != time.min:
+        return None
+    return start.date(), end.date()
+
+
+def rollup_queryset(date_from, date_to, doctor_ids=None):
+    """Строки свёртки за даты [date_from, date_to)."""
+    rows = DoctorDayLoad.objects.filter(work_date__gte=date_from, work_date__lt=date_to)
+    if doctor_ids is not None:
+        rows = rows.filter(doctor_id__in=doctor_ids)
+    return rows
+
+
+def rollup_loads(date_from, date_to, statuses, active_statuses, doctor_ids=None):
+    """
+    Нагрузка врачей из свёртки за даты [date_from, date_to).
+
+    Возвращает словарь {doctor_id: {"total_up": Decimal, "active_count": int}}
+    в том же виде, что loads.doctor_loads.
+    """
+    rows = (
+        rollup_queryset(date_from, date_to, doctor_ids)
+        .filter(status__in=statuses)
+        .values("doctor_id")
+        .annotate(
+            total_up=Sum("total_up"),
+            active_count=Sum("study_count", filter=Q(status__in=active_statuses)),
+        )
+    )
+    return {
+        row["doctor_id"]: {
+            "total_up": row["total_up"] or 0,
+            "active_count": row["active_count"] or 0,
+        }
+        for row in rows
+    }
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_rollup(date_from=None, date_to=None):
+    """
+    Перестраивает свёртку за даты [date_from, date_to] включительно
+    (без границ — целиком). Запись в studies на время перестройки
+    блокируется, чтобы триггер не изменил свёртку параллельно.
+
+    Возвращает количество строк свёртки за период.
+    """
+    rows = DoctorDayLoad.objects.all()
+    conditions = []
+    params = {"time_zone": settings.TIME_ZONE}
+    if date_from:
+        rows = rows.filter(work_date__gte=date_from)
+        conditions.append("AND s.created_at >= %(start)s")
+        params["start"] = _local_midnight(date_from)
+    if date_to:
+        rows = rows.filter(work_date__lte=date_to)
+        conditions.append("AND s.created_at < %(end)s")
+        params["end"] = _local_midnight(date_to + timedelta(days=1))
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE studies IN SHARE MODE")
+            rows.delete()
+            cursor.execute(REBUILD_SQL.format(conditions=" ".join(conditions)), params)
+        return rows.count()
@@ -0,0 +1,218 @@
+"""
+Модуль генерации расписания по шаблонам графиков смен.
+
+Шаблон (RotationTemplate) задаёт цикл смен по дням. expand_rotation
+разворачивает его на период для списка врачей — у каждого может быть
+своя фаза цикла, окна времени смен и план УП, — а apply_rotation
+записывает результат одной транзакцией через write_schedules (ею же
+записываются принятые планы оптимизатора смен, api/optimizer.py):
+- таблица schedules блокируется от параллельной записи, и id новых строк
+  выделяются подряд после текущего максимума (Schedule.id назначается
+  вручную, последовательности у таблицы нет);
+- дни, на которые у врача уже есть расписание, пропускаются (skip),
+  перезаписываются (replace) или отменяют генерацию целиком (error);
+- новые строки пишутся пакетной вставкой.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+
+from .models import SHIFT_CODES, Schedule
+from .reference import reference_data, reload_reference_data
+
+# Начало отсчёта циклов (понедельник): у шаблона 5/2 с фазой 0 рабочие дни
+# приходятся на понедельник-пятницу, а соседние периоды продолжают цикл
+ROTATION_EPOCH = date(2024, 1, 1)
+ON_CONFLICT = ("skip", "replace", "error")
+# Поля шаблона, которые можно переопределить для отдельного врача
+SHIFT_FIELDS = ("day_start", "day_end", "night_start", "night_end", "planned_up")
+# Максимальный период генерации, дней
+MAX_ROTATION_DAYS = 366
+INSERT_BATCH_SIZE = 2000
+
+
+class RotationConflict(Exception):
+    """Дни, на которые у врачей уже есть расписание (при on_conflict=error)."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} days already scheduled")
+        self.conflicts = conflicts
+
+
+def lock_schedules():
+    """
+    Блокирует запись в schedules до конца транзакции (чтение не блокируется).
+
+    Нужна для выделения id и проверки занятых дней без гонок
+    с параллельными изменениями расписания.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE schedules IN SHARE ROW EXCLUSIVE MODE")
+
+
+def allocate_schedule_ids(count):
+    """
+    Выделяет count идентификаторов расписания подряд после текущего
+    максимума. Вызывать в транзакции после lock_schedules().
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM schedules")
+        last_id = cursor.fetchone()[0]
+    return range(last_id + 1, last_id + 1 + count)
+
+
+def shift_code(pattern, day, offset=0):
+    """Код смены (D, N или -) в день day для цикла pattern со сдвигом фазы offset."""
+    return pattern[((day - ROTATION_EPOCH).days + offset) % len(pattern)]
+
+
+def unknown_doctors(doctor_ids):
+    """Идентификаторы из doctor_ids, которых нет в справочнике врачей."""
+    requested = set(doctor_ids)
+    missing = requested - reference_data().doctors.keys()
+    if missing:
+        # Врача могли добавить в базу в обход API — перечитываем справочник
+        missing = requested - reload_reference_data().doctors.keys()
+    return sorted(missing)
+
+
+def expand_rotation(template, assignments, date_from, date_to, stagger=False):
+    """
+    Расписание по шаблону за даты [date_from, date_to] включительно.
+
+    assignments — список словарей с doctor_id и необязательными offset
+    (сдвиг фазы цикла, дней) и полями SHIFT_FIELDS, которые заменяют
+    значения шаблона для этого врача (при повторе doctor_id действует
+    последний элемент). При stagger=True фаза каждого следующего врача
+    сдвигается ещё на день, чтобы смены бригады чередовались. Возвращает
+    несохранённые объекты Schedule без id, выходные — строками
+    с is_day_off=1.
+    """
+    assignments = {assignment["doctor_id"]: assignment for assignment in assignments}
+    rows = []
+    for index, assignment in enumerate(assignments.values()):
+        shift = {
+            field: (
+                assignment[field]
+                if assignment.get(field) is not None
+                else getattr(template, field)
+            )
+            for field in SHIFT_FIELDS
+        }
+        offset = (assignment.get("offset") or 0) + (index if stagger else 0)
+
+        day = date_from
+        while day <= date_to:
+            kind = SHIFT_CODES[shift_code(template.pattern, day, offset)]
+            if kind is None:
+                rows.append(
+                    Schedule(doctor_id=assignment["doctor_id"], work_date=day, is_day_off=1)
+                )
+            else:
+                rows.append(
+                    Schedule(
+                        doctor_id=assignment["doctor_id"],
+                        work_date=day,
+                        time_start=shift[f"{kind}_start"],
+                        time_end=shift[f"{kind}_end"],
+                        is_day_off=0,
+                        planned_up=shift["planned_up"],
+                    )
+                )
+            day += timedelta(days=1)
+    return rows
+
+
+def apply_rotation(
+    template,
+    assignments,
+    date_from,
+    date_to,
+    stagger=False,
+    on_conflict="skip",
+    dry_run=False,
+):
+    """
+    Генерирует и записывает расписание по шаблону одной транзакцией.
+
+    Возвращает количество созданных строк, а также дней, перезаписанных
+    (replace) и пропущенных (skip) из-за уже существующего расписания.
+    Неверные параметры и неизвестные врачи — ValueError. При
+    on_conflict=error и занятых днях ничего не пишет и поднимает
+    RotationConflict; при dry_run=True только считает.
+    """
+    if on_conflict not in ON_CONFLICT:
+        raise ValueError(f"on_conflict must be one of: {', '.join(ON_CONFLICT)}")
+    if not 0 <= (date_to - date_from).days < MAX_ROTATION_DAYS:
+        raise ValueError(f"date_to must be within {MAX_ROTATION_DAYS} days after date_from")
+    doctor_ids = sorted({assignment["doctor_id"] for assignment in assignments})
+    missing = unknown_doctors(doctor_ids)
+    if missing:
+        raise ValueError(f"Unknown doctors: {', '.join(map(str, missing))}")
+
+    rows = expand_rotation(template, assignments, date_from, date_to, stagger)
+    result = write_schedules(rows, doctor_ids, date_from, date_to, on_conflict, dry_run)
+    return {
+        **result,
+        "doctors": len(doctor_ids),
+        "date_from": date_from,
+        "date_to": date_to,
+        "dry_run": dry_run,
+    }
+
+
+def write_schedules(rows, doctor_ids, date_from, date_to, on_conflict="skip", dry_run=False):
+    """
+    Записывает несохранённые строки Schedule врачей doctor_ids за даты
+    [date_from, date_to] одной транзакцией.
+
+    Дни, на которые у врача уже есть расписание, пропускаются (skip),
+    перезаписываются (replace) или отменяют запись целиком (error —
+    RotationConflict). Возвращает количество созданных строк и дней,
+    перезаписанных и пропущенных из-за существующего расписания; при
+    dry_run=True только считает.
+    """
+    with transaction.atomic():
+        if not dry_run:
+            lock_schedules()
+        existing = defaultdict(list)
+        for schedule_id, doctor_id, work_date in Schedule.objects.filter(
+            doctor_id__in=doctor_ids, work_date__gte=date_from, work_date__lte=date_to
+        ).values_list("id", "doctor_id", "work_date"):
+            existing[(doctor_id, work_date)].append(schedule_id)
+
+        busy = [row for row in rows if (row.doctor_id, row.work_date) in existing]
+        if busy and on_conflict == "error":
+            raise RotationConflict(
+                [
+                    {
+                        "doctor_id": row.doctor_id,
+                        "work_date": row.work_date,
+                        "schedule_ids": existing[(row.doctor_id, row.work_date)],
+                    }
+                    for row in busy
+                ]
+            )
+        if on_conflict == "skip":
+            rows = [row for row in rows if (row.doctor_id, row.work_date) not in existing]
+
+        if not dry_run:
+            if on_conflict == "replace" and busy:
+                Schedule.objects.filter(
+                    id__in=[
+                        schedule_id
+                        for row in busy
+                        for schedule_id in existing[(row.doctor_id, row.work_date)]
+                    ]
+                ).delete()
+            for row, schedule_id in zip(rows, allocate_schedule_ids(len(rows))):
+                row.id = schedule_id
+            Schedule.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+
+    return {
+        "created": len(rows),
+        "replaced": len(busy) if on_conflict == "replace" else 0,
+        "skipped": len(busy) if on_conflict == "skip" else 0,
+    }
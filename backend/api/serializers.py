@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Doctor, StudyType, Schedule, Study
+from .models import Doctor, StudyType, Schedule, Study, RotationTemplate, PRIORITY_RANK, SHIFT_CODES
 
 
 class DoctorSerializer(serializers.ModelSerializer):
@@ -79,11 +79,12 @@ class ScheduleSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         # Проверка, что время окончания не раньше времени начала
+        # (конец раньше начала допустим: ночная смена заканчивается на следующий день)
         time_start = attrs.get('time_start')
         time_end = attrs.get('time_end')
         
-        if time_start and time_end and time_start > time_end:
-            raise serializers.ValidationError("Время окончания работы не может быть раньше времени начала")
+        if time_start and time_end and time_start == time_end:
+            raise serializers.ValidationError("Время окончания работы совпадает со временем начала")
         
         return attrs
 
@@ -110,7 +111,7 @@ class StudySerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def validate_priority(self, value):
-        if value not in ['normal', 'cito', 'asap']:
+        if value not in PRIORITY_RANK:
             raise serializers.ValidationError("Недопустимое значение приоритета")
         return value
 
@@ -124,6 +125,125 @@ class StudyWithDetailsSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class RotationTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RotationTemplate
+        fields = [
+            "id",
+            "name",
+            "pattern",
+            "day_start",
+            "day_end",
+            "night_start",
+            "night_end",
+            "planned_up",
+        ]
+        read_only_fields = ["id"]
+
+    def validate_pattern(self, value):
+        if not value or set(value) - set(SHIFT_CODES):
+            raise serializers.ValidationError(
+                "Цикл состоит из символов D (дневная смена), N (ночная) и - (выходной)"
+            )
+        return value
+
+    def validate_planned_up(self, value):
+        if value is not None and value < 0:
+            raise serializers.ValidationError("Планируемое количество УП не может быть отрицательным")
+        return value
+
+
+class RotationAssignmentSerializer(serializers.Serializer):
+    doctor_id = serializers.IntegerField()
+    offset = serializers.IntegerField(required=False, default=0)
+    day_start = serializers.TimeField(required=False)
+    day_end = serializers.TimeField(required=False)
+    night_start = serializers.TimeField(required=False)
+    night_end = serializers.TimeField(required=False)
+    planned_up = serializers.IntegerField(required=False, min_value=0)
+
+
+class RotationApplySerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    # Врачи с индивидуальными настройками и/или просто список id
+    doctors = RotationAssignmentSerializer(many=True, required=False)
+    doctor_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    stagger = serializers.BooleanField(default=False)
+    # skip, replace или error (см. api.rotations.apply_rotation)
+    on_conflict = serializers.CharField(default="skip")
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        attrs["assignments"] = [
+            {"doctor_id": doctor_id} for doctor_id in attrs.pop("doctor_ids", [])
+        ] + attrs.pop("doctors", [])
+        if not attrs["assignments"]:
+            raise serializers.ValidationError("Нужен список doctors или doctor_ids")
+        return attrs
+
+
+class ShiftDemandSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    modality = serializers.CharField(max_length=50)
+    up = serializers.FloatField(min_value=0)
+
+
+class ShiftOptimizeSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    # По умолчанию — все активные врачи
+    doctor_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    # Явная потребность; без неё берётся прогноз (forecast или high, см. api.optimizer)
+    demand = ShiftDemandSerializer(many=True, required=False)
+    demand_level = serializers.CharField(default="forecast")
+
+
+class PlannedShiftSerializer(serializers.Serializer):
+    doctor_id = serializers.IntegerField()
+    work_date = serializers.DateField()
+    time_start = serializers.TimeField(required=False, allow_null=True)
+    time_end = serializers.TimeField(required=False, allow_null=True)
+    planned_up = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+
+
+class PlanAcceptSerializer(serializers.Serializer):
+    schedules = PlannedShiftSerializer(many=True, allow_empty=False)
+    on_conflict = serializers.CharField(default="skip")
+    dry_run = serializers.BooleanField(default=False)
+
+
+class BulkAssignItemSerializer(serializers.Serializer):
+    study_id = serializers.IntegerField()
+    doctor_id = serializers.IntegerField()
+
+
+class ClaimNextSerializer(serializers.Serializer):
+    doctor_id = serializers.IntegerField()
+    date = serializers.DateField(required=False)
+
+
+class RebalanceSerializer(serializers.Serializer):
+    # По умолчанию — норма положения (api.rebalance.DEFAULT_TARGET_PERCENTAGE)
+    target_percentage = serializers.FloatField(min_value=1, required=False)
+    date = serializers.DateField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    dry_run = serializers.BooleanField(default=True)
+
+    def validate(self, attrs):
+        if ("date_from" in attrs) != ("date_to" in attrs):
+            raise serializers.ValidationError("date_from and date_to go together")
+        if "date_from" in attrs and attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return attrs
+
+
+class BulkStatusItemSerializer(serializers.Serializer):
+    study_id = serializers.IntegerField()
+    status = serializers.CharField(max_length=50)
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     total_studies = serializers.IntegerField()
     completed_studies = serializers.IntegerField()
@@ -132,9 +252,15 @@ class DashboardStatsSerializer(serializers.Serializer):
     avg_load_per_doctor = serializers.IntegerField()
     cito_studies = serializers.IntegerField()
     asap_studies = serializers.IntegerField()
+    computed_at = serializers.DateTimeField(required=False)
+    age_seconds = serializers.FloatField(required=False)
 
 
 class ChartDataSerializer(serializers.Serializer):
     name = serializers.CharField()
     plan = serializers.IntegerField()
     actual = serializers.IntegerField()
+    date = serializers.DateField(required=False)
+    plan_up = serializers.FloatField(required=False)
+    actual_up = serializers.FloatField(required=False)
+    group = serializers.CharField(required=False)
@@ -0,0 +1,111 @@
+"""
+Модуль дельта-синхронизации studies и schedules.
+
+Изменения строк фиксируются триггерами в журнале change_log вместе с
+номером транзакции. Токен версии — граница xmin снимка PostgreSQL в момент
+запроса: все транзакции с меньшим номером к этому моменту завершены,
+а незавершённые получат номер не меньше токена и попадут в следующую
+выборку. Поэтому клиент, передающий последний полученный токен, не
+пропускает изменений; повторная доставка строки возможна и безвредна.
+
+Запрос по журналу идёт по индексу (table_name, xid) и читает только
+изменения после токена, не затрагивая основную таблицу целиком.
+"""
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import ChangeLog
+
+# Больше изменений за раз не отдаём: клиенту дешевле перечитать всё
+SYNC_MAX_ROWS = 10000
+
+
+def current_token():
+    """Токен версии: xmin текущего снимка базы."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def changed_row_ids(table_name, token=None, since=None):
+    """
+    Идентификаторы строк таблицы, изменённых после токена (или момента since).
+
+    Возвращает список id либо None, если изменений больше SYNC_MAX_ROWS.
+    """
+    changes = ChangeLog.objects.filter(table_name=table_name)
+    if token is not None:
+        changes = changes.filter(xid__gte=token)
+    else:
+        changes = changes.filter(changed_at__gte=since)
+
+    row_ids = list(
+        changes.order_by()
+        .values_list("row_id", flat=True)
+        .distinct()[: SYNC_MAX_ROWS + 1]
+    )
+    if len(row_ids) > SYNC_MAX_ROWS:
+        return None
+    return row_ids
+
+
+def is_pruned_after(token=None, since=None):
+    """Был ли журнал очищен после токена — тогда дельту восстановить нельзя."""
+    markers = ChangeLog.objects.filter(operation="P")
+    if token is not None:
+        return markers.filter(xid__gte=token).exists()
+    return markers.filter(changed_at__gt=since).exists()
+
+
+def delta(table_name, queryset, token=None, since=None):
+    """
+    Дельта для таблицы: изменённые строки queryset и удалённые id.
+
+    queryset задаёт выборку и фильтры клиента; строки, изменённые после
+    токена и больше не попадающие в фильтр, возвращаются среди удалённых —
+    клиент убирает их из своей выборки так же, как удалённые. Без token и since
+    возвращается только текущий токен с reset=True: клиент загружает данные
+    обычными запросами и дальше синхронизируется от этого токена.
+    """
+    new_token = current_token()
+    result = {"token": new_token, "reset": False, "upserted": [], "deleted": []}
+
+    if token is None and since is None:
+        result["reset"] = True
+        return result
+    if is_pruned_after(token, since):
+        result["reset"] = True
+        return result
+
+    row_ids = changed_row_ids(table_name, token, since)
+    if row_ids is None:
+        result["reset"] = True
+        return result
+
+    upserted = list(queryset.filter(id__in=row_ids))
+    result["upserted"] = upserted
+    result["deleted"] = sorted(set(row_ids) - {row.id for row in upserted})
+    return result
+
+
+def prune_change_log(older_than):
+    """
+    Удаляет записи журнала старше older_than и оставляет отметку очистки.
+
+    Клиенты с токеном до отметки получат reset=True.
+    Возвращает количество удалённых записей.
+    """
+    stale = ChangeLog.objects.filter(changed_at__lt=older_than).exclude(operation="P")
+    watermark = stale.order_by("-xid").values_list("xid", flat=True).first()
+    if watermark is None:
+        return 0
+    deleted, _ = stale.delete()
+    ChangeLog.objects.create(
+        table_name="*",
+        row_id=0,
+        operation="P",
+        xid=watermark,
+        changed_at=timezone.now(),
+    )
+    return deleted
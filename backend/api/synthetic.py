@@ -0,0 +1,282 @@
+"""
+Модуль генерации синтетических данных больничного масштаба.
+
+Создаёт врачей с модальностями, типы исследований с весами УП,
+расписание на период и произвольное количество исследований
+с реалистичным распределением:
+- исследования поступают неравномерно: днём больше, ночью и в выходные
+  меньше;
+- приоритеты: в основном плановые, небольшая доля ASAP и CITO;
+- статусы зависят от возраста исследования: старые почти все подписаны,
+  свежие — в работе или ещё без врача;
+- врач назначается только с подходящей модальностью.
+
+Строки загружаются в PostgreSQL через COPY порциями, поэтому миллионы
+исследований генерируются за минуты и не держатся в памяти целиком.
+Пользовательские триггеры studies (журнал изменений, свёртка нагрузки)
+на время загрузки отключаются, свёртка затем перестраивается целиком.
+"""
+
+import io
+import random
+from bisect import bisect
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .rollup import rebuild_rollup
+
+# Таблицы в порядке очистки
+TABLES = ("studies", "schedules", "study_types", "doctors", "doctor_day_loads", "change_log")
+
+# Модальность: (доля типов исследований, диапазон УП)
+MODALITIES = {
+    "XRAY": (0.30, (0.5, 1.5)),
+    "CT": (0.25, (1.5, 3.0)),
+    "MRI": (0.20, (2.0, 4.0)),
+    "US": (0.15, (0.5, 1.5)),
+    "MG": (0.10, (1.0, 2.0)),
+}
+POSITION_TYPES = (("radiologist", 0.60), ("diagnostician", 0.35), ("head", 0.05))
+PRIORITIES = (("normal", 0.85), ("asap", 0.10), ("cito", 0.05))
+# Относительная интенсивность поступления по часам суток
+HOURLY_WEIGHTS = (
+    1, 1, 1, 1, 1, 2, 4, 7, 10, 12, 12, 11,
+    10, 11, 12, 11, 10, 8, 6, 4, 3, 2, 2, 1,
+)
+WEEKEND_FACTOR = 0.4
+# Строк в одной порции COPY
+COPY_BATCH_ROWS = 50000
+
+
+class _Weighted:
+    """Быстрый выбор из взвешенного набора значений."""
+
+    def __init__(self, items, rng):
+        self.values = [value for value, _ in items]
+        self.cumulative = list(accumulate(weight for _, weight in items))
+        self.total = self.cumulative[-1]
+        self.rng = rng
+
+    def pick(self):
+        return self.values[bisect(self.cumulative, self.rng.random() * self.total)]
+
+
+def _copy(cursor, table, columns, rows):
+    """Загружает строки через COPY (значения None пишутся как NULL)."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(
+            "\t".join("\\N" if value is None else str(value) for value in row)
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer
+    )
+
+
+def _batches(rows, size=COPY_BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_doctors(count, rng):
+    position = _Weighted(POSITION_TYPES, rng)
+    modality = _Weighted([(name, share) for name, (share, _) in MODALITIES.items()], rng)
+    for doctor_id in range(1, count + 1):
+        modalities = sorted({modality.pick() for _ in range(rng.choice((1, 1, 2, 3)))})
+        yield (
+            doctor_id,
+            f"Врач {doctor_id:05d}",
+            position.pick(),
+            rng.choice((None, 80, 100, 120)),
+            "f" if rng.random() < 0.05 else "t",
+            "{" + ",".join(modalities) + "}",
+        )
+
+
+def generate_study_types(count, rng):
+    modality = _Weighted([(name, share) for name, (share, _) in MODALITIES.items()], rng)
+    for study_type_id in range(1, count + 1):
+        name = modality.pick()
+        low, high = MODALITIES[name][1]
+        yield (
+            study_type_id,
+            f"{name} исследование {study_type_id}",
+            name,
+            f"{rng.uniform(low, high):.2f}",
+        )
+
+
+def generate_schedules(doctor_ids, date_from, date_to, rng):
+    """Смены 5/2 с редкими случайными выходными; id по порядку."""
+    schedule_id = 0
+    day = date_from
+    while day <= date_to:
+        weekend = day.weekday() >= 5
+        for doctor_id in doctor_ids:
+            schedule_id += 1
+            day_off = weekend if rng.random() < 0.85 else not weekend
+            if rng.random() < 0.05:
+                day_off = True
+            yield (
+                schedule_id,
+                doctor_id,
+                day.isoformat(),
+                "08:00:00",
+                rng.choice(("16:00:00", "20:00:00")),
+                1 if day_off else 0,
+                None if day_off else rng.choice((20, 30, 40, 50)),
+            )
+        day += timedelta(days=1)
+
+
+def _status(age_days, rng):
+    """Статус и признак назначения врачу по возрасту исследования."""
+    done_share = min(0.97, 0.2 + age_days * 0.25)
+    roll = rng.random()
+    if roll < done_share:
+        return "signed", True
+    if roll < done_share + (1 - done_share) * 0.6:
+        return "confirmed", True
+    return "pending", False
+
+
+def generate_studies(count, history_days, study_types, doctors_by_modality, rng):
+    """
+    Исследования за последние history_days дней.
+
+    study_types — список (id, modality); doctors_by_modality —
+    {modality: [doctor_id, ...]}.
+    """
+    now = timezone.now()
+    start = now - timedelta(days=history_days)
+    days = [(start + timedelta(days=offset)).date() for offset in range(history_days + 1)]
+    day_pick = _Weighted(
+        [(day, WEEKEND_FACTOR if day.weekday() >= 5 else 1.0) for day in days], rng
+    )
+    hour_pick = _Weighted(list(enumerate(HOURLY_WEIGHTS)), rng)
+    priority_pick = _Weighted(PRIORITIES, rng)
+
+    for study_id in range(1, count + 1):
+        day = day_pick.pick()
+        created_at = timezone.make_aware(
+            datetime.combine(day, time(hour_pick.pick(), rng.randrange(60), rng.randrange(60)))
+        )
+        if created_at > now:
+            created_at = now - timedelta(seconds=rng.randrange(3600))
+        study_type_id, modality = rng.choice(study_types)
+        status, assigned = _status((now - created_at).total_seconds() / 86400, rng)
+        candidates = doctors_by_modality.get(modality)
+        doctor_id = rng.choice(candidates) if assigned and candidates else None
+        if doctor_id is None:
+            status = "pending"
+        yield (
+            study_id,
+            f"SYN{study_id:010d}",
+            study_type_id,
+            status,
+            priority_pick.pick(),
+            created_at.isoformat(),
+            None,
+            doctor_id,
+        )
+
+
+def dataset_counts():
+    """Количество строк в таблицах набора данных."""
+    with connection.cursor() as cursor:
+        counts = {}
+        for table in TABLES:
+            cursor.execute(f"SELECT count(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def generate_dataset(
+    doctors=300,
+    study_types=200,
+    studies=1_000_000,
+    history_days=365,
+    days_ahead=30,
+    seed=1,
+    log=lambda message: None,
+):
+    """
+    Очищает таблицы и заполняет их синтетическими данными.
+
+    Возвращает количество строк в таблицах после загрузки.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+
+    doctor_rows = list(generate_doctors(doctors, rng))
+    study_type_rows = list(generate_study_types(study_types, rng))
+    doctors_by_modality = {}
+    for doctor_id, _, _, _, is_active, modalities in doctor_rows:
+        if is_active == "t":
+            for modality in modalities.strip("{}").split(","):
+                doctors_by_modality.setdefault(modality, []).append(doctor_id)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLES)}")
+        cursor.execute("ALTER TABLE studies DISABLE TRIGGER USER")
+        cursor.execute("ALTER TABLE schedules DISABLE TRIGGER USER")
+
+        _copy(
+            cursor,
+            "doctors",
+            ("id", "fio_alias", "position_type", "max_up_per_day", "is_active", "modality"),
+            doctor_rows,
+        )
+        _copy(cursor, "study_types", ("id", "name", "modality", "up_value"), study_type_rows)
+        log(f"Врачей: {doctors}, типов исследований: {study_types}")
+
+        schedule_columns = (
+            "id", "doctor_id", "work_date", "time_start", "time_end", "is_day_off", "planned_up",
+        )
+        schedules = generate_schedules(
+            [row[0] for row in doctor_rows],
+            today - timedelta(days=history_days),
+            today + timedelta(days=days_ahead),
+            rng,
+        )
+        for batch in _batches(schedules):
+            _copy(cursor, "schedules", schedule_columns, batch)
+        log("Расписание загружено")
+
+        study_columns = (
+            "id", "research_number", "study_type_id", "status", "priority",
+            "created_at", "planned_at", "diagnostician_id",
+        )
+        rows = generate_studies(
+            studies,
+            history_days,
+            [(row[0], row[2]) for row in study_type_rows],
+            doctors_by_modality,
+            rng,
+        )
+        loaded = 0
+        for batch in _batches(rows):
+            _copy(cursor, "studies", study_columns, batch)
+            loaded += len(batch)
+            log(f"Исследований загружено: {loaded}")
+
+        cursor.execute("ALTER TABLE studies ENABLE TRIGGER USER")
+        cursor.execute("ALTER TABLE schedules ENABLE TRIGGER USER")
+
+    log("Перестройка свёртки нагрузки")
+    rebuild_rollup()
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"ANALYZE {table}")
+    return dataset_counts()
@@ -0,0 +1,58 @@
+"""
+Модуль запуска тестов.
+
+Таблицы doctors, study_types, schedules и studies ведёт внешняя система,
+их модели неуправляемые (managed = False), поэтому миграции их не создают,
+хотя триггеры миграций (журнал изменений, свёртка нагрузки) ссылаются на
+них. Перед миграцией тестовой базы раннер создаёт эти таблицы по моделям,
+а перед её удалением закрывает соединения пула api/parallel.py.
+
+Подключается настройкой TEST_RUNNER, запуск — ``python manage.py test api``.
+"""
+
+from django.apps import apps
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+from .parallel import close_pool_connections
+
+
+def create_unmanaged_tables(using, **kwargs):
+    """Создаёт в базе using таблицы неуправляемых моделей, которых ещё нет."""
+    connection = connections[using]
+    existing = set(connection.introspection.table_names())
+    models = [
+        model
+        for model in apps.get_app_config("api").get_models()
+        if not model._meta.managed and model._meta.db_table not in existing
+    ]
+    if models:
+        with connection.schema_editor() as editor:
+            for model in models:
+                editor.create_model(model)
+        # Внешние ключи внешней схемы проверяются сразу, а не в конце
+        # транзакции, как их создаёт Django
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conrelid::regclass, conname FROM pg_constraint"
+                " WHERE contype = 'f' AND condeferrable AND conrelid = ANY(%s::regclass[])",
+                [[model._meta.db_table for model in models]],
+            )
+            for table, name in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {table} ALTER CONSTRAINT "{name}" NOT DEFERRABLE')
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner, создающий таблицы внешней схемы в тестовой базе."""
+
+    def setup_databases(self, **kwargs):
+        pre_migrate.connect(create_unmanaged_tables, dispatch_uid="create_unmanaged_tables")
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid="create_unmanaged_tables")
+
+    def teardown_databases(self, old_config, **kwargs):
+        close_pool_connections()
+        super().teardown_databases(old_config, **kwargs)
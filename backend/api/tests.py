@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import json
+import random
+import select
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+from io import StringIO
+from time import perf_counter
 
-# Create your tests here.
+import numpy as np
+import psycopg2
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .benchmark import EXCLUDED_URL_NAMES, benchmark_endpoints, compare_runs, measure, percentile, url_names
+from .bulk import BULK_MAX_ITEMS
+from .claims import claim_next, compare_and_assign
+from .dashboard import VERSION_KEY, invalidate_dashboard_stats, stats_version
+from .distribution import build_plan, pending_queue
+from .events import EVENTS_CHANNEL, MAX_EVENTS_PER_BATCH
+from .flat import STUDY_FIELDS, flat_studies, study_rows
+from .forecast import FORECAST_HISTORY_WEEKS, fit_weekly, merge_history, predict
+from .indexes import hot_queries
+from .loads import date_window, doctor_loads
+from .metrics import count_queries, render_metrics
+from .models import Doctor, DoctorDayLoad, RotationTemplate, Schedule, Study, StudyType
+from .optimizer import MAX_CONSECUTIVE_DAYS, optimize_shifts
+from .parallel import run_parallel
+from .planning import shift_grid, week_start
+from .priority_queue import queue_head, queue_position
+from .rebalance import plan_moves
+from .reference import reference_data, reload_reference_data
+from .reports import COUNTERS, DOCTOR_KEYS, STUDY_TYPE_KEYS, build_report
+from .rollup import rebuild_rollup
+from .serializers import DoctorSerializer, StudySerializer, StudyTypeSerializer
+from .synthetic import generate_dataset, generate_doctors, generate_study_types
+from .timeseries import build_series, split_period
+
+
+def moscow(*args):
+    """Момент местного времени (Europe/Moscow)."""
+    return timezone.make_aware(datetime(*args))
+
+
+class ApiTestCase(TestCase):
+    """Общие данные: врачи, типы исследований и фабрика исследований."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ct = StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        cls.mri = StudyType.objects.create(id=2, name="МРТ ГМ", modality="MRI", up_value=Decimal("3.00"))
+        cls.xray = StudyType.objects.create(id=3, name="Рентген", modality="XRAY", up_value=Decimal("1.00"))
+        cls.doctor = Doctor.objects.create(
+            id=1, fio_alias="Иванов", position_type="врач", max_up_per_day=10, modality=["CT", "XRAY"]
+        )
+        cls.other = Doctor.objects.create(
+            id=2, fio_alias="Петров", position_type="врач", max_up_per_day=10, modality=["MRI", "CT"]
+        )
+
+    def setUp(self):
+        cache.clear()
+        reload_reference_data()
+        self.client = APIClient()
+        self._next_study_id = 1000
+
+    def make_study(self, study_type=None, created_at=None, doctor=None, status="pending", priority="normal", **fields):
+        self._next_study_id += 1
+        return Study.objects.create(
+            id=self._next_study_id,
+            research_number=f"R-{self._next_study_id}",
+            study_type=study_type or self.ct,
+            created_at=created_at,
+            diagnostician=doctor,
+            status=status,
+            priority=priority,
+            **fields,
+        )
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() - timedelta(days=1)
+        # Одинаковое время у пар строк: порядок внутри пары задаёт id
+        self.studies = [
+            self.make_study(created_at=start + timedelta(minutes=index // 2), priority=priority)
+            for index, priority in enumerate(["normal", "cito", "asap", "normal", "cito", "normal", "asap"])
+        ]
+        self.undated = [self.make_study(created_at=None), self.make_study(created_at=None, priority="cito")]
+
+    def pages(self, path, page_size=2, **params):
+        ids, response = [], self.client.get(path, {"page_size": page_size, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next_cursor"]:
+                return ids
+            response = self.client.get(
+                path, {"page_size": page_size, "cursor": response.data["next_cursor"], **params}
+            )
+
+    def test_list_pages_follow_created_at_desc_with_undated_last(self):
+        dated = sorted(self.studies, key=lambda study: (study.created_at, study.id), reverse=True)
+        undated = sorted(self.undated, key=lambda study: study.id, reverse=True)
+        self.assertEqual(
+            self.pages("/api/studies/"), [study.id for study in dated + undated]
+        )
+
+    def test_pending_pages_follow_priority_then_created_at(self):
+        rank = {"cito": 0, "asap": 1, "normal": 2}
+        expected = sorted(
+            self.studies + self.undated,
+            key=lambda study: (
+                rank[study.priority],
+                study.created_at is None,
+                study.created_at or timezone.now(),
+                study.id,
+            ),
+        )
+        self.assertEqual(
+            self.pages("/api/studies/pending/", page_size=3), [study.id for study in expected]
+        )
+
+    def test_flat_layout_pages(self):
+        ids = self.pages("/api/studies/cito/", layout="flat")
+        cito = [study for study in self.studies + self.undated if study.priority == "cito"]
+        self.assertCountEqual(ids, [study.id for study in cito])
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_with_count_returns_estimate(self):
+        response = self.client.get("/api/studies/", {"page_size": 2, "with_count": "true"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data["count_estimate"], int)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get("/api/studies/", {"page_size": 2, "cursor": "bm90LWpzb24"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_without_page_size_returns_full_list(self):
+        response = self.client.get("/api/studies/cito/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+
+class EnsureIndexesTests(ApiTestCase):
+    def test_explain_reports_every_hot_query(self):
+        output = StringIO()
+        call_command("ensure_indexes", "--explain", stdout=output)
+        report = output.getvalue()
+        self.assertIn("EXPLAIN ANALYZE", report)
+        for name, _ in hot_queries():
+            self.assertIn(f"  {name}: ", report)
+
+
+class IngestTests(ApiTestCase):
+    def ingest(self, *rows):
+        body = "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+        return self.client.post(
+            "/api/studies/ingest/", body.encode(), content_type="application/x-ndjson"
+        )
+
+    def test_valid_rows_are_inserted_and_repeat_is_unchanged(self):
+        rows = [
+            {"research_number": "N-1", "study_type_id": 1, "priority": "cito", "created_at": "2025-02-28T10:00"},
+            {"research_number": "N-2", "study_type_id": 2},
+        ]
+        response = self.ingest(*rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["inserted"], response.data["rejected"]), (2, 0))
+        study = Study.objects.get(research_number="N-1")
+        self.assertEqual((study.status, study.priority), ("pending", "cito"))
+        self.assertEqual(study.created_at, moscow(2025, 2, 28, 10))
+
+        response = self.ingest(*rows)
+        self.assertEqual((response.data["inserted"], response.data["unchanged"]), (0, 2))
+
+    def test_invalid_rows_are_rejected_without_failing_the_batch(self):
+        response = self.ingest(
+            {"research_number": "N-1", "study_type_id": 1, "created_at": "2025-02-30T10:00"},
+            {"research_number": "N-2", "study_type_id": 1, "planned_at": "not a date"},
+            {"research_number": "N-3", "study_type_id": 1, "priority": ["cito"]},
+            {"research_number": "N-4", "study_type_id": 1, "priority": "urgent"},
+            {"research_number": "N-5", "study_type_id": 99},
+            {"research_number": "N-6", "study_type_id": "CT"},
+            {"study_type_id": 1},
+            "[1, 2]",
+            "{broken",
+            {"research_number": "N-7", "study_type_id": 3},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["received"], 10)
+        self.assertEqual((response.data["inserted"], response.data["rejected"]), (1, 9))
+        self.assertEqual(
+            [row["line"] for row in response.data["rejected_rows"]], list(range(1, 10))
+        )
+        self.assertEqual(response.data["rejected_rows"][0]["error"], "created_at: invalid datetime")
+        self.assertEqual(list(Study.objects.values_list("research_number", flat=True)), ["N-7"])
+
+    def test_unknown_format_is_400(self):
+        response = self.client.post("/api/studies/ingest/", b"", content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+
+
+class SyncTests(ApiTestCase):
+    def sync(self, **params):
+        response = self.client.get("/api/studies/sync/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_first_request_returns_reset_token(self):
+        data = self.sync()
+        self.assertTrue(data["reset"])
+        self.assertEqual((data["upserted"], data["deleted"]), ([], []))
+
+    def test_delta_after_token(self):
+        kept = self.make_study()
+        removed = self.make_study()
+        token = self.sync()["token"]
+
+        kept.priority = "cito"
+        kept.save()
+        created = self.make_study()
+        removed_id = removed.id
+        removed.delete()
+
+        data = self.sync(token=token)
+        self.assertFalse(data["reset"])
+        self.assertCountEqual([row["id"] for row in data["upserted"]], [kept.id, created.id])
+        self.assertEqual(data["deleted"], [removed_id])
+
+    def test_row_leaving_filter_is_reported_deleted(self):
+        study = self.make_study()
+        token = self.sync(status="pending")["token"]
+
+        study.status = "confirmed"
+        study.diagnostician = self.doctor
+        study.save()
+
+        data = self.sync(token=token, status="pending")
+        self.assertEqual((data["upserted"], data["deleted"]), ([], [study.id]))
+        data = self.sync(token=token, status="confirmed")
+        self.assertEqual([row["id"] for row in data["upserted"]], [study.id])
+        self.assertEqual(data["deleted"], [])
+
+    def test_invalid_token_is_400(self):
+        response = self.client.get("/api/studies/sync/", {"token": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filterset_fields_apply_to_delta(self):
+        token = self.sync(diagnostician_id=self.doctor.id)["token"]
+        mine = self.make_study(doctor=self.doctor, status="confirmed")
+        self.make_study(doctor=self.other, status="confirmed")
+        data = self.sync(token=token, diagnostician_id=self.doctor.id)
+        self.assertEqual([row["id"] for row in data["upserted"]], [mine.id])
+
+    def test_schedule_filterset_fields_apply_to_delta(self):
+        token = self.client.get("/api/schedules/sync/", {"is_day_off": 1}).data["token"]
+        Schedule.objects.create(id=1, doctor=self.doctor, work_date=date(2025, 3, 10), is_day_off=0)
+        day_off = Schedule.objects.create(id=2, doctor=self.doctor, work_date=date(2025, 3, 11), is_day_off=1)
+        response = self.client.get("/api/schedules/sync/", {"token": token, "is_day_off": 1})
+        self.assertEqual([row["id"] for row in response.data["upserted"]], [day_off.id])
+
+
+class ExportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.studies = [self.make_study(created_at=moscow(2025, 3, 1, 9, index)) for index in range(3)]
+
+    def test_csv_export(self):
+        response = self.client.get("/api/studies/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "research_number"])
+        self.assertEqual(
+            [int(line.split(",")[0]) for line in lines[1:]],
+            [study.id for study in reversed(self.studies)],
+        )
+
+    async def test_asgi_export_streams_asynchronously(self):
+        response = await self.async_client.get("/api/studies/export/", {"export_format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [study.id for study in reversed(self.studies)])
+        self.assertEqual(rows[0]["modality"], "CT")
+
+    def test_unknown_format_is_400(self):
+        response = self.client.get("/api/studies/export/", {"export_format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AssignTests(ApiTestCase):
+    def assign(self, study, **data):
+        return self.client.post(f"/api/studies/{study.id}/assign/", data, format="json")
+
+    def test_assign_confirms_study(self):
+        study = self.make_study()
+        response = self.assign(study, doctor_id=self.doctor.id)
+        self.assertEqual(response.status_code, 200)
+        study.refresh_from_db()
+        self.assertEqual((study.diagnostician_id, study.status), (self.doctor.id, "confirmed"))
+
+    def test_conditional_assign_rejects_stale_doctor(self):
+        study = self.make_study(doctor=self.other, status="confirmed")
+        response = self.assign(study, doctor_id=self.doctor.id, expected_doctor_id=None)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["doctor_id"], self.other.id)
+
+        response = self.assign(study, doctor_id=self.doctor.id, expected_doctor_id=self.other.id)
+        self.assertEqual(response.status_code, 200)
+        study.refresh_from_db()
+        self.assertEqual(study.diagnostician_id, self.doctor.id)
+
+    def test_signed_study_is_not_reopened(self):
+        study = self.make_study(doctor=self.other, status="signed")
+        for data in ({}, {"expected_doctor_id": self.other.id}):
+            response = self.assign(study, doctor_id=self.doctor.id, **data)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data["status"], "signed")
+        study.refresh_from_db()
+        self.assertEqual((study.diagnostician_id, study.status), (self.other.id, "signed"))
+
+    def test_compare_and_assign(self):
+        study = self.make_study()
+        self.assertFalse(compare_and_assign(study.id, self.doctor.id, self.other.id))
+        self.assertTrue(compare_and_assign(study.id, self.doctor.id, None))
+        self.assertFalse(compare_and_assign(study.id, self.other.id, None))
+        self.assertTrue(compare_and_assign(study.id, self.other.id))
+
+
+class UnmanagedTransactionTestCase(TransactionTestCase):
+    """Тесты с фиксацией транзакций (потоки, NOTIFY)."""
+
+    def tearDown(self):
+        # Таблицы неуправляемых моделей flush не очищает
+        for model in (Study, Schedule, Doctor, StudyType):
+            model.objects.all().delete()
+
+
+class ClaimConcurrencyTests(UnmanagedTransactionTestCase):
+    """Параллельные захваты из очереди: в отдельных потоках и соединениях."""
+
+    def setUp(self):
+        cache.clear()
+        StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        self.doctors = [
+            Doctor.objects.create(
+                id=doctor_id, fio_alias=f"Врач {doctor_id}", position_type="врач",
+                max_up_per_day=max_up, modality=["CT"],
+            )
+            for doctor_id, max_up in ((1, 100), (2, 100), (3, 100), (4, 5))
+        ]
+        for doctor in self.doctors:
+            Schedule.objects.create(
+                id=doctor.id, doctor=doctor, work_date=timezone.localdate(), is_day_off=0
+            )
+        created_at = timezone.now() - timedelta(hours=1)
+        Study.objects.bulk_create(
+            Study(
+                id=study_id, research_number=f"R-{study_id}", study_type_id=1,
+                status="pending", priority="normal", created_at=created_at,
+            )
+            for study_id in range(1, 13)
+        )
+        reload_reference_data()
+
+    def run_parallel(self, calls):
+        barrier = threading.Barrier(len(calls))
+
+        def run(call):
+            try:
+                barrier.wait()
+                return call()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(calls)) as executor:
+            return list(executor.map(run, calls))
+
+    def test_parallel_claims_get_distinct_studies(self):
+        results = self.run_parallel([partial(claim_next, doctor_id) for doctor_id in (1, 2, 3) * 3])
+        claimed = [result["study_id"] for result in results if result["result"] == "claimed"]
+        self.assertEqual(len(claimed), 9)
+        self.assertEqual(len(set(claimed)), 9)
+        self.assertEqual(Study.objects.filter(status="confirmed").count(), 9)
+
+    def test_parallel_claims_respect_capacity(self):
+        # Ёмкость 5 УП — помещаются два исследования по 2 УП
+        results = self.run_parallel([partial(claim_next, 4) for _ in range(4)])
+        self.assertEqual(
+            sorted(result["result"] for result in results),
+            ["claimed", "claimed", "no_capacity", "no_capacity"],
+        )
+        self.assertEqual(Study.objects.filter(diagnostician_id=4).count(), 2)
+
+    def test_parallel_compare_and_assign_has_one_winner(self):
+        results = self.run_parallel(
+            [partial(compare_and_assign, 1, doctor.id, None) for doctor in self.doctors]
+        )
+        self.assertEqual(results.count(True), 1)
+
+
+class StudyCreatedTriggerTests(UnmanagedTransactionTestCase):
+    def setUp(self):
+        StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        self.listener = psycopg2.connect(**connection.get_connection_params())
+        self.listener.autocommit = True
+        with self.listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+
+    def tearDown(self):
+        self.listener.close()
+        super().tearDown()
+
+    def notifications(self):
+        # NOTIFY приходит асинхронно после фиксации: ждём, пока канал затихнет
+        while select.select([self.listener], [], [], 0.5) != ([], [], []):
+            self.listener.poll()
+        return [json.loads(notify.payload) for notify in self.listener.notifies]
+
+    def insert(self, study_ids):
+        # Как вставка РИС напрямую в таблицу, в обход API
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO studies (id, research_number, study_type_id, status, priority) "
+                "SELECT id, 'R-' || id, 1, 'pending', 'cito' FROM unnest(%s::int[]) AS id",
+                [study_ids],
+            )
+
+    def test_direct_insert_publishes_study_created(self):
+        self.insert([1, 2])
+        self.assertEqual(
+            self.notifications(),
+            [
+                {"type": "study_created", "data": {"study_id": study_id, "priority": "cito", "study_type_id": 1}}
+                for study_id in (1, 2)
+            ],
+        )
+
+    def test_large_insert_publishes_queue_changed(self):
+        self.insert(list(range(1, MAX_EVENTS_PER_BATCH + 2)))
+        self.assertEqual(
+            self.notifications(),
+            [{"type": "queue_changed", "data": {"count": MAX_EVENTS_PER_BATCH + 1}}],
+        )
+
+    @override_settings(EVENTS_BACKEND="postgres")
+    def test_ingest_command_notifies_each_created_study_once(self):
+        rows = [{"research_number": f"N-{index}", "study_type_id": 1} for index in range(3)]
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as batch:
+            batch.write("\n".join(json.dumps(row) for row in rows))
+            batch.flush()
+            call_command("ingest_studies", batch.name, stdout=StringIO(), stderr=StringIO())
+            # Повторная загрузка ничего не вставляет и не публикует
+            call_command("ingest_studies", batch.name, stdout=StringIO(), stderr=StringIO())
+
+        events = self.notifications()
+        self.assertEqual([event["type"] for event in events], ["study_created"] * 3)
+        self.assertCountEqual(
+            [event["data"]["study_id"] for event in events], Study.objects.values_list("id", flat=True)
+        )
+
+    def test_update_publishes_nothing(self):
+        self.insert([1])
+        self.notifications()
+        self.listener.notifies.clear()
+        Study.objects.filter(id=1).update(priority="normal")
+        self.assertEqual(self.notifications(), [])
+
+
+class ChartDataTests(ApiTestCase):
+    def test_invalid_dates_are_400(self):
+        for params in (
+            {"date_from": "2025-03-01", "date_to": "2025-03-32"},
+            {"date_from": "01.03.2025", "date_to": "2025-03-10"},
+            {"date_from": "2025-03-01"} | {"date_to": "nope"},
+            {"date_from": "2025-03-10", "date_to": "2025-03-01"},
+        ):
+            response = self.client.get("/api/dashboard/chart/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_split_period_keeps_buckets_whole(self):
+        chunks = split_period(date(2025, 1, 15), date(2025, 4, 10), "month", 2)
+        self.assertEqual(
+            chunks,
+            [(date(2025, 1, 15), date(2025, 2, 28)), (date(2025, 3, 1), date(2025, 4, 10))],
+        )
+
+    def test_build_series_fills_gaps(self):
+        rows = [{"bucket": date(2025, 3, 2), "plan": 3, "actual": 1, "plan_up": Decimal("6"), "actual_up": Decimal("2")}]
+        series = build_series(rows, date(2025, 3, 1), date(2025, 3, 3))
+        self.assertEqual([point["plan"] for point in series], [0, 3, 0])
+        self.assertEqual(series[1]["actual_up"], Decimal("2"))
+
+
+class ChartSeriesTests(UnmanagedTransactionTestCase):
+    """Ряды считаются в пуле соединений — данные должны быть зафиксированы."""
+
+    def setUp(self):
+        cache.clear()
+        ct = StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        mri = StudyType.objects.create(id=2, name="МРТ ГМ", modality="MRI", up_value=Decimal("3.00"))
+        studies = [
+            (moscow(2025, 3, 1, 0, 30), ct, "signed"),
+            (moscow(2025, 3, 1, 23, 50), mri, "pending"),
+            (moscow(2025, 3, 3, 12), mri, "signed"),
+            (moscow(2025, 3, 4, 0, 0), ct, "signed"),
+        ]
+        Study.objects.bulk_create(
+            Study(id=index, research_number=f"R-{index}", study_type=study_type, status=status, created_at=created_at)
+            for index, (created_at, study_type, status) in enumerate(studies, start=1)
+        )
+
+    def test_daily_series_in_local_time(self):
+        response = self.client.get("/api/dashboard/chart/", {"date_from": "2025-03-01", "date_to": "2025-03-03"})
+        self.assertEqual(response.status_code, 200)
+        series = response.json()
+        self.assertEqual([point["date"] for point in series], ["2025-03-01", "2025-03-02", "2025-03-03"])
+        self.assertEqual([(point["plan"], point["actual"]) for point in series], [(2, 1), (0, 0), (1, 1)])
+        self.assertEqual([point["plan_up"] for point in series], [5.0, 0, 3.0])
+
+    def test_breakdown_by_modality(self):
+        response = self.client.get(
+            "/api/dashboard/chart/",
+            {"date_from": "2025-03-01", "date_to": "2025-03-31", "granularity": "month", "breakdown": "modality"},
+        )
+        series = {point["group"]: point for point in response.json()}
+        self.assertEqual((series["CT"]["plan"], series["CT"]["actual_up"]), (2, 4.0))
+        self.assertEqual((series["MRI"]["plan"], series["MRI"]["actual"]), (2, 1))
+
+
+class OptimizeShiftsTests(ApiTestCase):
+    day = date(2025, 3, 10)
+
+    def schedule(self, doctor, work_date, is_day_off=0):
+        self._next_schedule_id = getattr(self, "_next_schedule_id", 0) + 1
+        return Schedule.objects.create(
+            id=self._next_schedule_id, doctor=doctor, work_date=work_date, is_day_off=is_day_off
+        )
+
+    def optimize(self, ct_up):
+        return optimize_shifts(self.day, self.day, {(self.day, "CT"): ct_up}, [self.doctor.id, self.other.id])
+
+    def test_prefers_first_equal_doctor(self):
+        plan = self.optimize(10)
+        self.assertEqual([shift["doctor_id"] for shift in plan["schedules"]], [self.doctor.id])
+        self.assertEqual(plan["schedules"][0]["modalities"], {"CT": 10.0})
+
+    def test_streak_continues_from_days_before_period(self):
+        for offset in range(1, MAX_CONSECUTIVE_DAYS + 1):
+            self.schedule(self.doctor, self.day - timedelta(days=offset))
+        plan = self.optimize(10)
+        self.assertEqual([shift["doctor_id"] for shift in plan["schedules"]], [self.other.id])
+
+    def test_day_off_before_period_resets_streak(self):
+        for offset in range(1, MAX_CONSECUTIVE_DAYS + 1):
+            self.schedule(self.doctor, self.day - timedelta(days=offset), is_day_off=int(offset == 2))
+        plan = self.optimize(10)
+        self.assertEqual([shift["doctor_id"] for shift in plan["schedules"]], [self.doctor.id])
+
+    def test_duplicate_existing_rows_count_as_one_shift(self):
+        self.schedule(self.doctor, self.day)
+        self.schedule(self.doctor, self.day)
+        plan = self.optimize(20)
+        self.assertEqual([shift["doctor_id"] for shift in plan["schedules"]], [self.other.id])
+        coverage = plan["coverage"]
+        self.assertEqual((coverage["existing_shifts"], coverage["proposed_shifts"]), (1, 1))
+        self.assertEqual((coverage["covered_up"], coverage["staffed_up"]), (20.0, 20.0))
+
+
+class RotationApplyTests(ApiTestCase):
+    monday = date(2025, 3, 10)
+
+    def setUp(self):
+        super().setUp()
+        self.template = RotationTemplate.objects.create(name="Тест 5/2", pattern="DDDDD--", planned_up=40)
+
+    def apply(self, **data):
+        data = {"date_from": self.monday, "date_to": self.monday + timedelta(days=6), **data}
+        return self.client.post(f"/api/rotation-templates/{self.template.id}/apply/", data, format="json")
+
+    def week(self, doctor):
+        return list(
+            Schedule.objects.filter(doctor=doctor).order_by("work_date").values_list("is_day_off", flat=True)
+        )
+
+    def test_cycle_follows_epoch_and_offset(self):
+        response = self.apply(doctors=[{"doctor_id": self.doctor.id}, {"doctor_id": self.other.id, "offset": 2}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 14)
+        self.assertEqual(self.week(self.doctor), [0, 0, 0, 0, 0, 1, 1])
+        self.assertEqual(self.week(self.other), [0, 0, 0, 1, 1, 0, 0])
+        shift = Schedule.objects.get(doctor=self.doctor, work_date=self.monday)
+        self.assertEqual((shift.time_start, shift.time_end, shift.planned_up), (time(8), time(20), 40))
+
+    def test_stagger_shifts_each_next_doctor(self):
+        self.apply(doctor_ids=[self.doctor.id, self.other.id], stagger=True)
+        self.assertEqual(self.week(self.other), [0, 0, 0, 0, 1, 1, 0])
+
+    def test_skip_keeps_existing_days(self):
+        Schedule.objects.create(id=1, doctor=self.doctor, work_date=self.monday, is_day_off=1)
+        response = self.apply(doctor_ids=[self.doctor.id])
+        self.assertEqual((response.data["created"], response.data["skipped"]), (6, 1))
+        self.assertEqual(self.week(self.doctor)[0], 1)
+
+    def test_replace_overwrites_existing_days(self):
+        Schedule.objects.create(id=1, doctor=self.doctor, work_date=self.monday, is_day_off=1)
+        Schedule.objects.create(id=2, doctor=self.doctor, work_date=self.monday, is_day_off=1)
+        response = self.apply(doctor_ids=[self.doctor.id], on_conflict="replace")
+        self.assertEqual((response.data["created"], response.data["replaced"]), (7, 1))
+        self.assertEqual(self.week(self.doctor), [0, 0, 0, 0, 0, 1, 1])
+
+    def test_error_reports_conflicts_and_writes_nothing(self):
+        Schedule.objects.create(id=5, doctor=self.other, work_date=self.monday + timedelta(days=2))
+        response = self.apply(doctor_ids=[self.doctor.id, self.other.id], on_conflict="error")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data["conflicts"],
+            [{"doctor_id": self.other.id, "work_date": self.monday + timedelta(days=2), "schedule_ids": [5]}],
+        )
+        self.assertEqual(Schedule.objects.count(), 1)
+
+    def test_new_ids_follow_current_maximum(self):
+        Schedule.objects.create(id=40, doctor=self.other, work_date=self.monday)
+        self.apply(doctor_ids=[self.doctor.id])
+        self.assertEqual(
+            sorted(Schedule.objects.filter(doctor=self.doctor).values_list("id", flat=True)),
+            list(range(41, 48)),
+        )
+
+    def test_dry_run_only_counts(self):
+        response = self.apply(doctor_ids=[self.doctor.id], dry_run=True)
+        self.assertEqual(response.data["created"], 7)
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_invalid_requests_are_400(self):
+        for data in ({"doctor_ids": [99]}, {"doctor_ids": [self.doctor.id], "on_conflict": "merge"}, {}):
+            self.assertEqual(self.apply(**data).status_code, 400, data)
+
+
+class PlanMovesTests(TestCase):
+    """Подбор переносов без базы данных."""
+
+    def plan(self, excess, studies, headroom, modalities):
+        return [move[0] for move in plan_moves(excess, studies, headroom, modalities)]
+
+    def test_lightest_single_covering_study(self):
+        studies = {1: {"CT": [(1.0, -2, 11), (3.0, -2, 12), (5.0, -2, 13)]}}
+        self.assertEqual(self.plan({1: 3.0}, studies, {2: 10.0}, {2: {"CT"}}), [12])
+
+    def test_heaviest_fitting_studies_when_none_covers(self):
+        studies = {1: {"CT": [(1.0, -2, 11), (2.0, -2, 12), (3.0, -2, 13)]}}
+        excess = {1: 7.0}
+        self.assertEqual(self.plan(excess, studies, {2: 10.0}, {2: {"CT"}}), [13, 12, 11])
+        self.assertAlmostEqual(excess[1], 1.0)
+
+    def test_receiver_is_not_pushed_over_target(self):
+        studies = {1: {"CT": [(1.0, -2, 11), (3.0, -2, 12)]}}
+        headroom = {2: 2.0}
+        self.assertEqual(self.plan({1: 4.0}, studies, headroom, {2: {"CT"}}), [11])
+        self.assertAlmostEqual(headroom[2], 1.0)
+
+    def test_receiver_with_most_room_first(self):
+        studies = {1: {"CT": [(2.0, -2, 11), (2.0, -2, 12), (2.0, -2, 13)]}}
+        moves = plan_moves({1: 6.0}, studies, {2: 4.0, 3: 3.0}, {2: {"CT"}, 3: {"CT", "MRI"}})
+        self.assertEqual([move[2] for move in moves], [2, 3, 2])
+
+    def test_modality_must_match(self):
+        studies = {1: {"CT": [(2.0, -2, 11)]}}
+        self.assertEqual(self.plan({1: 2.0}, studies, {2: 10.0}, {2: {"MRI"}}), [])
+
+    def test_normal_before_asap_at_equal_weight(self):
+        studies = {1: {"CT": sorted([(2.0, -1, 11), (2.0, -2, 12)])}}
+        moves = plan_moves({1: 2.0}, studies, {2: 10.0}, {2: {"CT"}})
+        self.assertEqual([(move[0], move[4]) for move in moves], [(12, 2)])
+
+
+class RebalanceTests(ApiTestCase):
+    day = date(2025, 3, 14)
+
+    def setUp(self):
+        super().setUp()
+        # Норма врача — 50 УП в месяц: 27 КТ по 2 УП дают перебор 4 УП
+        self.overloaded = [
+            self.make_study(created_at=moscow(2025, 3, 1 + index % 10, 10), doctor=self.doctor, status="confirmed")
+            for index in range(27)
+        ]
+        self.cito = self.make_study(
+            created_at=moscow(2025, 3, 2, 10), doctor=self.doctor, status="confirmed", priority="cito"
+        )
+        Schedule.objects.create(id=1, doctor=self.other, work_date=self.day, is_day_off=0)
+
+    def rebalance(self, **data):
+        data = {"date_from": "2025-03-01", "date_to": "2025-03-31", "date": self.day, **data}
+        response = self.client.post("/api/studies/rebalance/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_dry_run_plans_moves_without_writing(self):
+        result = self.rebalance(dry_run=True)
+        self.assertEqual((result["moved"], result["moved_up"]), (3, 6.0))
+        self.assertEqual(result["over_target_after"], 0)
+        self.assertNotIn(self.cito.id, [move["study_id"] for move in result["moves"]])
+        self.assertFalse(Study.objects.filter(diagnostician=self.other).exists())
+
+    def test_moves_are_applied(self):
+        result = self.rebalance(dry_run=False)
+        moved = {move["study_id"] for move in result["moves"]}
+        self.assertEqual(set(Study.objects.filter(diagnostician=self.other).values_list("id", flat=True)), moved)
+        doctors = {doctor["id"]: doctor for doctor in result["doctors"]}
+        self.assertEqual(doctors[self.doctor.id]["load_after"], 50.0)
+        self.assertEqual(doctors[self.other.id]["studies_in"], len(moved))
+
+    def test_receiver_must_work_that_day(self):
+        result = self.rebalance(dry_run=True, date=self.day + timedelta(days=1))
+        self.assertEqual(result["moved"], 0)
+        self.assertEqual(result["unresolved"][0]["doctor_id"], self.doctor.id)
+
+
+class BuildReportTests(ApiTestCase):
+    def rows(self, keys, *values):
+        return [dict(zip(keys + COUNTERS, row)) for row in values]
+
+    def setUp(self):
+        super().setUp()
+        type_rows = self.rows(
+            STUDY_TYPE_KEYS,
+            (1, "CT", 4, 2, Decimal("8"), Decimal("4")),
+            (2, "MRI", 2, 1, Decimal("6"), Decimal("3")),
+            (3, "XRAY", 1, 0, Decimal("1"), None),
+        )
+        doctor_rows = self.rows(
+            DOCTOR_KEYS,
+            (1, "CT", 3, 2, Decimal("6"), Decimal("4")),
+            (2, "MRI", 2, 1, Decimal("6"), Decimal("3")),
+            (2, "CT", 1, 0, Decimal("2"), None),
+            (None, "XRAY", 1, 0, Decimal("1"), None),
+        )
+        # Смена без плана — дневной максимум врача (10 УП)
+        plan_rows = [
+            {"doctor_id": 1, "shifts": 2, "plan_up": 15, "unplanned": 1},
+            {"doctor_id": 2, "shifts": 1, "plan_up": None, "unplanned": 1},
+        ]
+        self.report = build_report(date(2025, 3, 1), date(2025, 3, 31), type_rows, doctor_rows, plan_rows)
+
+    def test_totals(self):
+        self.assertEqual(
+            self.report["totals"],
+            {
+                "studies": 7, "signed": 3, "up": 15.0, "signed_up": 7.0, "up_per_study": 2.14,
+                "plan_up": 35.0, "fulfillment": 20.0, "shifts": 3, "doctors": 2, "unassigned": 1,
+            },
+        )
+
+    def test_doctor_plan_is_split_by_modality_up(self):
+        modalities = {row["modality"]: row for row in self.report["modalities"]}
+        self.assertEqual(list(modalities), ["CT", "MRI", "XRAY"])
+        self.assertEqual((modalities["CT"]["plan_up"], modalities["CT"]["fulfillment"]), (27.5, 14.5))
+        self.assertEqual((modalities["MRI"]["plan_up"], modalities["MRI"]["fulfillment"]), (7.5, 40.0))
+        self.assertEqual((modalities["XRAY"]["plan_up"], modalities["XRAY"]["fulfillment"]), (0.0, None))
+        self.assertEqual(modalities["CT"]["share"], 57.1)
+
+    def test_doctors_and_study_types(self):
+        doctors = {row["id"]: row for row in self.report["doctors"]}
+        self.assertEqual((doctors[1]["plan_up"], doctors[1]["fulfillment"]), (25.0, 16.0))
+        self.assertEqual((doctors[2]["plan_up"], doctors[2]["fulfillment"]), (10.0, 30.0))
+        self.assertEqual(doctors[2]["modality"], ["CT", "MRI"])
+        self.assertEqual([row["id"] for row in self.report["study_types"]], [1, 2, 3])
+        self.assertEqual(self.report["study_types"][0]["name"], "КТ ОГК")
+
+    def test_invalid_period_is_400(self):
+        for params in (
+            {"date_from": "2025-03-01", "date_to": "2025-02-30"},
+            {"date_from": "2025-03-10", "date_to": "2025-03-01"},
+            {"date_from": "2024-01-01", "date_to": "2025-03-01"},
+        ):
+            self.assertEqual(self.client.get("/api/reports/", params).status_code, 400, params)
+
+
+class ReportEndpointTests(UnmanagedTransactionTestCase):
+    """Запросы отчёта выполняются в пуле соединений — данные зафиксированы."""
+
+    def setUp(self):
+        cache.clear()
+        ct = StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        doctor = Doctor.objects.create(id=1, fio_alias="Иванов", max_up_per_day=10, modality=["CT"])
+        Schedule.objects.create(id=1, doctor=doctor, work_date=date(2025, 3, 3), is_day_off=0, planned_up=8)
+        Study.objects.bulk_create(
+            Study(
+                id=index, research_number=f"R-{index}", study_type=ct, diagnostician=doctor,
+                status=status, created_at=moscow(2025, 3, 3, 9 + index),
+            )
+            for index, status in enumerate(("signed", "signed", "confirmed"), start=1)
+        )
+        reload_reference_data()
+
+    def test_closed_period_report_is_cached(self):
+        params = {"date_from": "2025-03-01", "date_to": "2025-03-31"}
+        report = self.client.get("/api/reports/", params).json()
+        self.assertEqual((report["totals"]["signed_up"], report["totals"]["plan_up"]), (4.0, 8.0))
+        self.assertEqual(report["totals"]["fulfillment"], 50.0)
+
+        Study.objects.filter(id=3).update(status="signed")
+        cached = self.client.get("/api/reports/", params).json()
+        self.assertEqual(cached["computed_at"], report["computed_at"])
+        self.assertEqual(cached["totals"]["signed"], 2)
+
+
+class ForecastMathTests(TestCase):
+    """Регрессия по неделям и слияние истории — без базы данных."""
+
+    weeks = 8
+
+    def linear(self):
+        # День недели d недели k: 10 + 2k + d
+        return np.array([[10 + 2 * (day // 7) + day % 7 for day in range(self.weeks * 7)]], dtype=float)
+
+    def test_linear_series_is_fitted_exactly(self):
+        fit = fit_weekly(self.linear())
+        np.testing.assert_allclose(fit["slope"], 2.0)
+        np.testing.assert_allclose(fit["sigma"], 0.0, atol=1e-9)
+
+        start = date(2025, 1, 6)
+        days = [start + timedelta(days=self.weeks * 7 + offset) for offset in range(7)]
+        value, error = predict(fit, start, days)
+        np.testing.assert_allclose(value[0], [10 + 2 * self.weeks + day for day in range(7)])
+        np.testing.assert_allclose(error, 0.0, atol=1e-9)
+
+    def test_prediction_is_never_negative_and_error_grows_with_distance(self):
+        values = np.array([[30 - 4 * (day // 7) + (day % 3) for day in range(self.weeks * 7)]], dtype=float)
+        fit = fit_weekly(values)
+        start = date(2025, 1, 6)
+        near, far = start + timedelta(days=self.weeks * 7), start + timedelta(days=self.weeks * 7 + 70)
+        value, error = predict(fit, start, [near, far])
+        self.assertEqual(value[0, 1], 0)
+        self.assertGreater(error[0, 1], error[0, 0])
+
+    def test_recent_weeks_weigh_more(self):
+        values = np.array([[0.0] * (self.weeks - 1) * 7 + [7.0] * 7])
+        fit = fit_weekly(values)
+        self.assertGreater(fit["mean"][0, 0], 7.0 / self.weeks)
+
+    def test_merge_keeps_old_days_and_replaces_refetched(self):
+        start = date(2025, 3, 1)
+        history = {
+            "start": start,
+            "through": date(2025, 3, 4),
+            "modalities": ["CT", "MRI"],
+            "counts": np.array([[1.0, 2, 3, 4], [5, 6, 7, 8]]),
+            "up": np.array([[2.0, 4, 6, 8], [15, 18, 21, 24]]),
+        }
+        rows = [
+            {"bucket": date(2025, 3, 4), "study_type__modality": "CT", "plan": 9, "plan_up": Decimal("18")},
+            {"bucket": date(2025, 3, 5), "study_type__modality": "XRAY", "plan": 1, "plan_up": None},
+        ]
+        merged = merge_history(history, rows, date(2025, 3, 2), date(2025, 3, 5), date(2025, 3, 4))
+        self.assertEqual(merged["modalities"], ["CT", "MRI", "XRAY"])
+        np.testing.assert_array_equal(merged["counts"], [[2, 3, 9, 0], [6, 7, 0, 0], [0, 0, 0, 1]])
+        np.testing.assert_array_equal(merged["up"][0], [4, 6, 18, 0])
+
+    def test_merge_drops_modalities_without_studies(self):
+        rows = [{"bucket": date(2025, 3, 1), "study_type__modality": "CT", "plan": 0, "plan_up": None}]
+        merged = merge_history(None, rows, date(2025, 3, 1), date(2025, 3, 1), date(2025, 3, 1))
+        self.assertEqual(merged["modalities"], [])
+
+
+class ForecastEndpointTests(UnmanagedTransactionTestCase):
+    """История читается в пуле соединений — данные зафиксированы."""
+
+    def setUp(self):
+        cache.clear()
+        ct = StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        today = timezone.localdate()
+        # Два исследования КТ в день за всю историю прогноза
+        Study.objects.bulk_create(
+            Study(
+                id=index, research_number=f"R-{index}", study_type=ct, status="signed",
+                created_at=timezone.make_aware(datetime.combine(today - timedelta(days=index // 2 + 1), time(12))),
+            )
+            for index in range(FORECAST_HISTORY_WEEKS * 7 * 2)
+        )
+        reload_reference_data()
+
+    def test_steady_flow_is_forecast_with_actuals(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        response = self.client.get("/api/forecast/", {"date_from": yesterday.isoformat(), "days": 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["modalities"], ["CT"])
+        self.assertEqual(
+            [(point["studies"], point["up"], point["studies_low"], point["studies_high"]) for point in data["series"]],
+            [(2.0, 4.0, 2.0, 2.0)] * 3,
+        )
+        self.assertEqual([point["actual_studies"] for point in data["series"]], [2, None, None])
+
+    def test_out_of_range_dates_are_400(self):
+        today = timezone.localdate()
+        for params in (
+            {"date_from": (today - timedelta(days=400)).isoformat()},
+            {"date_from": (today + timedelta(days=90)).isoformat()},
+            {"date_from": "2025-02-30"},
+            {"days": 0},
+        ):
+            self.assertEqual(self.client.get("/api/forecast/", params).status_code, 400, params)
+
+
+class BulkTests(ApiTestCase):
+    def bulk_assign(self, *pairs):
+        response = self.client.post(
+            "/api/studies/bulk_assign/",
+            {"assignments": [{"study_id": study_id, "doctor_id": doctor_id} for study_id, doctor_id in pairs]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_bulk_assign_results_per_item(self):
+        pending = self.make_study()
+        same = self.make_study(doctor=self.doctor, status="confirmed")
+        moved = self.make_study(doctor=self.doctor, status="confirmed")
+        signed = self.make_study(doctor=self.doctor, status="signed")
+        result = self.bulk_assign(
+            (pending.id, self.doctor.id),
+            (same.id, self.doctor.id),
+            (moved.id, self.other.id),
+            (signed.id, self.other.id),
+            (9999, self.doctor.id),
+            (pending.id + 100, 99),
+        )
+        self.assertEqual(
+            [item["result"] for item in result["results"]],
+            ["assigned", "unchanged", "assigned", "not_assignable", "study_not_found", "study_not_found"],
+        )
+        self.assertEqual(result["updated"], 2)
+        self.assertEqual({doctor["id"] for doctor in result["doctors"]}, {self.doctor.id, self.other.id})
+        moved.refresh_from_db()
+        self.assertEqual(moved.diagnostician_id, self.other.id)
+
+    def test_bulk_assign_keeps_signed_study_signed(self):
+        signed = self.make_study(doctor=self.doctor, status="signed")
+        result = self.bulk_assign((signed.id, self.other.id))
+        self.assertEqual((result["updated"], result["results"][0]["result"]), (0, "not_assignable"))
+        signed.refresh_from_db()
+        self.assertEqual((signed.status, signed.diagnostician_id), ("signed", self.doctor.id))
+
+    def test_bulk_assign_unknown_doctor_and_last_pair_wins(self):
+        study = self.make_study()
+        result = self.bulk_assign((study.id, 99))
+        self.assertEqual(result["results"][0]["result"], "doctor_not_found")
+        result = self.bulk_assign((study.id, self.doctor.id), (study.id, self.other.id))
+        self.assertEqual(result["results"], [{"study_id": study.id, "doctor_id": self.other.id, "result": "assigned"}])
+
+    def test_bulk_update_status_results_per_item(self):
+        confirmed = self.make_study(doctor=self.doctor, status="confirmed")
+        signed = self.make_study(doctor=self.doctor, status="signed")
+        response = self.client.post(
+            "/api/studies/bulk_update_status/",
+            {
+                "updates": [
+                    {"study_id": confirmed.id, "status": "signed"},
+                    {"study_id": signed.id, "status": "signed"},
+                    {"study_id": 9999, "status": "signed"},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(
+            [item["result"] for item in response.data["results"]], ["updated", "unchanged", "study_not_found"]
+        )
+        self.assertEqual([doctor["id"] for doctor in response.data["doctors"]], [self.doctor.id])
+
+    def test_empty_or_oversized_batch_is_400(self):
+        self.assertEqual(
+            self.client.post("/api/studies/bulk_assign/", {"assignments": []}, format="json").status_code, 400
+        )
+        updates = [{"study_id": index, "status": "signed"} for index in range(BULK_MAX_ITEMS + 1)]
+        self.assertEqual(
+            self.client.post("/api/studies/bulk_update_status/", {"updates": updates}, format="json").status_code,
+            400,
+        )
+
+
+@override_settings(STUDY_SLA_MINUTES={"cito": 60, "asap": 240, "normal": 1440})
+class PriorityQueueTests(ApiTestCase):
+    now = moscow(2026, 10, 17, 12, 0)
+
+    def setUp(self):
+        super().setUp()
+        self.normal_fresh = self.make_study(created_at=moscow(2026, 10, 17, 11, 0))
+        self.asap_fresh = self.make_study(created_at=moscow(2026, 10, 17, 11, 30), priority="asap")
+        self.cito = self.make_study(created_at=moscow(2026, 10, 17, 11, 50), priority="cito")
+        self.asap_overdue = self.make_study(created_at=moscow(2026, 10, 17, 7, 0), priority="asap")
+        self.normal_overdue = self.make_study(created_at=moscow(2026, 10, 16, 10, 0))
+        self.assigned = self.make_study(created_at=moscow(2026, 10, 16, 9, 0), doctor=self.doctor, status="confirmed")
+        self.undated = self.make_study(priority="cito")
+        self.expected = [self.asap_overdue, self.cito, self.normal_overdue, self.asap_fresh, self.normal_fresh]
+
+    def test_head_orders_by_tier_then_due(self):
+        head = queue_head(10, now=self.now)
+        self.assertEqual([item["study"].id for item in head], [study.id for study in self.expected])
+        self.assertEqual([item["position"] for item in head], [1, 2, 3, 4, 5])
+        self.assertEqual([item["overdue"] for item in head], [True, False, True, False, False])
+
+    def test_head_limit_takes_queue_prefix(self):
+        head = queue_head(2, now=self.now)
+        self.assertEqual([item["study"].id for item in head], [self.asap_overdue.id, self.cito.id])
+
+    def test_position_matches_head(self):
+        for position, study in enumerate(self.expected, start=1):
+            self.assertEqual(queue_position(study, now=self.now)["position"], position)
+
+    def test_assigned_or_undated_study_is_not_in_queue(self):
+        self.assertIsNone(queue_position(self.assigned, now=self.now))
+        self.assertIsNone(queue_position(self.undated, now=self.now))
+        response = self.client.get(f"/api/studies/{self.assigned.id}/queue_position/")
+        self.assertEqual(response.status_code, 404)
+
+
+class PendingQueueTests(ApiTestCase):
+    def test_priority_then_oldest_first(self):
+        late = self.make_study(created_at=moscow(2025, 3, 10, 12, 0))
+        undated = self.make_study()
+        early = self.make_study(created_at=moscow(2025, 3, 10, 9, 0), study_type=self.mri)
+        cito = self.make_study(created_at=moscow(2025, 3, 10, 15, 0), priority="cito", study_type=self.xray)
+        self.make_study(created_at=moscow(2025, 3, 10, 8, 0), doctor=self.doctor, status="confirmed")
+        self.assertEqual(
+            pending_queue(),
+            [
+                (cito.id, "cito", "XRAY", 1.0),
+                (early.id, "normal", "MRI", 3.0),
+                (late.id, "normal", "CT", 2.0),
+                (undated.id, "normal", "CT", 2.0),
+            ],
+        )
+
+
+class BuildPlanTests(TestCase):
+    def doctors(self, **used):
+        return {
+            1: {"fio_alias": "Иванов", "modality": {"CT", "XRAY"}, "capacity": 10.0, "used": used.get("first", 0.0)},
+            2: {"fio_alias": "Петров", "modality": {"CT"}, "capacity": 5.0, "used": used.get("second", 0.0)},
+        }
+
+    def test_least_loaded_doctor_by_share_of_capacity(self):
+        doctors = self.doctors(first=4.0, second=1.0)
+        plan, skipped = build_plan([(1, "normal", "CT", 2.0), (2, "normal", "CT", 2.0)], doctors)
+        # 4/10 против 1/5, затем 4/10 против 3/5
+        self.assertEqual([row[:2] for row in plan], [(1, 2), (2, 1)])
+        self.assertEqual((doctors[1]["used"], doctors[2]["used"]), (6.0, 3.0))
+        self.assertEqual(skipped, {})
+
+    def test_skips_unknown_modality_and_full_doctors(self):
+        doctors = self.doctors(first=9.0, second=4.0)
+        queue = [(1, "cito", "MRI", 3.0), (2, "normal", "CT", 2.0), (3, "normal", "XRAY", 1.0)]
+        plan, skipped = build_plan(queue, doctors)
+        self.assertEqual([row[:2] for row in plan], [(3, 1)])
+        self.assertEqual(skipped, {"no_doctor_for_modality": 1, "no_capacity": 1})
+
+    def test_zero_capacity_doctor_is_ignored(self):
+        doctors = self.doctors()
+        doctors[2]["capacity"] = 0
+        plan, _ = build_plan([(1, "normal", "CT", 1.0)], doctors)
+        self.assertEqual(plan, [(1, 1, 1.0, "normal")])
+
+
+class FlatLayoutTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assigned = self.make_study(created_at=moscow(2025, 3, 10, 9, 0), doctor=self.doctor, status="confirmed")
+        self.same_doctor = self.make_study(created_at=moscow(2025, 3, 10, 10, 0), doctor=self.doctor, status="confirmed")
+        self.undated = self.make_study(study_type=self.mri)
+
+    def test_rows_match_study_serializer(self):
+        response = self.client.get("/api/studies/", {"layout": "flat"})
+        self.assertEqual(response.status_code, 200)
+        expected = StudySerializer(Study.objects.order_by("id"), many=True).data
+        self.assertEqual(sorted(response.data["results"], key=lambda row: row["id"]), [dict(row) for row in expected])
+
+    def test_included_holds_each_doctor_and_type_once(self):
+        included = self.client.get("/api/studies/", {"layout": "flat"}).data["included"]
+        self.assertEqual(included["doctors"], {self.doctor.id: DoctorSerializer(self.doctor).data})
+        self.assertEqual(set(included["study_types"]), {self.ct.id, self.mri.id})
+        self.assertEqual(included["study_types"][self.mri.id], StudyTypeSerializer(self.mri).data)
+
+    def test_page_drops_cursor_fields(self):
+        response = self.client.get("/api/studies/", {"layout": "flat", "page_size": 2})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.same_doctor.id, self.assigned.id])
+        self.assertTrue(all(set(row) == set(STUDY_FIELDS) for row in response.data["results"]))
+        self.assertTrue(response.data["next_cursor"])
+
+    def test_flat_studies_strips_extra_fields(self):
+        data = flat_studies(list(study_rows(Study.objects.filter(pk=self.undated.pk), ["priority"])), ["priority"])
+        self.assertNotIn("priority", data["results"][0])
+        self.assertEqual(data["included"], {"study_types": {self.mri.id: StudyTypeSerializer(self.mri).data}, "doctors": {}})
+
+
+class DoctorLoadTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_study(created_at=moscow(2025, 3, 10, 9, 0), doctor=self.doctor, status="confirmed")
+        self.make_study(created_at=moscow(2025, 3, 11, 9, 0), doctor=self.doctor, status="signed", study_type=self.xray)
+        self.make_study(created_at=moscow(2025, 3, 12, 9, 0), doctor=self.other, status="signed", study_type=self.mri)
+        self.make_study(created_at=moscow(2025, 4, 1, 9, 0), doctor=self.doctor, status="confirmed")
+        self.make_study(created_at=moscow(2025, 3, 10, 9, 0))
+
+    def test_with_load_for_date_window(self):
+        response = self.client.get("/api/doctors/with_load/", {"date_from": "2025-03-01", "date_to": "2025-03-31"})
+        self.assertEqual(response.status_code, 200)
+        loads = {row["id"]: (row["current_load"], row["active_studies"]) for row in response.data}
+        self.assertEqual(loads, {self.doctor.id: (3, 1), self.other.id: (3, 0)})
+
+    def test_rollup_and_grouped_query_agree(self):
+        start, end = date_window(date(2025, 3, 1), date(2025, 4, 30))
+        # Окно не по границе суток читается сгруппированным запросом по studies
+        self.assertEqual(doctor_loads(start, end), doctor_loads(start + timedelta(seconds=1), end))
+        self.assertEqual(doctor_loads(start, end)[self.doctor.id], {"total_up": 5, "active_count": 2})
+
+    def test_invalid_dates_are_400(self):
+        response = self.client.get("/api/doctors/with_load/", {"date_from": "2025-03", "date_to": "2025-03-31"})
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardStatsTests(UnmanagedTransactionTestCase):
+    """Счётчики считаются в пуле соединений — данные зафиксированы."""
+
+    def setUp(self):
+        cache.clear()
+        ct = StudyType.objects.create(id=1, name="КТ ОГК", modality="CT", up_value=Decimal("2.00"))
+        doctor = Doctor.objects.create(id=1, fio_alias="Иванов", max_up_per_day=10, modality=["CT"])
+        Study.objects.bulk_create(
+            Study(
+                id=index, research_number=f"R-{index}", study_type=ct, diagnostician=doctor,
+                status=status, priority=priority, created_at=moscow(2025, 3, 3, 9 + index),
+            )
+            for index, (status, priority) in enumerate(
+                (("signed", "normal"), ("confirmed", "cito"), ("confirmed", "asap")), start=1
+            )
+        )
+        reload_reference_data()
+
+    def stats(self):
+        response = self.client.get("/api/dashboard/stats/", {"date": "2025-03-03"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_day_counters(self):
+        stats = self.stats()
+        self.assertEqual(
+            [stats[key] for key in ("total_studies", "completed_studies", "pending_studies", "cito_studies", "asap_studies")],
+            [3, 1, 2, 1, 1],
+        )
+
+    def test_snapshot_is_cached_until_study_changes(self):
+        version = stats_version()
+        self.assertEqual(self.stats()["completed_studies"], 1)
+
+        # Изменение в обход API снимок не сбрасывает
+        Study.objects.filter(id=2).update(status="signed")
+        self.assertEqual(self.stats()["completed_studies"], 1)
+
+        response = self.client.post(
+            "/api/studies/bulk_update_status/",
+            json.dumps({"updates": [{"study_id": 3, "status": "signed"}]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(stats_version(), version)
+        self.assertEqual(self.stats()["completed_studies"], 3)
+
+    def test_invalidate_recreates_missing_version(self):
+        cache.delete(VERSION_KEY)
+        invalidate_dashboard_stats()
+        self.assertEqual(stats_version(), 1)
+        invalidate_dashboard_stats()
+        self.assertEqual(stats_version(), 2)
+
+
+class ReferenceDataTests(ApiTestCase):
+    def test_snapshot_reused_until_api_change(self):
+        snapshot = reference_data()
+        self.assertIs(reference_data(), snapshot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/doctors/{self.doctor.id}/", {"fio_alias": "Сидоров"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNot(reference_data(), snapshot)
+        self.assertEqual(reference_data().doctors[self.doctor.id].fio_alias, "Сидоров")
+
+    def test_unknown_doctor_reloads_snapshot(self):
+        reference_data()
+        newcomer = Doctor.objects.create(id=3, fio_alias="Смирнов", max_up_per_day=10, modality=["CT"])
+        study = self.make_study()
+        response = self.client.post(
+            "/api/studies/bulk_assign/",
+            {"assignments": [{"study_id": study.id, "doctor_id": newcomer.id}]},
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["result"], "assigned")
+        self.assertIn(newcomer.id, reference_data().doctors)
+
+    def test_unknown_study_type_reloads_snapshot(self):
+        reference_data()
+        ultrasound = StudyType.objects.create(id=4, name="УЗИ", modality="US", up_value=Decimal("0.50"))
+        study = self.make_study(study_type=ultrasound)
+        self.assertEqual(pending_queue(), [(study.id, "normal", "US", 0.5)])
+        data = flat_studies(list(study_rows(Study.objects.all())))
+        self.assertEqual(set(data["included"]["study_types"]), {ultrasound.id})
+
+
+class DayLoadRollupTests(ApiTestCase):
+    def rollup(self):
+        return {
+            (row.doctor_id, row.work_date, row.status, row.priority): (row.study_count, row.total_up)
+            for row in DoctorDayLoad.objects.exclude(study_count=0)
+        }
+
+    def setUp(self):
+        super().setUp()
+        # Одна вставка на несколько строк — одно срабатывание триггера
+        Study.objects.bulk_create(
+            Study(
+                id=index, research_number=f"R-{index}", study_type=study_type, diagnostician=self.doctor,
+                status="confirmed", priority="normal", created_at=created_at,
+            )
+            for index, study_type, created_at in (
+                (1, self.ct, moscow(2025, 3, 10, 9, 0)),
+                (2, self.xray, moscow(2025, 3, 10, 23, 30)),
+                (3, self.ct, moscow(2025, 3, 11, 0, 30)),
+            )
+        )
+
+    def test_insert_groups_by_local_date(self):
+        self.assertEqual(
+            self.rollup(),
+            {
+                (self.doctor.id, date(2025, 3, 10), "confirmed", "normal"): (2, Decimal("3.00")),
+                (self.doctor.id, date(2025, 3, 11), "confirmed", "normal"): (1, Decimal("2.00")),
+            },
+        )
+
+    def test_status_change_and_reassignment_move_between_keys(self):
+        Study.objects.filter(id__in=[1, 2]).update(status="signed")
+        Study.objects.filter(id=3).update(diagnostician=self.other)
+        self.assertEqual(
+            self.rollup(),
+            {
+                (self.doctor.id, date(2025, 3, 10), "signed", "normal"): (2, Decimal("3.00")),
+                (self.other.id, date(2025, 3, 11), "confirmed", "normal"): (1, Decimal("2.00")),
+            },
+        )
+
+    def test_delete_and_unassign_subtract(self):
+        Study.objects.filter(id=1).delete()
+        Study.objects.filter(id=3).update(diagnostician=None, status="pending")
+        self.assertEqual(
+            self.rollup(), {(self.doctor.id, date(2025, 3, 10), "confirmed", "normal"): (1, Decimal("1.00"))}
+        )
+
+    def test_rebuild_matches_trigger(self):
+        Study.objects.filter(id=2).update(priority="cito")
+        expected = self.rollup()
+        self.assertEqual(rebuild_rollup(), len(expected))
+        self.assertEqual(self.rollup(), expected)
+
+
+class WeekGridTests(ApiTestCase):
+    monday = date(2025, 3, 10)
+
+    def setUp(self):
+        super().setUp()
+        for index, (doctor, offset, is_day_off, planned_up) in enumerate(
+            ((self.doctor, 0, 0, 9), (self.doctor, 1, 0, 5), (self.doctor, 2, 1, None), (self.other, 0, 0, 10)),
+            start=1,
+        ):
+            Schedule.objects.create(
+                id=index, doctor=doctor, work_date=self.monday + timedelta(days=offset),
+                is_day_off=is_day_off, planned_up=planned_up,
+            )
+        self.make_study(created_at=moscow(2025, 3, 10, 9, 0), doctor=self.doctor, status="confirmed")
+        self.make_study(created_at=moscow(2025, 3, 10, 11, 0), doctor=self.doctor, status="signed", study_type=self.xray)
+
+    def test_week_start_is_monday(self):
+        self.assertEqual(week_start(date(2025, 3, 16)), self.monday)
+        self.assertEqual(week_start(self.monday), self.monday)
+
+    def test_cells_carry_plan_fact_and_status(self):
+        grid = shift_grid(self.monday, 3)
+        self.assertEqual(grid["dates"], [self.monday + timedelta(days=offset) for offset in range(3)])
+        cells = {row["doctor_id"]: row["cells"] for row in grid["rows"]}
+        self.assertEqual(
+            [(cell["load_status"], cell["load_percentage"]) for cell in cells[self.doctor.id]],
+            [("warning", 90.0), ("normal", 50.0), ("empty", 0)],
+        )
+        self.assertEqual((cells[self.doctor.id][0]["actual_up"], cells[self.doctor.id][0]["study_count"]), (3.0, 2))
+        self.assertEqual(cells[self.other.id][0]["load_status"], "overload")
+        self.assertEqual(
+            grid["stats"],
+            {"total_doctors": 2, "total_possible_shifts": 6, "filled_shifts": 3, "warning_shifts": 1, "overload_shifts": 1},
+        )
+
+    def test_endpoint_filters_and_validates(self):
+        response = self.client.get(
+            "/api/schedules/week_grid/", {"date_from": "2025-03-10", "days": 2, "doctor_id": self.other.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["doctor_id"] for row in response.data["rows"]], [self.other.id])
+        self.assertEqual(len(response.data["rows"][0]["cells"]), 2)
+        self.assertEqual(self.client.get("/api/schedules/week_grid/", {"days": 0}).status_code, 400)
+        self.assertEqual(self.client.get("/api/schedules/week_grid/", {"date_from": "10.03.2025"}).status_code, 400)
+
+
+class SyntheticDataTests(UnmanagedTransactionTestCase):
+    """Генератор отключает триггеры studies — в собственной транзакции, как команда."""
+
+    def test_small_dataset(self):
+        counts = generate_dataset(doctors=5, study_types=4, studies=300, history_days=10, days_ahead=2, seed=7)
+        self.assertEqual(
+            {table: counts[table] for table in ("doctors", "study_types", "studies", "schedules")},
+            {"doctors": 5, "study_types": 4, "studies": 300, "schedules": 5 * 13},
+        )
+        for study in Study.objects.select_related("study_type", "diagnostician"):
+            if study.diagnostician is None:
+                self.assertEqual(study.status, "pending")
+            else:
+                self.assertIn(study.study_type.modality, study.diagnostician.modality)
+        assigned = Study.objects.filter(diagnostician_id__isnull=False).count()
+        self.assertEqual(sum(DoctorDayLoad.objects.values_list("study_count", flat=True)), assigned)
+
+    def test_same_seed_same_rows(self):
+        def rows(seed):
+            return list(generate_doctors(20, random.Random(seed))), list(generate_study_types(20, random.Random(seed)))
+
+        self.assertEqual(rows(3), rows(3))
+        self.assertNotEqual(rows(3), rows(4))
+
+
+class BenchmarkTests(ApiTestCase):
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 90), 4.6)
+        self.assertIsNone(percentile([], 95))
+
+    def test_every_route_is_measured_or_excluded(self):
+        self.make_study(created_at=moscow(2025, 3, 10, 9, 0), doctor=self.doctor, status="confirmed")
+        measured = {endpoint["name"] for endpoint in benchmark_endpoints()}
+        self.assertEqual(url_names() - measured, set(EXCLUDED_URL_NAMES))
+
+    def test_measure_reports_status_queries_and_size(self):
+        endpoint = {"name": "doctor-list", "method": "get", "url": "/api/doctors/", "body": None}
+        result = measure(Client(), endpoint, repeat=3, warmup=0)
+        self.assertEqual(result["status"], 200)
+        self.assertGreater(result["payload_bytes"], 0)
+        self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["max"])
+
+    def test_compare_runs_flags_slower_p95_and_more_queries(self):
+        def run(p95, queries):
+            return {"endpoints": {"doctor-list": {"latency_ms": {"p95": p95}, "queries": queries}}}
+
+        self.assertEqual(compare_runs(run(10, 2), run(11, 2)), [])
+        self.assertEqual(
+            compare_runs(run(10, 2), run(13, 3)),
+            ["doctor-list: p95 10 -> 13 мс", "doctor-list: SQL-запросов 2 -> 3"],
+        )
+
+
+class MetricsTests(ApiTestCase):
+    def sample(self, text, line_start):
+        values = [line.rsplit(" ", 1)[1] for line in text.splitlines() if line.startswith(line_start)]
+        return float(values[0]) if values else 0
+
+    def metrics(self, **extra):
+        return self.client.get("/api/metrics/", **extra)
+
+    def test_only_allowed_ips(self):
+        self.assertEqual(self.metrics(REMOTE_ADDR="10.0.0.5").status_code, 403)
+        response = self.metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    def test_middleware_records_view_requests_and_queries(self):
+        requests_line = 'rad_http_requests_total{view="doctor-list",method="GET",status="200"}'
+        before = render_metrics()
+        self.assertEqual(self.client.get("/api/doctors/").status_code, 200)
+        text = self.metrics().content.decode()
+        self.assertEqual(self.sample(text, requests_line) - self.sample(before, requests_line), 1)
+        queries_line = 'rad_db_queries_total{view="doctor-list"}'
+        self.assertGreaterEqual(self.sample(text, queries_line) - self.sample(before, queries_line), 1)
+        self.assertIn('rad_http_request_duration_seconds_bucket{view="doctor-list",le="+Inf"}', text)
+
+    def test_count_queries_includes_pool_threads(self):
+        with count_queries() as counter:
+            async_to_sync(run_parallel)(partial(Doctor.objects.count), partial(StudyType.objects.count))
+        self.assertEqual(counter.count, 2)
+
+    @override_settings(SLOW_REQUEST_MS=1)
+    def test_slow_request_logs_top_queries(self):
+        # Порог 1 мс: ответ с запросами к базе почти всегда дольше, но не наверняка
+        with self.assertLogs("api.metrics", "WARNING") as logs:
+            for _ in range(20):
+                APIClient().get("/api/doctors/with_load/")
+                if logs.records:
+                    break
+        self.assertIn("doctor-with-load", logs.output[0])
+
+
+def _sleep_and_pid(seconds):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid() FROM pg_sleep(%s)", [seconds])
+        return cursor.fetchone()[0]
+
+
+class ParallelQueryTests(TestCase):
+    """Пул api/parallel.py: одновременные запросы на собственных соединениях."""
+
+    def test_calls_run_concurrently_in_order(self):
+        started = perf_counter()
+        pids = async_to_sync(run_parallel)(partial(_sleep_and_pid, 0.3), partial(_sleep_and_pid, 0.3))
+        self.assertLess(perf_counter() - started, 0.55)
+        self.assertEqual(len(set(pids)), 2)
+
+    def test_pool_reuses_connections(self):
+        pids = set()
+        for _ in range(3):
+            pids.update(async_to_sync(run_parallel)(*[partial(_sleep_and_pid, 0)] * settings.DB_POOL_SIZE))
+        self.assertLessEqual(len(pids), settings.DB_POOL_SIZE)
+
+
+class AsyncViewTests(TestCase):
+    async def test_dashboard_stats_served_async(self):
+        response = await self.async_client.get("/api/dashboard/stats/", {"date": "2025-03-03"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_studies"], 0)
+
+    async def test_get_only_and_errors_as_json(self):
+        self.assertEqual((await self.async_client.post("/api/dashboard/stats/")).status_code, 405)
+        response = await self.async_client.get("/api/dashboard/chart/", {"granularity": "decade"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("granularity", response.json()["error"])
@@ -0,0 +1,187 @@
+"""
+Модуль агрегации временных рядов по исследованиям.
+
+Строит ряды «план/факт» (количество исследований и сумма УП) сгруппированным
+запросом с усечением created_at до дня, недели или месяца. Длинный период
+делится по границам интервалов на части, которые считаются одновременно
+в пуле соединений (api/parallel.py), поэтому годовой график строится
+за время самой долгой части, а не всего года. Пустые интервалы
+дополняются нулями на сервере, поэтому клиент получает непрерывный ряд
+без пропусков.
+"""
+
+from datetime import timedelta
+from functools import partial
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Trunc
+
+from .loads import date_window
+from .models import Study
+from .parallel import run_parallel
+
+GRANULARITIES = ("day", "week", "month")
+
+# Поле группировки для каждой разбивки
+BREAKDOWNS = {
+    "modality": "study_type__modality",
+    "priority": "priority",
+    "doctor": "diagnostician_id",
+}
+
+# Формат подписи интервала на графике
+LABEL_FORMATS = {
+    "day": "%d.%m",
+    "week": "%d.%m",
+    "month": "%m.%Y",
+}
+
+# Минимальная длина части периода, которую считает отдельный запрос, дней
+SERIES_CHUNK_DAYS = 31
+
+
+def bucket_start(day, granularity):
+    """Начало интервала, в который попадает дата."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    """Начало интервала, следующего за интервалом, который начинается с day."""
+    if granularity == "week":
+        return day + timedelta(days=7)
+    if granularity == "month":
+        if day.month == 12:
+            return day.replace(year=day.year + 1, month=1)
+        return day.replace(month=day.month + 1)
+    return day + timedelta(days=1)
+
+
+def iter_buckets(date_from, date_to, granularity):
+    """Начала всех интервалов, пересекающих период [date_from, date_to]."""
+    current = bucket_start(date_from, granularity)
+    while current <= date_to:
+        yield current
+        current = next_bucket(current, granularity)
+
+
+def series_queryset(start, end, granularity="day", breakdown=None):
+    """Сгруппированный по интервалам (и разбивке) запрос за период [start, end)."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if breakdown is not None and breakdown not in BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown: {breakdown}")
+
+    group_field = BREAKDOWNS.get(breakdown)
+    keys = ["bucket"] + ([group_field] if group_field else [])
+    signed = Q(status="signed")
+
+    return (
+        Study.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by()
+        .annotate(bucket=Trunc("created_at", granularity, output_field=DateField()))
+        .values(*keys)
+        .annotate(
+            plan=Count("id"),
+            actual=Count("id", filter=signed),
+            plan_up=Sum("study_type__up_value"),
+            actual_up=Sum("study_type__up_value", filter=signed),
+        )
+    )
+
+
+def split_period(date_from, date_to, granularity, parts):
+    """
+    Делит период [date_from, date_to] на не более чем parts частей
+    (пары дат включительно) по границам интервалов: каждый интервал
+    целиком попадает в одну часть.
+    """
+    buckets = list(iter_buckets(date_from, date_to, granularity))
+    if not buckets:
+        return []
+    parts = max(1, min(parts, len(buckets)))
+    chunks = []
+    for index in range(parts):
+        first = buckets[len(buckets) * index // parts]
+        last = buckets[len(buckets) * (index + 1) // parts - 1]
+        chunks.append(
+            (
+                max(first, date_from),
+                min(next_bucket(last, granularity) - timedelta(days=1), date_to),
+            )
+        )
+    return chunks
+
+
+def series_rows(date_from, date_to, granularity="day", breakdown=None):
+    """Строки сгруппированного запроса за даты [date_from, date_to] включительно."""
+    return list(series_queryset(*date_window(date_from, date_to), granularity, breakdown))
+
+
+def build_series(rows, date_from, date_to, granularity="day", breakdown=None):
+    """
+    Временной ряд из строк series_queryset.
+
+    По датам date_from/date_to строится сетка интервалов для заполнения
+    нулями. Каждая точка ряда содержит поля ChartDataSerializer (name, plan,
+    actual) и дополнительно date, plan_up, actual_up, а при разбивке — group.
+    """
+    group_field = BREAKDOWNS.get(breakdown)
+
+    totals = {}
+    groups = set()
+    for row in rows:
+        group = row[group_field] if group_field else None
+        groups.add(group)
+        totals[(row["bucket"], group)] = row
+
+    if not group_field:
+        groups = {None}
+    # None (нет модальности/врача) ставим в конец, остальные — по порядку
+    ordered_groups = sorted(groups, key=lambda g: (g is None, g or ""))
+
+    label_format = LABEL_FORMATS[granularity]
+    data = []
+    for bucket in iter_buckets(date_from, date_to, granularity):
+        for group in ordered_groups:
+            row = totals.get((bucket, group), {})
+            point = {
+                "name": bucket.strftime(label_format),
+                "date": bucket,
+                "plan": row.get("plan", 0),
+                "actual": row.get("actual", 0),
+                "plan_up": row.get("plan_up") or 0,
+                "actual_up": row.get("actual_up") or 0,
+            }
+            if group_field:
+                point["group"] = group
+            data.append(point)
+    return data
+
+
+async def study_series(date_from, date_to, granularity="day", breakdown=None):
+    """
+    Временной ряд исследований за даты [date_from, date_to] включительно.
+
+    Период длиннее SERIES_CHUNK_DAYS делится на части (не больше, чем
+    соединений в пуле), которые запрашиваются одновременно.
+    """
+    parts = min(
+        settings.DB_POOL_SIZE,
+        ((date_to - date_from).days + 1) // SERIES_CHUNK_DAYS,
+    )
+    chunks = split_period(date_from, date_to, granularity, parts)
+    results = await run_parallel(
+        *(
+            partial(series_rows, chunk_from, chunk_to, granularity, breakdown)
+            for chunk_from, chunk_to in chunks
+        )
+    )
+    return build_series(
+        chain.from_iterable(results), date_from, date_to, granularity, breakdown
+    )
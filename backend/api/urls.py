@@ -4,19 +4,29 @@ from .views import (
     DoctorViewSet,
     StudyTypeViewSet,
     ScheduleViewSet,
+    RotationTemplateViewSet,
     StudyViewSet,
     dashboard_stats,
     chart_data,
+    forecast,
+    reports,
+    events_stream,
+    metrics,
 )
 
 router = DefaultRouter()
 router.register(r"doctors", DoctorViewSet, basename="doctor")
 router.register(r"study-types", StudyTypeViewSet, basename="study-type")
 router.register(r"schedules", ScheduleViewSet, basename="schedule")
+router.register(r"rotation-templates", RotationTemplateViewSet, basename="rotation-template")
 router.register(r"studies", StudyViewSet, basename="study")
 
 urlpatterns = [
     path("", include(router.urls)),
     path("dashboard/stats/", dashboard_stats, name="dashboard-stats"),
     path("dashboard/chart/", chart_data, name="chart-data"),
+    path("forecast/", forecast, name="forecast"),
+    path("reports/", reports, name="reports"),
+    path("events/", events_stream, name="events"),
+    path("metrics/", metrics, name="metrics"),
 ]
@@ -1,23 +1,100 @@
+import asyncio
+
 from rest_framework import viewsets
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
 from datetime import datetime, timedelta
-from django.db.models import Q, Sum, F, Case, When, IntegerField, Value
-from .models import Doctor, StudyType, Schedule, Study
+from .models import ASSIGNABLE_STATUSES, Doctor, StudyType, Schedule, Study, RotationTemplate
+from .bulk import BULK_MAX_ITEMS, bulk_assign, bulk_update_status
+from .claims import ANY_DOCTOR, claim_next, compare_and_assign
+from .dashboard import dashboard_snapshot, invalidate_dashboard_stats
+from .distribution import auto_distribute
+from .events import (
+    assignment_events,
+    format_sse,
+    publish,
+    publish_created,
+    status_events,
+    subscribe,
+    unsubscribe,
+)
+from .export import EXPORT_FORMATS, export_loads, export_studies, is_asgi
+from .forecast import demand_forecast
+from .flat import STUDY_FIELDS, flat_studies, study_rows
+from .ingest import INGEST_CONTENT_TYPES, INGEST_FORMATS, ingest_studies, read_rows
+from .loads import date_window, doctors_with_load, month_bounds
+from .metrics import render_metrics
+from .optimizer import forecast_demand, optimize_shifts, save_plan
+from .pagination import KeysetPagination
+from .planning import DEFAULT_GRID_DAYS, MAX_GRID_DAYS, shift_grid, week_start
+from .priority_queue import (
+    DEFAULT_QUEUE_LIMIT,
+    MAX_QUEUE_LIMIT,
+    queue_head,
+    queue_position,
+    sla_breaches,
+)
+from .rebalance import DEFAULT_TARGET_PERCENTAGE, rebalance_loads
+from .reference import invalidate_reference_data, reference_data
+from .reports import MAX_REPORT_DAYS, report_snapshot
+from .rotations import (
+    RotationConflict,
+    allocate_schedule_ids,
+    apply_rotation,
+    lock_schedules,
+)
+from .sync import delta
+from .timeseries import BREAKDOWNS, GRANULARITIES, study_series
 from .serializers import (
     DoctorSerializer,
-    DoctorWithLoadSerializer,
     StudyTypeSerializer,
     ScheduleSerializer,
     ScheduleWithDoctorSerializer,
     StudySerializer,
     StudyWithDetailsSerializer,
+    BulkAssignItemSerializer,
+    ClaimNextSerializer,
+    RebalanceSerializer,
+    BulkStatusItemSerializer,
     DashboardStatsSerializer,
     ChartDataSerializer,
+    RotationTemplateSerializer,
+    RotationApplySerializer,
+    ShiftOptimizeSerializer,
+    PlanAcceptSerializer,
 )
 
 
+def sync_response(request, table_name, queryset, serializer_class):
+    """Ответ дельта-синхронизации по параметрам token или since"""
+    token = request.query_params.get("token")
+    since = request.query_params.get("since")
+
+    try:
+        token = int(token) if token else None
+    except ValueError:
+        return Response({"error": "token must be an integer"}, status=400)
+    if since and token is None:
+        since = parse_datetime(since)
+        if since is None:
+            return Response({"error": "since must be an ISO datetime"}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    else:
+        since = None
+
+    result = delta(table_name, queryset, token=token, since=since)
+    result["upserted"] = serializer_class(result["upserted"], many=True).data
+    return Response(result)
+
+
 class DoctorViewSet(viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
@@ -31,71 +108,66 @@ class DoctorViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=is_active.lower() == "true")
         return queryset
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate_reference_data()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_reference_data()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_reference_data()
+
+    def _reference_doctors(self):
+        """Врачи из справочника в памяти с тем же фильтром is_active, что у списка"""
+        is_active = self.request.query_params.get("is_active")
+        if is_active is not None:
+            is_active = is_active.lower() == "true"
+        return reference_data().doctor_list(is_active)
+
+    def _load_window(self, request):
+        """Период нагрузки из date_from/date_to (по умолчанию текущий месяц)"""
+        date_from = request.query_params.get("date_from")
+        date_to = request.query_params.get("date_to")
+        if date_from and date_to:
+            return date_window(
+                datetime.strptime(date_from, "%Y-%m-%d").date(),
+                datetime.strptime(date_to, "%Y-%m-%d").date(),
+            )
+        return month_bounds()
+
     @action(detail=False, methods=["get"])
     def with_load(self, request):
-        """Врачи с текущей загрузкой ЗА ТЕКУЩИЙ МЕСЯЦ"""
-        from django.utils import timezone
-        from django.db.models import Sum, F
-        from datetime import datetime
+        """Врачи с загрузкой за период (по умолчанию ЗА ТЕКУЩИЙ МЕСЯЦ)"""
+        try:
+            start, end = self._load_window(request)
+        except ValueError:
+            return Response(
+                {"error": "date_from and date_to must be YYYY-MM-DD"}, status=400
+            )
 
-        now = timezone.now()
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return Response(doctors_with_load(self._reference_doctors(), start, end))
 
-        if now.month == 12:
-            month_end = now.replace(year=now.year + 1, month=1, day=1)
-        else:
-            month_end = now.replace(month=now.month + 1, day=1)
-
-        doctors = Doctor.objects.all()
-
-        data = []
-        for doctor in doctors:
-            # Считаем УП по формуле: ∑ (количество исследований * весовой коэффициент)
-            # Используем агрегацию для суммирования весовых коэффициентов
-            up_data = Study.objects.filter(
-                diagnostician=doctor,
-                created_at__gte=month_start,
-                created_at__lt=month_end,
-                status__in=["confirmed", "pending", "signed"],  # Считаем все описанные
-            ).aggregate(
-                total_up=Sum(F('study_type__up_value')),  # ← Поле с коэффициентом в StudyType
-                active_count=Sum(
-                    Case(
-                        When(status__in=["confirmed", "pending"], then=1),
-                        default=0,
-                        output_field=IntegerField()
-                    )
-                )
+    @action(detail=False, methods=["get"])
+    def export_loads(self, request):
+        """Потоковая выгрузка нагрузки врачей (CSV/NDJSON)"""
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=400,
             )
-
-            current_load = round(up_data['total_up'] or 0, 3)
-            active_studies = up_data['active_count'] or 0
-
-            # Норма УП в месяц согласно положению
-            norm_up = 40 if doctor.position_type == "head" else 50
-
-            data.append(
-                {
-                    "id": doctor.id,
-                    "fio_alias": doctor.fio_alias or f"Врач {doctor.id}",
-                    "position_type": doctor.position_type,
-                    "max_up_per_day": doctor.max_up_per_day or norm_up,
-                    "is_active": (
-                        doctor.is_active if doctor.is_active is not None else True
-                    ),
-                    "specialty": (
-                        "Рентгенолог"
-                        if doctor.position_type == "radiologist"
-                        else "КТ-диагност"
-                    ),
-                    "current_load": current_load,
-                    "max_load": norm_up,
-                    "active_studies": active_studies,
-                    "load_percentage": round((current_load / norm_up) * 100, 1) if norm_up > 0 else 0,
-                }
+        try:
+            start, end = self._load_window(request)
+        except ValueError:
+            return Response(
+                {"error": "date_from and date_to must be YYYY-MM-DD"}, status=400
             )
 
-        return Response(data)
+        loads = doctors_with_load(self._reference_doctors(), start, end)
+        return export_loads(loads, export_format, asynchronous=is_asgi(request))
 
 
 class StudyTypeViewSet(viewsets.ReadOnlyModelViewSet):
@@ -127,6 +199,12 @@ class ScheduleViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def perform_create(self, serializer):
+        # У schedules нет последовательности: id выделяется под блокировкой
+        with transaction.atomic():
+            lock_schedules()
+            serializer.save(id=allocate_schedule_ids(1)[0])
+
     @action(detail=False, methods=["get"])
     def by_date(self, request):
         """Расписание на конкретную дату"""
@@ -140,9 +218,114 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         serializer = ScheduleWithDoctorSerializer(schedules, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def week_grid(self, request):
+        """Готовая сетка смен «врачи × дни» с планом, фактом и статусом загрузки"""
+        date_from = request.query_params.get("date_from")
+        days = request.query_params.get("days", DEFAULT_GRID_DAYS)
+        doctor_id = request.query_params.get("doctor_id")
+        is_active = request.query_params.get("is_active")
 
-class StudyViewSet(viewsets.ReadOnlyModelViewSet):
+        try:
+            if date_from:
+                date_from = datetime.strptime(date_from, "%Y-%m-%d").date()
+            else:
+                date_from = week_start(timezone.localdate())
+            days = int(days)
+            doctor_id = int(doctor_id) if doctor_id else None
+        except ValueError:
+            return Response(
+                {"error": "date_from must be YYYY-MM-DD, days and doctor_id integers"},
+                status=400,
+            )
+        if not 1 <= days <= MAX_GRID_DAYS:
+            return Response(
+                {"error": f"days must be between 1 and {MAX_GRID_DAYS}"}, status=400
+            )
+        if is_active is not None:
+            is_active = is_active.lower() == "true"
+
+        return Response(shift_grid(date_from, days, doctor_id, is_active))
+
+    @action(detail=False, methods=["post"])
+    def optimize(self, request):
+        """Предложить план смен под прогноз потока УП (ничего не записывает)"""
+        serializer = ShiftOptimizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        try:
+            if "demand" in params:
+                demand = {}
+                for item in params["demand"]:
+                    key = (item["date"], item["modality"])
+                    demand[key] = demand.get(key, 0) + item["up"]
+                source = "request"
+            else:
+                demand = forecast_demand(
+                    params["date_from"], params["date_to"], params["demand_level"]
+                )
+                source = params["demand_level"]
+            result = optimize_shifts(
+                params["date_from"], params["date_to"], demand, params.get("doctor_ids")
+            )
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        return Response({**result, "demand_source": source})
+
+    @action(detail=False, methods=["post"])
+    def accept_plan(self, request):
+        """Записать утверждённый план смен одной транзакцией"""
+        serializer = PlanAcceptSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = save_plan(**serializer.validated_data)
+        except RotationConflict as conflict:
+            return Response(
+                {"error": str(conflict), "conflicts": conflict.conflicts}, status=409
+            )
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        return Response(result)
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """Изменения расписания после токена версии (или момента since)"""
+        return sync_response(
+            request, "schedules", self.filter_queryset(self.get_queryset()), ScheduleSerializer
+        )
+
+
+class RotationTemplateViewSet(viewsets.ModelViewSet):
+    queryset = RotationTemplate.objects.all()
+    serializer_class = RotationTemplateSerializer
     pagination_class = None
+
+    @action(detail=True, methods=["post"])
+    def apply(self, request, pk=None):
+        """Сгенерировать расписание врачей по шаблону за период"""
+        template = self.get_object()
+        serializer = RotationApplySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = apply_rotation(template, **serializer.validated_data)
+        except RotationConflict as conflict:
+            return Response(
+                {"error": str(conflict), "conflicts": conflict.conflicts}, status=409
+            )
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        return Response(result)
+
+
+class StudyViewSet(viewsets.ReadOnlyModelViewSet):
+    # Keyset-пагинация включается параметрами page_size/cursor
+    pagination_class = KeysetPagination
+    keyset_orderings = {
+        "list": ("-created_at", "-id"),
+        "pending": ("priority_rank", "created_at", "id"),
+        "cito": ("-created_at", "-id"),
+        "asap": ("-created_at", "-id"),
+    }
     queryset = Study.objects.all().select_related("study_type", "diagnostician")
     serializer_class = StudySerializer
     filterset_fields = ["status", "priority", "diagnostician_id"]
@@ -165,34 +348,213 @@ class StudyViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("layout") == "flat":
+            return self._flat_response(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+    def _flat_response(self, studies, limit=None):
+        """Плоский вид списка: строки со ссылками и раздел included"""
+        # Поля сортировки нужны курсору пагинации, в ответ они не попадают
+        ordering = self.paginator.get_ordering(self)
+        extra_fields = [
+            field.lstrip("-")
+            for field in ordering
+            if field.lstrip("-") not in STUDY_FIELDS
+        ]
+        rows = study_rows(studies, extra_fields)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            data = flat_studies(page, extra_fields)
+            response = self.get_paginated_response(data["results"])
+            response.data["included"] = data["included"]
+            return response
+
+        if limit is not None:
+            rows = rows[:limit]
+        return Response(flat_studies(list(rows), extra_fields))
+
+    def _queue_response(self, studies, limit=None):
+        """Ответ для очередей: страница по курсору или (как раньше) весь список"""
+        if self.request.query_params.get("layout") == "flat":
+            return self._flat_response(studies, limit)
+
+        page = self.paginate_queryset(studies)
+        if page is not None:
+            serializer = StudyWithDetailsSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        if limit is not None:
+            studies = studies[:limit]
+        serializer = StudyWithDetailsSerializer(studies, many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=["get"])
     def pending(self, request):
         """Ожидающие исследования (без врача)"""
         studies = (
             Study.objects.filter(diagnostician_id__isnull=True)
             .select_related("study_type", "diagnostician")
+            .with_priority_rank()
             .order_by("-created_at")
         )
-        serializer = StudyWithDetailsSerializer(studies, many=True)
-        return Response(serializer.data)
+        return self._queue_response(studies)
 
     @action(detail=False, methods=["get"])
     def cito(self, request):
         """CITO исследования"""
-        studies = Study.objects.filter(priority="cito").select_related(
-            "study_type", "diagnostician"
-        )[:100]
-        serializer = StudyWithDetailsSerializer(studies, many=True)
-        return Response(serializer.data)
+        studies = (
+            Study.objects.filter(priority="cito")
+            .select_related("study_type", "diagnostician")
+            .order_by("-created_at", "-id")
+        )
+        return self._queue_response(studies, limit=100)
 
     @action(detail=False, methods=["get"])
     def asap(self, request):
         """ASAP исследования"""
-        studies = Study.objects.filter(priority="asap").select_related(
-            "study_type", "diagnostician"
-        )[:100]
-        serializer = StudyWithDetailsSerializer(studies, many=True)
-        return Response(serializer.data)
+        studies = (
+            Study.objects.filter(priority="asap")
+            .select_related("study_type", "diagnostician")
+            .order_by("-created_at", "-id")
+        )
+        return self._queue_response(studies, limit=100)
+
+    @action(detail=False, methods=["get"])
+    def queue(self, request):
+        """Первые limit ожидающих исследований в порядке очереди с учётом SLA"""
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_QUEUE_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        if not 1 <= limit <= MAX_QUEUE_LIMIT:
+            return Response(
+                {"error": f"limit must be between 1 and {MAX_QUEUE_LIMIT}"}, status=400
+            )
+
+        head = queue_head(limit)
+        studies = StudyWithDetailsSerializer([item.pop("study") for item in head], many=True)
+        return Response(
+            [{**study, **item} for study, item in zip(studies.data, head)]
+        )
+
+    @action(detail=True, methods=["get"])
+    def queue_position(self, request, pk=None):
+        """Место исследования в очереди и срок SLA"""
+        position = queue_position(self.get_object())
+        if position is None:
+            return Response({"error": "Study is not in the queue"}, status=404)
+        return Response(position)
+
+    @action(detail=False, methods=["get"])
+    def sla(self, request):
+        """Нормативы SLA и число просроченных исследований в очереди"""
+        return Response(sla_breaches())
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Потоковая выгрузка исследований (CSV/NDJSON) с фильтрами списка"""
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=400,
+            )
+
+        studies = self.filter_queryset(self.get_queryset()).order_by("-created_at", "-id")
+        return export_studies(studies, export_format, asynchronous=is_asgi(request))
+
+    @action(detail=False, methods=["post"])
+    def ingest(self, request):
+        """Пакетный приём исследований из РИС (CSV или NDJSON в теле запроса)"""
+        content_type = request.content_type.split(";")[0].strip()
+        ingest_format = request.query_params.get(
+            "ingest_format", INGEST_CONTENT_TYPES.get(content_type)
+        )
+        if ingest_format not in INGEST_FORMATS:
+            return Response(
+                {"error": f"ingest_format must be one of: {', '.join(INGEST_FORMATS)}"},
+                status=400,
+            )
+        if request.stream is None:
+            return Response({"error": "request body required"}, status=400)
+
+        # Тело читается потоком, без загрузки пакета в память целиком
+        try:
+            result = ingest_studies(read_rows(request.stream, ingest_format))
+        except UnicodeDecodeError:
+            return Response({"error": "request body must be UTF-8"}, status=400)
+        created = result.pop("created")
+        if result["inserted"] or result["updated"]:
+            invalidate_dashboard_stats()
+            publish_created(created)
+        return Response(result)
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """Изменения исследований после токена версии (или момента since)"""
+        return sync_response(
+            request, "studies", self.filter_queryset(self.get_queryset()), StudyWithDetailsSerializer
+        )
+
+    @action(detail=False, methods=["post"])
+    def auto_distribute(self, request):
+        """Автоматически распределить очередь ожидающих исследований"""
+        work_date = request.data.get("date")
+        dry_run = request.data.get("dry_run", True)
+
+        if work_date:
+            try:
+                work_date = datetime.strptime(work_date, "%Y-%m-%d").date()
+            except ValueError:
+                return Response({"error": "date must be YYYY-MM-DD"}, status=400)
+        else:
+            work_date = timezone.localdate()
+
+        if isinstance(dry_run, str):
+            dry_run = dry_run.lower() != "false"
+
+        result = auto_distribute(work_date, dry_run=bool(dry_run))
+        if result["assigned"] and not result["dry_run"]:
+            invalidate_dashboard_stats()
+            pairs = [(row["study_id"], row["doctor_id"]) for row in result["plan"]]
+            doctors = reference_data().doctors_by_ids({pair[1] for pair in pairs})
+            publish(
+                assignment_events(pairs, doctors_with_load(doctors, *month_bounds()))
+            )
+        return Response(result)
+
+    @action(detail=False, methods=["post"])
+    def rebalance(self, request):
+        """Перенести подтверждённые исследования от перегруженных врачей"""
+        serializer = RebalanceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        if "date_from" in params:
+            start, end = date_window(params["date_from"], params["date_to"])
+        else:
+            start, end = month_bounds()
+
+        result = rebalance_loads(
+            start,
+            end,
+            params.get("date") or timezone.localdate(),
+            params.get("target_percentage", DEFAULT_TARGET_PERCENTAGE),
+            params["dry_run"],
+        )
+        if result["moved"] and not result["dry_run"]:
+            invalidate_dashboard_stats()
+            doctors = reference_data().doctors_by_ids(
+                [doctor["id"] for doctor in result["doctors"]]
+            )
+            publish(
+                assignment_events(
+                    [(move["study_id"], move["to_doctor_id"]) for move in result["moves"]],
+                    doctors_with_load(doctors, *month_bounds()),
+                )
+            )
+        return Response(result)
 
     @action(detail=True, methods=["post"])
     def assign(self, request, pk=None):
@@ -202,13 +564,76 @@ class StudyViewSet(viewsets.ReadOnlyModelViewSet):
 
         if not doctor_id:
             return Response({"error": "doctor_id required"}, status=400)
+        try:
+            doctor_id = int(doctor_id)
+        except (TypeError, ValueError):
+            return Response({"error": "doctor_id must be an integer"}, status=400)
+
+        expected_doctor_id = ANY_DOCTOR
+        if "expected_doctor_id" in request.data:
+            # Условное назначение: только если врач исследования не сменился
+            # с тех пор, как клиент его прочитал (null — не назначено)
+            expected_doctor_id = request.data["expected_doctor_id"]
+            try:
+                expected_doctor_id = (
+                    int(expected_doctor_id) if expected_doctor_id is not None else None
+                )
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "expected_doctor_id must be an integer or null"}, status=400
+                )
 
+        previous_doctor_id = study.diagnostician_id
+        if not compare_and_assign(study.id, doctor_id, expected_doctor_id):
+            study.refresh_from_db(fields=["diagnostician_id", "status"])
+            error = (
+                "Study was assigned by someone else"
+                if study.status in ASSIGNABLE_STATUSES
+                else f"Study is {study.status} and cannot be assigned"
+            )
+            return Response(
+                {"error": error, "doctor_id": study.diagnostician_id, "status": study.status},
+                status=409,
+            )
+        if expected_doctor_id is not ANY_DOCTOR:
+            previous_doctor_id = expected_doctor_id
         study.diagnostician_id = doctor_id
-        study.status = "confirmed"
-        study.save()
+        invalidate_dashboard_stats()
+
+        doctors = reference_data().doctors_by_ids([doctor_id, previous_doctor_id])
+        publish(
+            assignment_events(
+                [(study.id, study.diagnostician_id)],
+                doctors_with_load(doctors, *month_bounds()),
+            )
+        )
 
         return Response({"status": "assigned", "doctor_id": doctor_id})
 
+    @action(detail=False, methods=["post"])
+    def claim_next(self, request):
+        """Назначить врачу следующее подходящее исследование очереди"""
+        serializer = ClaimNextSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        doctor_id = serializer.validated_data["doctor_id"]
+        try:
+            result = claim_next(doctor_id, serializer.validated_data.get("date"))
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        if result["result"] != "claimed":
+            return Response(result)
+
+        invalidate_dashboard_stats()
+        doctors = reference_data().doctors_by_ids([doctor_id])
+        publish(
+            assignment_events(
+                [(result["study_id"], doctor_id)],
+                doctors_with_load(doctors, *month_bounds()),
+            )
+        )
+        study = self.get_queryset().get(pk=result["study_id"])
+        return Response({**result, "study": StudyWithDetailsSerializer(study).data})
+
     @action(detail=True, methods=["put"])
     def update_status(self, request, pk=None):
         """Обновить статус исследования"""
@@ -218,113 +643,235 @@ class StudyViewSet(viewsets.ReadOnlyModelViewSet):
         if new_status:
             study.status = new_status
             study.save()
+            invalidate_dashboard_stats()
+
+            doctors = reference_data().doctors_by_ids([study.diagnostician_id])
+            publish(
+                status_events(
+                    [(study.id, study.status)],
+                    doctors_with_load(doctors, *month_bounds()),
+                )
+            )
 
         return Response({"status": study.status})
 
+    @action(detail=False, methods=["post"])
+    def bulk_assign(self, request):
+        """Назначить врачам пакет исследований за один запрос"""
+        items = request.data.get("assignments")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "assignments list required"}, status=400)
+        if len(items) > BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"at most {BULK_MAX_ITEMS} items per request"}, status=400
+            )
+
+        serializer = BulkAssignItemSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        result = bulk_assign(
+            [(item["study_id"], item["doctor_id"]) for item in serializer.validated_data]
+        )
+        if result["updated"]:
+            invalidate_dashboard_stats()
+            publish(
+                assignment_events(
+                    [
+                        (item["study_id"], item["doctor_id"])
+                        for item in result["results"]
+                        if item["result"] == "assigned"
+                    ],
+                    result["doctors"],
+                )
+            )
+        return Response(result)
+
+    @action(detail=False, methods=["post"])
+    def bulk_update_status(self, request):
+        """Обновить статусы пакета исследований за один запрос"""
+        items = request.data.get("updates")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "updates list required"}, status=400)
+        if len(items) > BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"at most {BULK_MAX_ITEMS} items per request"}, status=400
+            )
+
+        serializer = BulkStatusItemSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        result = bulk_update_status(
+            [(item["study_id"], item["status"]) for item in serializer.validated_data]
+        )
+        if result["updated"]:
+            invalidate_dashboard_stats()
+            publish(
+                status_events(
+                    [
+                        (item["study_id"], item["status"])
+                        for item in result["results"]
+                        if item["result"] == "updated"
+                    ],
+                    result["doctors"],
+                )
+            )
+        return Response(result)
+
     def get_serializer_class(self):
         if self.action in ["list", "retrieve", "pending", "cito", "asap"]:
             return StudyWithDetailsSerializer
         return StudySerializer
 
 
-@api_view(["GET"])
-def dashboard_stats(request):
-    """Статистика для дашборда ЗА ТЕКУЩИЙ МЕСЯЦ"""
-    from django.utils import timezone
-    from datetime import datetime
+def json_response(data, status=200):
+    """JSON-ответ асинхронного представления в том же формате, что у DRF"""
+    return JsonResponse(
+        data,
+        status=status,
+        encoder=JSONEncoder,
+        safe=False,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
 
-    now = timezone.now()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    # Фильтр по месяцу (если не передана конкретная дата)
-    date = request.query_params.get("date")
+@require_GET
+async def dashboard_stats(request):
+    """Статистика для дашборда ЗА ТЕКУЩИЙ МЕСЯЦ (или за дату ?date=YYYY-MM-DD)"""
+    date_obj = None
+    date = request.GET.get("date")
     if date:
         try:
             date_obj = datetime.strptime(date, "%Y-%m-%d").date()
-            studies_qs = Study.objects.filter(created_at__date=date_obj)
         except ValueError:
-            studies_qs = Study.objects.filter(created_at__gte=month_start)
-    else:
-        studies_qs = Study.objects.filter(created_at__gte=month_start)
+            date_obj = None
 
-    total_studies = studies_qs.count()
+    serializer = DashboardStatsSerializer(await dashboard_snapshot(date_obj))
+    return json_response(serializer.data)
 
-    # Signed не считаем в pending
-    completed_studies = studies_qs.filter(status="signed").count()
-    pending_studies = studies_qs.filter(
-        status__in=["confirmed", "pending"], diagnostician_id__isnull=False
-    ).count()
 
-    # Врачи которые были активны в этом месяце
-    active_doctors = (
-        Doctor.objects.filter(studies__created_at__gte=month_start).distinct().count()
-    )
+@require_GET
+async def chart_data(request):
+    """Данные для графиков (по умолчанию ЗА ТЕКУЩИЙ МЕСЯЦ по дням)"""
+    date_from = request.GET.get("date_from")
+    date_to = request.GET.get("date_to")
+    granularity = request.GET.get("granularity", "day")
+    breakdown = request.GET.get("breakdown") or None
 
-    cito_studies = studies_qs.filter(priority="cito").count()
-    asap_studies = studies_qs.filter(priority="asap").count()
+    if granularity not in GRANULARITIES:
+        return json_response(
+            {"error": f"granularity must be one of: {', '.join(GRANULARITIES)}"},
+            status=400,
+        )
+    if breakdown is not None and breakdown not in BREAKDOWNS:
+        return json_response(
+            {"error": f"breakdown must be one of: {', '.join(BREAKDOWNS)}"},
+            status=400,
+        )
 
-    avg_load = 0
-    if active_doctors > 0:
-        avg_load = int(pending_studies / active_doctors * 1.5)
-    else:
-        avg_load = 0
-
-    data = {
-        "total_studies": total_studies,
-        "completed_studies": completed_studies,
-        "pending_studies": pending_studies,
-        "active_doctors": active_doctors,
-        "avg_load_per_doctor": avg_load,
-        "cito_studies": cito_studies,
-        "asap_studies": asap_studies,
-    }
+    # Если даты не переданы — берём текущий месяц
+    today = timezone.localdate()
+    try:
+        date_from = (
+            datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else today.replace(day=1)
+        )
+        date_to = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else today
+    except ValueError:
+        return json_response({"error": "date_from and date_to must be YYYY-MM-DD"}, status=400)
+    if date_from > date_to:
+        return json_response({"error": "date_from must not be after date_to"}, status=400)
 
-    serializer = DashboardStatsSerializer(data)
-    return Response(serializer.data)
+    data = await study_series(date_from, date_to, granularity, breakdown)
 
+    serializer = ChartDataSerializer(data, many=True)
+    return json_response(serializer.data)
 
-@api_view(["GET"])
-def chart_data(request):
-    """Данные для графиков ЗА ТЕКУЩИЙ МЕСЯЦ"""
-    from django.utils import timezone
-    from datetime import datetime, timedelta
 
-    date_from = request.query_params.get("date_from")
-    date_to = request.query_params.get("date_to")
+@require_GET
+async def forecast(request):
+    """Прогноз количества исследований и УП по дням и модальностям для планирования смен"""
+    date_from = request.GET.get("date_from")
+    days = request.GET.get("days", DEFAULT_GRID_DAYS)
+    modality = request.GET.get("modality") or None
 
-    # Если даты не переданы — берём текущий месяц
-    if not date_from or not date_to:
-        now = timezone.now()
-        date_from_obj = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        date_to_obj = now
-    else:
-        try:
-            date_from_obj = datetime.strptime(date_from, "%Y-%m-%d").date()
-            date_to_obj = datetime.strptime(date_to, "%Y-%m-%d").date()
-        except ValueError:
-            now = timezone.now()
-            date_from_obj = now.replace(day=1)
-            date_to_obj = now
-
-    data = []
-    current_date = date_from_obj
-    while current_date <= date_to_obj:
-        studies = Study.objects.filter(created_at__date=current_date)
-
-        # План — все исследования за день
-        plan = studies.count()
-
-        # Факт — только подписанные
-        actual = studies.filter(status="signed").count()
-
-        data.append(
-            {
-                "name": current_date.strftime("%d.%m"),
-                "plan": plan,
-                "actual": actual,
-            }
+    try:
+        if date_from:
+            date_from = datetime.strptime(date_from, "%Y-%m-%d").date()
+        else:
+            date_from = week_start(timezone.localdate())
+        days = int(days)
+    except ValueError:
+        return json_response(
+            {"error": "date_from must be YYYY-MM-DD, days an integer"}, status=400
+        )
+    if not 1 <= days <= MAX_GRID_DAYS:
+        return json_response(
+            {"error": f"days must be between 1 and {MAX_GRID_DAYS}"}, status=400
         )
-        current_date += timedelta(days=1)
 
-    serializer = ChartDataSerializer(data, many=True)
-    return Response(serializer.data)
+    try:
+        data = await demand_forecast(
+            date_from, date_from + timedelta(days=days - 1), modality
+        )
+    except ValueError as error:
+        return json_response({"error": str(error)}, status=400)
+    return json_response(data)
+
+
+@require_GET
+async def reports(request):
+    """Отчёт по модальностям, типам исследований и врачам за период (по умолчанию ЗА ТЕКУЩИЙ МЕСЯЦ)"""
+    date_from = request.GET.get("date_from")
+    date_to = request.GET.get("date_to")
+
+    today = timezone.localdate()
+    try:
+        date_from = (
+            datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else today.replace(day=1)
+        )
+        date_to = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else today
+    except ValueError:
+        return json_response({"error": "date_from and date_to must be YYYY-MM-DD"}, status=400)
+    if date_from > date_to:
+        return json_response({"error": "date_from must not be after date_to"}, status=400)
+    if (date_to - date_from).days + 1 > MAX_REPORT_DAYS:
+        return json_response(
+            {"error": f"Period must not exceed {MAX_REPORT_DAYS} days"}, status=400
+        )
+
+    return json_response(await report_snapshot(date_from, date_to))
+
+
+# Интервал отправки комментария-пинга, чтобы прокси не закрывали соединение
+EVENTS_HEARTBEAT_SECONDS = 15
+
+
+async def events_stream(request):
+    """Push-канал событий очереди и нагрузки (Server-Sent Events, только ASGI)"""
+
+    async def stream():
+        queue = subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def metrics(request):
+    """Метрики запросов API в текстовом формате Prometheus"""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # Должен быть первым!
+    "api.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -65,15 +66,28 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD"),
         "HOST": config("DB_HOST", default="localhost"),
         "PORT": config("DB_PORT", default="5432"),
+        # Постоянные соединения, секунд (0 — новое соединение на каждый
+        # запрос). Под ASGI оставьте 0: потоки запросов там недолговечны,
+        # а асинхронные представления работают через пул api/parallel.py
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=0, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Пул потоков и соединений для параллельных запросов асинхронных
+# представлений (дашборд, графики): размер и время жизни соединения, секунд
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=4, cast=int)
+DB_POOL_CONN_MAX_AGE = config("DB_POOL_CONN_MAX_AGE", default=300, cast=int)
+
 LANGUAGE_CODE = "ru-ru"
 TIME_ZONE = "Europe/Moscow"
 USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = "static/"
+
+# Тестовая база: раннер создаёт таблицы неуправляемых моделей (api/test_runner.py)
+TEST_RUNNER = "api.test_runner.TestRunner"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # REST Framework
@@ -84,5 +98,50 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Кэш (снимки дашборда и т.п.). Для нескольких воркеров нужен общий кэш,
+# например Redis: CACHE_URL=redis://localhost:6379/1
+CACHE_URL = config("CACHE_URL", default="")
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+        if CACHE_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
+# Время жизни снимка статистики дашборда, секунд. Изменения через API
+# сбрасывают снимок сразу, TTL нужен для изменений извне (поток из РИС).
+DASHBOARD_STATS_TTL = config("DASHBOARD_STATS_TTL", default=60, cast=int)
+
+# Время жизни отчёта /api/reports/ за прошедший период, секунд. Отчёт за
+# период, включающий сегодня, живёт DASHBOARD_STATS_TTL и сбрасывается
+# вместе со статистикой дашборда.
+REPORTS_TTL = config("REPORTS_TTL", default=3600, cast=int)
+
+# Время жизни снимка справочников (врачи, типы исследований) в памяти
+# процесса, секунд. Изменения через API и админку сбрасывают его сразу.
+REFERENCE_DATA_TTL = config("REFERENCE_DATA_TTL", default=300, cast=int)
+
+# Нормативы ожидания назначения врача (SLA) по приоритетам, минут.
+# По ним упорядочена очередь /api/studies/queue/ и считаются просрочки
+STUDY_SLA_MINUTES = {
+    "cito": config("SLA_CITO_MINUTES", default=60, cast=int),
+    "asap": config("SLA_ASAP_MINUTES", default=240, cast=int),
+    "normal": config("SLA_NORMAL_MINUTES", default=1440, cast=int),
+}
+
+# Доставка push-событий: "postgres" (LISTEN/NOTIFY, между процессами)
+# или "local" (только внутри одного процесса)
+EVENTS_BACKEND = config("EVENTS_BACKEND", default="postgres")
+
+# Метрики запросов: ответы дольше SLOW_REQUEST_MS миллисекунд пишутся
+# в лог api.metrics (0 — не писать). /api/metrics/ отдаётся только
+# адресам из METRICS_ALLOWED_IPS.
+SLOW_REQUEST_MS = config("SLOW_REQUEST_MS", default=1000, cast=int)
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="127.0.0.1,::1").split(",")
+
 # CORS
 CORS_ALLOWED_ORIGINS = config("CORS_ALLOWED_ORIGINS", default="").split(",")
@@ -1,12 +1,10 @@
-import React, { useState, useEffect, useMemo } from 'react';
-import { studiesApi, doctorsApi } from '../../services/api';
+import React, { useState, useEffect, useRef } from 'react';
+import { studiesApi, doctorsApi, eventsApi } from '../../services/api';
 import { UserCheck, ChevronLeft, ChevronRight, ChevronDown, ChevronUp, Loader2 } from 'lucide-react';
-import { Study, DoctorWithLoad } from '../../types';
+import { Study, QueuedStudy, SlaSummary, DoctorWithLoad } from '../../types';
 
 // ─── Вспомогательные утилиты ────────────────────────────────────────────────
 
-const PRIORITY_ORDER: Record<string, number> = { cito: 1, asap: 2, normal: 3 };
-
 const getPriorityColor = (priority: string) => {
   if (priority === 'cito') return 'bg-red-100 text-red-700';
   if (priority === 'asap') return 'bg-amber-100 text-amber-700';
@@ -31,6 +29,9 @@ const formatDate = (iso: string) =>
 const formatTime = (iso: string) =>
   new Date(iso).toLocaleTimeString('ru-RU', { hour: '2-digit', minute: '2-digit' });
 
+// Поступления приходят пачками: очередь перечитывается один раз после паузы
+const QUEUE_RELOAD_DELAY_MS = 1000;
+
 // ─── Тип для исследований врача ─────────────────────────────────────────────
 
 interface DoctorStudiesState {
@@ -186,7 +187,8 @@ const DoctorCard: React.FC<DoctorCardProps> = ({
 export const CurrentDistributionView: React.FC = () => {
   const [selectedStudy, setSelectedStudy] = useState<Study | null>(null);
   const [selectedDoctor, setSelectedDoctor] = useState<number | null>(null);
-  const [allStudies, setAllStudies] = useState<Study[]>([]);
+  const [allStudies, setAllStudies] = useState<QueuedStudy[]>([]);
+  const [sla, setSla] = useState<SlaSummary | null>(null);
   const [doctors, setDoctors] = useState<DoctorWithLoad[]>([]);
   const [loading, setLoading] = useState(true);
   const [currentPage, setCurrentPage] = useState(1);
@@ -196,15 +198,46 @@ export const CurrentDistributionView: React.FC = () => {
   const [expandedDoctor, setExpandedDoctor] = useState<number | null>(null);
   const [doctorStudies, setDoctorStudies] = useState<Record<number, DoctorStudiesState>>({});
 
+  const reloadTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
   useEffect(() => { loadData(); }, []);
 
+  // Новым исследованиям нужен срок SLA и место в очереди, которых нет в событии,
+  // поэтому очередь перечитывается — но один раз на пачку событий
+  const scheduleReload = () => {
+    if (reloadTimer.current) clearTimeout(reloadTimer.current);
+    reloadTimer.current = setTimeout(() => {
+      reloadTimer.current = null;
+      loadData();
+    }, QUEUE_RELOAD_DELAY_MS);
+  };
+
+  // Изменения от других координаторов приходят событиями, без перезагрузки списков
+  useEffect(() => {
+    const unsubscribe = eventsApi.subscribe({
+      study_assigned: ({ study_id }) =>
+        setAllStudies(prev => prev.filter(study => study.id !== study_id)),
+      doctor_load: (load: DoctorWithLoad) =>
+        setDoctors(prev => prev.map(doc => (doc.id === load.id ? { ...doc, ...load } : doc))),
+      study_created: scheduleReload,
+      queue_changed: scheduleReload,
+      resync: () => loadData(),
+    });
+    return () => {
+      unsubscribe();
+      if (reloadTimer.current) clearTimeout(reloadTimer.current);
+    };
+  }, []);
+
   const loadData = async () => {
     try {
-      const [studiesRes, doctorsRes] = await Promise.all([
-        studiesApi.getPending(),
+      const [studiesRes, slaRes, doctorsRes] = await Promise.all([
+        studiesApi.getQueue(),
+        studiesApi.getSla(),
         doctorsApi.getWithLoad(),
       ]);
       setAllStudies(studiesRes.data || []);
+      setSla(slaRes.data);
       setDoctors(doctorsRes.data);
     } catch (error) {
       console.error('Error loading data:', error);
@@ -250,18 +283,10 @@ export const CurrentDistributionView: React.FC = () => {
     setSelectedDoctor(prev => prev === doctorId ? null : doctorId);
   };
 
-  // Сортировка очереди: CITO → ASAP → План, внутри — по дате создания (старые первыми)
-  const sortedStudies = useMemo(() => {
-    return [...allStudies].sort((a, b) => {
-      const diff = (PRIORITY_ORDER[a.priority] || 3) - (PRIORITY_ORDER[b.priority] || 3);
-      if (diff !== 0) return diff;
-      return new Date(a.created_at).getTime() - new Date(b.created_at).getTime();
-    });
-  }, [allStudies]);
-
-  const totalPages = Math.ceil(sortedStudies.length / itemsPerPage);
+  // Порядок очереди (приоритет и просрочка SLA) приходит с сервера
+  const totalPages = Math.ceil(allStudies.length / itemsPerPage);
   const startIndex = (currentPage - 1) * itemsPerPage;
-  const paginatedStudies = sortedStudies.slice(startIndex, startIndex + itemsPerPage);
+  const paginatedStudies = allStudies.slice(startIndex, startIndex + itemsPerPage);
 
   const handlePageChange = (page: number) => {
     setCurrentPage(page);
@@ -275,17 +300,25 @@ export const CurrentDistributionView: React.FC = () => {
     if (!targetId) { alert('Выберите врача'); return; }
 
     try {
-      await studiesApi.assign(selectedStudy.id, targetId);
+      // Исследование из очереди назначается, только если его ещё никто не взял
+      await studiesApi.assign(selectedStudy.id, targetId, null);
       // Инвалидируем кэш назначенных снимков для этого врача
       setDoctorStudies(prev => {
         const next = { ...prev };
         delete next[targetId];
         return next;
       });
-      await loadData();
+      // Нагрузка врача обновится событием doctor_load из push-канала
+      setAllStudies(prev => prev.filter(study => study.id !== selectedStudy.id));
       setSelectedStudy(null);
       setSelectedDoctor(null);
-    } catch {
+    } catch (err: any) {
+      if (err?.response?.status === 409) {
+        alert('Исследование уже назначено другим пользователем');
+        setAllStudies(prev => prev.filter(study => study.id !== selectedStudy.id));
+        setSelectedStudy(null);
+        return;
+      }
       alert('Ошибка при назначении');
     }
   };
@@ -306,8 +339,17 @@ export const CurrentDistributionView: React.FC = () => {
       <div className="w-1/2 bg-white rounded-xl border border-slate-200 shadow-sm flex flex-col">
         <div className="p-4 border-b border-slate-200">
           <h3 className="font-semibold text-slate-800">
-            Очередь исследований ({sortedStudies.length})
+            Очередь исследований ({sla?.pending ?? allStudies.length})
           </h3>
+          {sla && sla.breached > 0 && (
+            <p className="text-xs text-red-600 mt-1">
+              Просрочено по SLA: {sla.breached}
+              {' ('}
+              {sla.priorities.filter(item => item.breached > 0)
+                .map(item => `${getPriorityLabel(item.priority)} — ${item.breached}`).join(', ')}
+              {')'}
+            </p>
+          )}
         </div>
 
         <div className="flex-1 overflow-y-auto p-2 space-y-2">
@@ -342,7 +384,10 @@ export const CurrentDistributionView: React.FC = () => {
                   )}
                 </div>
                 <div className="flex justify-between text-xs text-slate-400">
-                  <span>Создано: {formatDate(study.created_at)}</span>
+                  <span>
+                    Создано: {formatDate(study.created_at)}
+                    {study.overdue && <span className="ml-2 text-red-600">просрочено SLA</span>}
+                  </span>
                   <span className={`px-2 py-0.5 rounded ${getStatusColor(study.status)}`}>
                     {study.status}
                   </span>
@@ -356,7 +401,7 @@ export const CurrentDistributionView: React.FC = () => {
         {totalPages > 1 && (
           <div className="p-4 border-t border-slate-200 flex items-center justify-between">
             <div className="text-sm text-slate-600">
-              {startIndex + 1}–{Math.min(startIndex + itemsPerPage, sortedStudies.length)} из {sortedStudies.length}
+              {startIndex + 1}–{Math.min(startIndex + itemsPerPage, allStudies.length)} из {allStudies.length}
             </div>
             <div className="flex items-center space-x-2">
               <button
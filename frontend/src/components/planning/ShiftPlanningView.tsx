@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
-import { schedulesApi, doctorsApi, studiesApi } from '../../services/api';
+import { schedulesApi, doctorsApi, forecastApi } from '../../services/api';
 import { ChevronLeft, ChevronRight, X, CheckCircle2, AlertTriangle, AlertCircle, Copy, Printer, RefreshCw, Search, Download } from 'lucide-react';
-import { Schedule, Doctor, Study } from '../../types';
+import { Schedule, Doctor, WeekGrid, DemandForecast, DemandForecastBand, ShiftPlan } from '../../types';
 
 interface ScheduleFormData {
   doctor_id: number;
@@ -15,7 +15,10 @@ interface ScheduleFormData {
 export const ShiftPlanningView: React.FC = () => {
   const [schedules, setSchedules] = useState<Schedule[]>([]);
   const [doctors, setDoctors] = useState<Doctor[]>([]);
-  const [studies, setStudies] = useState<Study[]>([]);
+  // Количество исследований по ячейкам `${doctorId}:${date}` из серверной сетки
+  const [studyCounts, setStudyCounts] = useState<Record<string, number>>({});
+  // Прогноз потока УП по дням (сумма по модальностям) для сравнения с планом смен
+  const [forecast, setForecast] = useState<Record<string, DemandForecastBand>>({});
   const [loading, setLoading] = useState(true);
   
   const [currentDate, setCurrentDate] = useState<Date>(new Date());
@@ -61,27 +64,33 @@ export const ShiftPlanningView: React.FC = () => {
     loadDoctors();
   }, []);
 
+  // Сетка недели собирается на сервере: смены и количество исследований по ячейкам
+  const loadSchedulesData = useCallback(async () => {
+    const res = await schedulesApi.weekGrid({
+      date_from: dates[0],
+      days: dates.length,
+      ...(selectedDoctor !== 'all' && { doctor_id: Number(selectedDoctor) })
+    });
+    const grid: WeekGrid = res.data;
+
+    const gridSchedules: Schedule[] = [];
+    const counts: Record<string, number> = {};
+    grid.rows.forEach(row => {
+      row.cells.forEach(cell => {
+        if (cell.schedule) gridSchedules.push(cell.schedule);
+        counts[`${row.doctor_id}:${cell.date}`] = cell.study_count;
+      });
+    });
+
+    setSchedules(gridSchedules);
+    setStudyCounts(counts);
+  }, [dates, selectedDoctor]);
+
   useEffect(() => {
     const loadData = async () => {
       try {
         setLoading(true);
-        const [schedulesRes, studiesRes] = await Promise.all([
-          schedulesApi.getAll({
-            date_from: dates[0],
-            date_to: dates[6],
-            ...(selectedDoctor !== 'all' && { doctor_id: Number(selectedDoctor) })
-          }),
-          studiesApi.getAll({
-            date_from: dates[0],
-            date_to: dates[6],
-          })
-        ]);
-        
-        const schedulesData = schedulesRes.data.results || schedulesRes.data;
-        const studiesData = studiesRes.data.results || studiesRes.data;
-        
-        setSchedules(Array.isArray(schedulesData) ? schedulesData : []);
-        setStudies(Array.isArray(studiesData) ? studiesData : []);
+        await loadSchedulesData();
       } catch (err) {
         console.error('Error loading data:', err);
       } finally {
@@ -90,28 +99,52 @@ export const ShiftPlanningView: React.FC = () => {
     };
     
     loadData();
-  }, [dates, selectedDoctor]);
+  }, [loadSchedulesData]);
 
-  const loadSchedulesData = async () => {
-    const [schedulesRes, studiesRes] = await Promise.all([
-      schedulesApi.getAll({
-        date_from: dates[0],
-        date_to: dates[6],
-        ...(selectedDoctor !== 'all' && { doctor_id: Number(selectedDoctor) })
-      }),
-      studiesApi.getAll({
-        date_from: dates[0],
-        date_to: dates[6],
+  useEffect(() => {
+    forecastApi.get({ date_from: dates[0], days: dates.length })
+      .then(res => {
+        const data: DemandForecast = res.data;
+        setForecast(Object.fromEntries(data.totals.map(day => [day.date, day])));
       })
-    ]);
-    
-    const schedulesData = schedulesRes.data.results || schedulesRes.data;
-    const studiesData = studiesRes.data.results || studiesRes.data;
-    
-    setSchedules(Array.isArray(schedulesData) ? schedulesData : []);
-    setStudies(Array.isArray(studiesData) ? studiesData : []);
+      // Прогноз доступен не для всех недель (слишком далеко или до начала истории)
+      .catch(() => setForecast({}));
+  }, [dates]);
+
+  // План смен недели под прогноз: сначала предпросмотр, запись — после подтверждения
+  const [optimizing, setOptimizing] = useState(false);
+  const handleGeneratePlan = async () => {
+    try {
+      setOptimizing(true);
+      const res = await schedulesApi.optimize({ date_from: dates[0], date_to: dates[dates.length - 1] });
+      const plan: ShiftPlan = res.data;
+      const { coverage } = plan;
+      if (plan.schedules.length === 0) {
+        alert(`Новые смены не нужны: покрытие прогноза ${coverage.coverage_percentage}%.`);
+        return;
+      }
+      const accepted = confirm(
+        `Предлагается смен: ${coverage.proposed_shifts} (уже назначено ${coverage.existing_shifts}).\n` +
+        `Покрытие прогноза: ${coverage.coverage_percentage}% ` +
+        `(${Math.round(coverage.covered_up)} из ${Math.round(coverage.demand_up)} УП).\n` +
+        `Избыток мощности: ${coverage.overstaffing_percentage}%.\n\nЗаписать план?`
+      );
+      if (!accepted) return;
+      await schedulesApi.acceptPlan(plan.schedules);
+      await loadSchedulesData();
+    } catch (error: any) {
+      console.error('Error generating plan:', error);
+      alert('Ошибка при генерации плана: ' + (error.response?.data?.error || error.message));
+    } finally {
+      setOptimizing(false);
+    }
   };
 
+  const plannedUpForDate = (date: string) =>
+    schedules
+      .filter(schedule => schedule.work_date?.split('T')[0] === date && !schedule.is_day_off)
+      .reduce((sum, schedule) => sum + (schedule.planned_up || 0), 0);
+
   const handlePrevWeek = () => {
     setCurrentDate(prev => {
       const newDate = new Date(prev);
@@ -241,18 +274,8 @@ export const ShiftPlanningView: React.FC = () => {
     const scheduleDoctorId = getDoctorIdFromSchedule(schedule, doctorId);
     const scheduleDate = schedule.work_date?.split('T')[0] || date;
     
-    return studies.filter(study => {
-      // Получаем ID врача из исследования
-      const studyDoctorId = study.diagnostician_id || 
-        (typeof study.diagnostician === 'object' && study.diagnostician?.id ? study.diagnostician.id : null);
-      
-      // Получаем дату создания исследования (только дата, без времени)
-      const studyDate = study.created_at ? study.created_at.split('T')[0] : null;
-      
-      // Сравниваем врача и дату
-      return studyDoctorId === scheduleDoctorId && studyDate === scheduleDate;
-    }).length;
-  }, [studies]);
+    return studyCounts[`${scheduleDoctorId}:${scheduleDate}`] || 0;
+  }, [studyCounts]);
 
   const getStatusColor = (schedule: Schedule | undefined, doctor: Doctor): string => {
     if (!schedule) return 'bg-slate-100 text-slate-400';
@@ -389,8 +412,12 @@ export const ShiftPlanningView: React.FC = () => {
             <Copy size={16} className="mr-2" />
             Копировать неделю
           </button>
-          <button className="px-4 py-2 bg-blue-600 text-white rounded-md text-sm hover:bg-blue-700 font-medium">
-            Сгенерировать план
+          <button
+            className="px-4 py-2 bg-blue-600 text-white rounded-md text-sm hover:bg-blue-700 font-medium disabled:opacity-50"
+            onClick={handleGeneratePlan}
+            disabled={optimizing}
+          >
+            {optimizing ? 'Расчёт плана...' : 'Сгенерировать план'}
           </button>
         </div>
       </div>
@@ -480,6 +507,39 @@ export const ShiftPlanningView: React.FC = () => {
                 </tr>
               ))}
             </tbody>
+            {selectedDoctor === 'all' && Object.keys(forecast).length > 0 && (
+              <tfoot className="bg-slate-50 border-t border-slate-200">
+                <tr>
+                  <td className="px-6 py-4 font-medium text-slate-700">
+                    <div>Прогноз потока</div>
+                    <div className="text-xs text-slate-500">УП: план смен / прогноз</div>
+                  </td>
+                  {dates.map(date => {
+                    const day = forecast[date];
+                    if (!day) {
+                      return <td key={date} className="px-6 py-4 text-center text-slate-400 text-xs">—</td>;
+                    }
+                    const plannedUp = plannedUpForDate(date);
+                    const color = plannedUp < day.up_low
+                      ? 'text-red-700'
+                      : plannedUp < day.up ? 'text-amber-700' : 'text-green-700';
+                    return (
+                      <td key={date} className="px-6 py-4 text-center text-xs">
+                        <div className={`font-semibold ${color}`}>
+                          {Math.round(plannedUp)} / {Math.round(day.up)}
+                        </div>
+                        <div className="text-slate-500">
+                          {Math.round(day.up_low)}–{Math.round(day.up_high)} УП
+                        </div>
+                        <div className="text-slate-500">
+                          ~{Math.round(day.studies)} иссл.
+                        </div>
+                      </td>
+                    );
+                  })}
+                </tr>
+              </tfoot>
+            )}
           </table>
         </div>
       </div>
@@ -489,8 +549,9 @@ export const ShiftPlanningView: React.FC = () => {
         <div className="text-sm font-semibold text-red-900 mb-2">Как работает планирование</div>
         <ul className="text-xs text-red-800 space-y-1">
           <li>• Кликните на ячейку со сменой, чтобы отредактировать время и план по УП.</li>
-          <li>• Кнопка «Сгенерировать план» автоматически распределит смены с учётом максимальной нагрузки врачей и выходных дней.</li>
+          <li>• Кнопка «Сгенерировать план» подберёт смены недели под прогноз потока УП по модальностям с учётом максимальной нагрузки врачей, нормы смен и выходных дней; план записывается только после подтверждения.</li>
           <li>• Красным выделяются перегрузки (&gt;95% от максимума УП), жёлтым — близкие к лимиту (80-95%).</li>
+          <li>• Строка «Прогноз потока» сравнивает сумму плана УП смен дня с прогнозом поступления УП по истории (под ним — диапазон с вероятностью 80%): красным — план ниже нижней границы, жёлтым — ниже прогноза.</li>
         </ul>
       </div>
 
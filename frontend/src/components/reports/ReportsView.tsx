@@ -1,16 +1,39 @@
 import React, { useState, useEffect, useMemo } from 'react';
-import { dashboardApi, studiesApi, doctorsApi, studyTypesApi } from '../../services/api';
-import { Download, Calendar, Filter, TrendingUp, CheckCircle2, Target, Clock, BarChart3, Users, PieChart } from 'lucide-react';
+import { dashboardApi, reportsApi, exportApi } from '../../services/api';
+import { Report } from '../../types';
+import { Download, Filter, TrendingUp, CheckCircle2, Target, Scale, BarChart3, Users, PieChart } from 'lucide-react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart as RechartsPieChart, Pie, Cell } from 'recharts';
 
-interface DepartmentSummary {
-  department: string;
-  planUp: number;
-  actualUp: number;
-  fulfillment: number;
-  studies: number;
-  avgTime: string;
-}
+const MODALITY_LABELS: Record<string, string> = {
+  XRAY: 'Рентген',
+  CT: 'КТ',
+  MRI: 'МРТ',
+  US: 'УЗИ',
+  MG: 'Маммография',
+};
+
+const modalityLabel = (modality: string | null) =>
+  modality ? MODALITY_LABELS[modality] || modality : 'Без типа';
+
+// Сколько типов исследований показывать на диаграмме отделения, остальные — «Прочие»
+const PIE_TOP_TYPES = 7;
+
+// Предыдущий период той же длины, заканчивающийся накануне dateFrom
+const previousPeriod = (dateFrom: string, dateTo: string): [string, string] => {
+  const day = 24 * 60 * 60 * 1000;
+  const start = new Date(dateFrom).getTime();
+  const days = Math.round((new Date(dateTo).getTime() - start) / day) + 1;
+  return [
+    new Date(start - days * day).toISOString().split('T')[0],
+    new Date(start - day).toISOString().split('T')[0],
+  ];
+};
+
+const percentChange = (current: number, previous: number) =>
+  previous ? Math.round(((current - previous) / previous) * 1000) / 10 : 0;
+
+const fulfillmentColor = (fulfillment: number | null) =>
+  (fulfillment ?? 0) >= 95 ? 'bg-green-500' : (fulfillment ?? 0) >= 80 ? 'bg-amber-500' : 'bg-red-500';
 
 export const ReportsView: React.FC = () => {
   const [activeTab, setActiveTab] = useState<'doctors' | 'studies' | 'efficiency'>('doctors');
@@ -27,22 +50,77 @@ export const ReportsView: React.FC = () => {
   const [selectedDoctor, setSelectedDoctor] = useState<string>('all');
   const [loading, setLoading] = useState(true);
   const [chartData, setChartData] = useState<any[]>([]);
-  const [pieData, setPieData] = useState<any[]>([]);
-  const [departmentSummary, setDepartmentSummary] = useState<DepartmentSummary[]>([]);
+  const [report, setReport] = useState<Report | null>(null);
+  const [previousReport, setPreviousReport] = useState<Report | null>(null);
+
+  // Показатели выбранного среза: врач, отделение (модальность) или все
+  const scopeOf = (data: Report | null) => {
+    if (!data) return null;
+    if (selectedDoctor !== 'all') {
+      return data.doctors.find((doctor) => String(doctor.id) === selectedDoctor) || null;
+    }
+    if (selectedDepartment !== 'all') {
+      return data.modalities.find((item) => item.modality === selectedDepartment) || null;
+    }
+    return data.totals;
+  };
+
+  const kpiData = useMemo(() => {
+    const current = scopeOf(report);
+    const previous = scopeOf(previousReport);
+    return {
+      totalUp: current?.up ?? 0,
+      totalUpChange: percentChange(current?.up ?? 0, previous?.up ?? 0),
+      completedStudies: current?.signed ?? 0,
+      completedStudiesChange: percentChange(current?.signed ?? 0, previous?.signed ?? 0),
+      planFulfillment: current?.fulfillment ?? null,
+      planFulfillmentChange:
+        Math.round(((current?.fulfillment ?? 0) - (previous?.fulfillment ?? 0)) * 10) / 10,
+      upPerStudy: current?.up_per_study ?? 0,
+      upPerStudyChange:
+        Math.round(((current?.up_per_study ?? 0) - (previous?.up_per_study ?? 0)) * 100) / 100,
+    };
+  }, [report, previousReport, selectedDepartment, selectedDoctor]);
+
+  const departmentSummary = useMemo(
+    () => (report?.modalities || []).filter(
+      (item) => selectedDepartment === 'all' || item.modality === selectedDepartment
+    ),
+    [report, selectedDepartment]
+  );
+
+  const doctorOptions = useMemo(
+    () => (report?.doctors || []).filter(
+      (doctor) => selectedDepartment === 'all' || doctor.modality.includes(selectedDepartment)
+    ),
+    [report, selectedDepartment]
+  );
+
+  const doctorSummary = useMemo(
+    () => doctorOptions.filter((doctor) => selectedDoctor === 'all' || String(doctor.id) === selectedDoctor),
+    [doctorOptions, selectedDoctor]
+  );
 
-  // KPI данные (пока моковые, потом заменим на реальные)
-  const kpiData = useMemo(() => ({
-    totalUp: 3847,
-    totalUpChange: 12.5,
-    completedStudies: 1284,
-    completedStudiesChange: 8.3,
-    planFulfillment: 94.2,
-    planFulfillmentChange: -2.1,
-    avgWaitTime: 18,
-    avgWaitTimeChange: -5,
-  }), []);
+  // По всем отделениям — доли модальностей, по одному — доли его типов исследований
+  const pieData = useMemo(() => {
+    if (!report) return [];
+    if (selectedDepartment === 'all') {
+      return report.modalities
+        .filter((item) => item.studies > 0)
+        .map((item) => ({ name: modalityLabel(item.modality), value: item.studies }));
+    }
+    const types = report.study_types
+      .filter((item) => item.modality === selectedDepartment && item.studies > 0)
+      .sort((a, b) => b.studies - a.studies);
+    const data = types.slice(0, PIE_TOP_TYPES).map((item) => ({ name: item.name || 'Без типа', value: item.studies }));
+    const rest = types.slice(PIE_TOP_TYPES).reduce((sum, item) => sum + item.studies, 0);
+    return rest ? [...data, { name: 'Прочие', value: rest }] : data;
+  }, [report, selectedDepartment]);
 
-  const COLORS = ['#f97316', '#a855f7', '#3b82f6', '#22c55e'];
+  const COLORS = ['#f97316', '#a855f7', '#3b82f6', '#22c55e', '#eab308', '#ec4899', '#14b8a6', '#94a3b8'];
+
+  const changeClass = (change: number) => (change >= 0 ? 'text-green-600' : 'text-red-600');
+  const signed = (change: number) => (change > 0 ? `+${change}` : `${change}`);
 
   useEffect(() => {
     loadReportsData();
@@ -51,25 +129,16 @@ export const ReportsView: React.FC = () => {
   const loadReportsData = async () => {
     try {
       setLoading(true);
-      const [chartRes] = await Promise.all([
+      const [chartRes, reportRes, previousRes] = await Promise.all([
         dashboardApi.getChartData(dateFrom, dateTo),
+        reportsApi.get(dateFrom, dateTo),
+        // Прошлый период закрыт, поэтому сервер отдаёт его отчёт из кэша
+        reportsApi.get(...previousPeriod(dateFrom, dateTo)),
       ]);
       
       setChartData(chartRes.data || []);
-      
-      // Моковые данные для pie chart и таблицы
-      setPieData([
-        { name: 'Рентген', value: 45 },
-        { name: 'КТ', value: 30 },
-        { name: 'МРТ', value: 15 },
-        { name: 'Флюорография', value: 10 },
-      ]);
-      
-      setDepartmentSummary([
-        { department: 'Рентген', planUp: 2100, actualUp: 2015, fulfillment: 96, studies: 724, avgTime: '12 мин' },
-        { department: 'КТ', planUp: 1200, actualUp: 1098, fulfillment: 91, studies: 312, avgTime: '25 мин' },
-        { department: 'МРТ', planUp: 800, actualUp: 734, fulfillment: 92, studies: 248, avgTime: '35 мин' },
-      ]);
+      setReport(reportRes.data);
+      setPreviousReport(previousRes.data);
     } catch (error) {
       console.error('Error loading reports:', error);
     } finally {
@@ -94,7 +163,10 @@ export const ReportsView: React.FC = () => {
       {/* Заголовок */}
       <div className="flex justify-between items-center">
         <h2 className="text-2xl font-bold text-slate-900">Отчёты и аналитика</h2>
-        <button className="px-4 py-2 bg-white border border-slate-300 text-slate-700 rounded-md text-sm font-medium hover:bg-slate-50 flex items-center">
+        <button
+          onClick={() => window.open(exportApi.studiesUrl({ date_from: dateFrom, date_to: `${dateTo}T23:59:59` }), '_blank')}
+          className="px-4 py-2 bg-white border border-slate-300 text-slate-700 rounded-md text-sm font-medium hover:bg-slate-50 flex items-center"
+        >
           <Download size={16} className="mr-2" /> Экспорт
         </button>
       </div>
@@ -145,13 +217,18 @@ export const ReportsView: React.FC = () => {
             <span className="text-sm text-slate-700 font-medium">Отделение:</span>
             <select
               value={selectedDepartment}
-              onChange={(e) => setSelectedDepartment(e.target.value)}
+              onChange={(e) => {
+                setSelectedDepartment(e.target.value);
+                setSelectedDoctor('all');
+              }}
               className="px-3 py-1.5 border border-slate-300 rounded-md text-sm"
             >
               <option value="all">Все отделения</option>
-              <option value="xray">Рентген</option>
-              <option value="ct">КТ</option>
-              <option value="mri">МРТ</option>
+              {(report?.modalities || [])
+                .filter((item) => item.modality)
+                .map((item) => (
+                  <option key={item.modality} value={item.modality!}>{modalityLabel(item.modality)}</option>
+                ))}
             </select>
           </div>
           <div className="flex items-center space-x-2">
@@ -162,6 +239,9 @@ export const ReportsView: React.FC = () => {
               className="px-3 py-1.5 border border-slate-300 rounded-md text-sm"
             >
               <option value="all">Все врачи</option>
+              {doctorOptions.map((doctor) => (
+                <option key={doctor.id} value={String(doctor.id)}>{doctor.fio_alias}</option>
+              ))}
             </select>
           </div>
           <button
@@ -181,8 +261,8 @@ export const ReportsView: React.FC = () => {
             <div className="text-sm text-slate-600">Всего УП</div>
             <TrendingUp size={16} className="text-blue-600" />
           </div>
-          <div className="text-2xl font-bold text-slate-900 mb-1">{kpiData.totalUp.toLocaleString()}</div>
-          <div className="text-xs text-green-600">+{kpiData.totalUpChange}% к прошлому месяцу</div>
+          <div className="text-2xl font-bold text-slate-900 mb-1">{Math.round(kpiData.totalUp).toLocaleString()}</div>
+          <div className={`text-xs ${changeClass(kpiData.totalUpChange)}`}>{signed(kpiData.totalUpChange)}% к прошлому периоду</div>
         </div>
         <div className="bg-white rounded-lg border border-slate-200 p-4">
           <div className="flex items-center justify-between mb-2">
@@ -190,23 +270,25 @@ export const ReportsView: React.FC = () => {
             <CheckCircle2 size={16} className="text-green-600" />
           </div>
           <div className="text-2xl font-bold text-slate-900 mb-1">{kpiData.completedStudies.toLocaleString()}</div>
-          <div className="text-xs text-green-600">+{kpiData.completedStudiesChange}% к прошлому месяцу</div>
+          <div className={`text-xs ${changeClass(kpiData.completedStudiesChange)}`}>{signed(kpiData.completedStudiesChange)}% к прошлому периоду</div>
         </div>
         <div className="bg-white rounded-lg border border-slate-200 p-4">
           <div className="flex items-center justify-between mb-2">
             <div className="text-sm text-slate-600">% выполнения плана</div>
             <Target size={16} className="text-blue-600" />
           </div>
-          <div className="text-2xl font-bold text-slate-900 mb-1">{kpiData.planFulfillment}%</div>
-          <div className="text-xs text-red-600">{kpiData.planFulfillmentChange}% к прошлому месяцу</div>
+          <div className="text-2xl font-bold text-slate-900 mb-1">
+            {kpiData.planFulfillment === null ? '—' : `${kpiData.planFulfillment}%`}
+          </div>
+          <div className={`text-xs ${changeClass(kpiData.planFulfillmentChange)}`}>{signed(kpiData.planFulfillmentChange)} п.п. к прошлому периоду</div>
         </div>
         <div className="bg-white rounded-lg border border-slate-200 p-4">
           <div className="flex items-center justify-between mb-2">
-            <div className="text-sm text-slate-600">Среднее время ожидания</div>
-            <Clock size={16} className="text-slate-600" />
+            <div className="text-sm text-slate-600">УП на исследование</div>
+            <Scale size={16} className="text-slate-600" />
           </div>
-          <div className="text-2xl font-bold text-slate-900 mb-1">{kpiData.avgWaitTime} мин</div>
-          <div className="text-xs text-green-600">{kpiData.avgWaitTimeChange} мин к прошлому месяцу</div>
+          <div className="text-2xl font-bold text-slate-900 mb-1">{kpiData.upPerStudy}</div>
+          <div className={`text-xs ${changeClass(kpiData.upPerStudyChange)}`}>{signed(kpiData.upPerStudyChange)} к прошлому периоду</div>
         </div>
       </div>
 
@@ -262,7 +344,9 @@ export const ReportsView: React.FC = () => {
 
         <div className="bg-white p-6 rounded-xl border border-slate-200 shadow-sm">
           <div className="flex items-center justify-between mb-4">
-            <h3 className="font-semibold text-slate-800">Распределение по типам исследований</h3>
+            <h3 className="font-semibold text-slate-800">
+              {selectedDepartment === 'all' ? 'Распределение по модальностям' : 'Распределение по типам исследований'}
+            </h3>
             <button className="p-1 hover:bg-slate-100 rounded">
               <Download size={16} className="text-slate-600" />
             </button>
@@ -300,7 +384,10 @@ export const ReportsView: React.FC = () => {
       <div className="bg-white rounded-xl border border-slate-200 shadow-sm overflow-hidden">
         <div className="flex items-center justify-between p-4 border-b border-slate-200">
           <h3 className="font-semibold text-slate-800">Сводка по отделению</h3>
-          <button className="px-3 py-1.5 bg-white border border-slate-300 text-slate-700 rounded-md text-sm hover:bg-slate-50 flex items-center">
+          <button
+            onClick={() => window.open(exportApi.doctorLoadsUrl({ date_from: dateFrom, date_to: dateTo }), '_blank')}
+            className="px-3 py-1.5 bg-white border border-slate-300 text-slate-700 rounded-md text-sm hover:bg-slate-50 flex items-center"
+          >
             <Download size={14} className="mr-2" /> Экспорт
           </button>
         </div>
@@ -313,28 +400,83 @@ export const ReportsView: React.FC = () => {
                 <th className="px-6 py-3 text-right font-semibold text-slate-700">ФАКТ УП</th>
                 <th className="px-6 py-3 text-center font-semibold text-slate-700">ВЫПОЛНЕНИЕ</th>
                 <th className="px-6 py-3 text-right font-semibold text-slate-700">ИССЛЕДОВАНИЙ</th>
-                <th className="px-6 py-3 text-right font-semibold text-slate-700">СРЕДНЕЕ ВРЕМЯ</th>
+                <th className="px-6 py-3 text-right font-semibold text-slate-700">УП НА ИССЛЕДОВАНИЕ</th>
               </tr>
             </thead>
             <tbody className="divide-y divide-slate-100">
-              {departmentSummary.map((dept, index) => (
-                <tr key={index} className="hover:bg-slate-50">
-                  <td className="px-6 py-4 font-medium text-slate-900">{dept.department}</td>
-                  <td className="px-6 py-4 text-right text-slate-600">{dept.planUp.toLocaleString()}</td>
-                  <td className="px-6 py-4 text-right text-slate-600">{dept.actualUp.toLocaleString()}</td>
+              {departmentSummary.map((dept) => (
+                <tr key={dept.modality ?? 'none'} className="hover:bg-slate-50">
+                  <td className="px-6 py-4 font-medium text-slate-900">{modalityLabel(dept.modality)}</td>
+                  <td className="px-6 py-4 text-right text-slate-600">{Math.round(dept.plan_up).toLocaleString()}</td>
+                  <td className="px-6 py-4 text-right text-slate-600">{Math.round(dept.signed_up).toLocaleString()}</td>
                   <td className="px-6 py-4">
                     <div className="flex items-center space-x-2">
                       <div className="flex-1 h-2 bg-slate-200 rounded-full overflow-hidden">
                         <div 
-                          className={`h-full ${dept.fulfillment >= 95 ? 'bg-green-500' : dept.fulfillment >= 80 ? 'bg-amber-500' : 'bg-red-500'}`}
-                          style={{ width: `${dept.fulfillment}%` }}
+                          className={`h-full ${fulfillmentColor(dept.fulfillment)}`}
+                          style={{ width: `${Math.min(dept.fulfillment ?? 0, 100)}%` }}
                         ></div>
                       </div>
-                      <span className="text-sm font-medium text-slate-700 w-12 text-right">{dept.fulfillment}%</span>
+                      <span className="text-sm font-medium text-slate-700 w-12 text-right">
+                        {dept.fulfillment === null ? '—' : `${dept.fulfillment}%`}
+                      </span>
                     </div>
                   </td>
                   <td className="px-6 py-4 text-right text-slate-600">{dept.studies.toLocaleString()}</td>
-                  <td className="px-6 py-4 text-right text-slate-600">{dept.avgTime}</td>
+                  <td className="px-6 py-4 text-right text-slate-600">{dept.up_per_study}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      </div>
+
+      {/* Таблица выполнения плана по врачам */}
+      <div className="bg-white rounded-xl border border-slate-200 shadow-sm overflow-hidden">
+        <div className="flex items-center justify-between p-4 border-b border-slate-200">
+          <h3 className="font-semibold text-slate-800">Выполнение плана по врачам</h3>
+          {report && (
+            <span className="text-xs text-slate-500">
+              Смен: {report.totals.shifts.toLocaleString()} · без врача: {report.totals.unassigned.toLocaleString()} исследований
+            </span>
+          )}
+        </div>
+        <div className="overflow-x-auto max-h-96 overflow-y-auto">
+          <table className="w-full text-sm">
+            <thead className="bg-slate-50 border-b border-slate-200 sticky top-0">
+              <tr>
+                <th className="px-6 py-3 text-left font-semibold text-slate-700">ВРАЧ</th>
+                <th className="px-6 py-3 text-right font-semibold text-slate-700">СМЕН</th>
+                <th className="px-6 py-3 text-right font-semibold text-slate-700">ПЛАН УП</th>
+                <th className="px-6 py-3 text-right font-semibold text-slate-700">ФАКТ УП</th>
+                <th className="px-6 py-3 text-center font-semibold text-slate-700">ВЫПОЛНЕНИЕ</th>
+                <th className="px-6 py-3 text-right font-semibold text-slate-700">ИССЛЕДОВАНИЙ</th>
+              </tr>
+            </thead>
+            <tbody className="divide-y divide-slate-100">
+              {doctorSummary.map((doctor) => (
+                <tr key={doctor.id} className="hover:bg-slate-50">
+                  <td className="px-6 py-3 font-medium text-slate-900">
+                    {doctor.fio_alias}
+                    <span className="ml-2 text-xs text-slate-500">{doctor.modality.map(modalityLabel).join(', ')}</span>
+                  </td>
+                  <td className="px-6 py-3 text-right text-slate-600">{doctor.shifts}</td>
+                  <td className="px-6 py-3 text-right text-slate-600">{Math.round(doctor.plan_up).toLocaleString()}</td>
+                  <td className="px-6 py-3 text-right text-slate-600">{Math.round(doctor.signed_up).toLocaleString()}</td>
+                  <td className="px-6 py-3">
+                    <div className="flex items-center space-x-2">
+                      <div className="flex-1 h-2 bg-slate-200 rounded-full overflow-hidden">
+                        <div
+                          className={`h-full ${fulfillmentColor(doctor.fulfillment)}`}
+                          style={{ width: `${Math.min(doctor.fulfillment ?? 0, 100)}%` }}
+                        ></div>
+                      </div>
+                      <span className="text-sm font-medium text-slate-700 w-12 text-right">
+                        {doctor.fulfillment === null ? '—' : `${doctor.fulfillment}%`}
+                      </span>
+                    </div>
+                  </td>
+                  <td className="px-6 py-3 text-right text-slate-600">{doctor.studies.toLocaleString()}</td>
                 </tr>
               ))}
             </tbody>
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { ShiftPlan } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000/api';
 
@@ -32,8 +33,10 @@ api.interceptors.response.use(
 const retryRequest = async (requestFn: () => Promise<any>, retries = 3, delay = 1000): Promise<any> => {
   try {
     return await requestFn();
-  } catch (error) {
-    if (retries > 0) {
+  } catch (error: any) {
+    // Ответы 4xx (в том числе 409 при условном назначении) повтор не исправит
+    const status = error?.response?.status;
+    if (retries > 0 && !(status >= 400 && status < 500)) {
       await new Promise(resolve => setTimeout(resolve, delay));
       return retryRequest(requestFn, retries - 1, delay * 2);
     }
@@ -59,10 +62,37 @@ export const schedulesApi = {
   getAll: (params?: { date_from?: string; date_to?: string; doctor_id?: number }) =>
     retryRequest(() => api.get('/schedules/', { params })),
   getByDate: (date: string) => retryRequest(() => api.get('/schedules/by_date/', { params: { date } })),
+  weekGrid: (params: { date_from?: string; days?: number; doctor_id?: number; is_active?: boolean }) =>
+    retryRequest(() => api.get('/schedules/week_grid/', { params })),
+  optimize: (data: { date_from: string; date_to: string; doctor_ids?: number[]; demand_level?: 'forecast' | 'high' }) =>
+    retryRequest(() => api.post('/schedules/optimize/', data)),
+  acceptPlan: (schedules: ShiftPlan['schedules'], on_conflict: 'skip' | 'replace' | 'error' = 'skip') =>
+    retryRequest(() => api.post('/schedules/accept_plan/', { schedules, on_conflict })),
   getById: (id: number) => retryRequest(() => api.get(`/schedules/${id}/`)),
   create: (data: any) => retryRequest(() => api.post('/schedules/', data)),
   update: (id: number, data: any) => retryRequest(() => api.put(`/schedules/${id}/`, data)),
   delete: (id: number) => retryRequest(() => api.delete(`/schedules/${id}/`)),
+  sync: (params: { token?: number; since?: string; date_from?: string; date_to?: string; doctor_id?: number }) =>
+    retryRequest(() => api.get('/schedules/sync/', { params })),
+};
+
+export const rotationTemplatesApi = {
+  getAll: () => retryRequest(() => api.get('/rotation-templates/')),
+  create: (data: any) => retryRequest(() => api.post('/rotation-templates/', data)),
+  update: (id: number, data: any) => retryRequest(() => api.put(`/rotation-templates/${id}/`, data)),
+  delete: (id: number) => retryRequest(() => api.delete(`/rotation-templates/${id}/`)),
+  apply: (
+    id: number,
+    data: {
+      date_from: string;
+      date_to: string;
+      doctor_ids?: number[];
+      doctors?: { doctor_id: number; offset?: number; day_start?: string; day_end?: string; night_start?: string; night_end?: string; planned_up?: number }[];
+      stagger?: boolean;
+      on_conflict?: 'skip' | 'replace' | 'error';
+      dry_run?: boolean;
+    }
+  ) => retryRequest(() => api.post(`/rotation-templates/${id}/apply/`, data)),
 };
 
 export const studiesApi = {
@@ -73,12 +103,72 @@ export const studiesApi = {
   getPending: () => retryRequest(() => api.get('/studies/pending/')),
   getCito: () => retryRequest(() => api.get('/studies/cito/')),
   getAsap: () => retryRequest(() => api.get('/studies/asap/')),
-  assign: (id: number, doctor_id: number) => retryRequest(() => api.post(`/studies/${id}/assign/`, { doctor_id })),
+  // Очередь в порядке обслуживания (приоритет и просрочка SLA), до 500 исследований
+  getQueue: (limit = 500) => retryRequest(() => api.get('/studies/queue/', { params: { limit } })),
+  getQueuePosition: (id: number) => retryRequest(() => api.get(`/studies/${id}/queue_position/`)),
+  getSla: () => retryRequest(() => api.get('/studies/sla/')),
+  // expected_doctor_id — врач, которого видел клиент (null — не назначено):
+  // если исследование успели переназначить, сервер отвечает 409
+  assign: (id: number, doctor_id: number, expected_doctor_id?: number | null) =>
+    retryRequest(() => api.post(`/studies/${id}/assign/`, { doctor_id, expected_doctor_id })),
+  // Без повторов: повторный запрос после обрыва связи назначил бы ещё одно исследование
+  claimNext: (doctor_id: number, date?: string) =>
+    api.post('/studies/claim_next/', { doctor_id, date }),
   updateStatus: (id: number, status: string) => retryRequest(() => api.put(`/studies/${id}/update_status/`, { status })),
+  bulkAssign: (assignments: { study_id: number; doctor_id: number }[]) =>
+    retryRequest(() => api.post('/studies/bulk_assign/', { assignments })),
+  rebalance: (data: {
+    target_percentage?: number;
+    date?: string;
+    date_from?: string;
+    date_to?: string;
+    dry_run?: boolean;
+  }) => retryRequest(() => api.post('/studies/rebalance/', data)),
+  bulkUpdateStatus: (updates: { study_id: number; status: string }[]) =>
+    retryRequest(() => api.post('/studies/bulk_update_status/', { updates })),
+  sync: (params: { token?: number; since?: string; status?: string; priority?: string }) =>
+    retryRequest(() => api.get('/studies/sync/', { params })),
+};
+
+// Push-канал событий (SSE): study_assigned, study_status, doctor_load,
+// study_created, queue_changed, resync. Возвращает функцию отписки.
+export const eventsApi = {
+  subscribe: (handlers: Record<string, (data: any) => void>) => {
+    const source = new EventSource(`${API_BASE_URL}/events/`);
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, event => handler(JSON.parse((event as MessageEvent).data)));
+    });
+    return () => source.close();
+  },
 };
 
 export const dashboardApi = {
   getStats: (date?: string) => retryRequest(() => api.get('/dashboard/stats/', { params: { date } })),
   getChartData: (date_from: string, date_to: string) =>
     retryRequest(() => api.get('/dashboard/chart/', { params: { date_from, date_to } })),
-};
\ No newline at end of file
+};
+
+export const reportsApi = {
+  get: (date_from: string, date_to: string) =>
+    retryRequest(() => api.get('/reports/', { params: { date_from, date_to } })),
+};
+// Потоковые выгрузки отдаются файлом, поэтому возвращаем ссылку для скачивания
+export const forecastApi = {
+  get: (params: { date_from?: string; days?: number; modality?: string }) =>
+    retryRequest(() => api.get('/forecast/', { params })),
+};
+
+const exportUrl = (path: string, params: Record<string, string | undefined>) => {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value) query.set(key, value);
+  });
+  return `${API_BASE_URL}${path}?${query.toString()}`;
+};
+
+export const exportApi = {
+  studiesUrl: (params: { date_from?: string; date_to?: string; status?: string; priority?: string; export_format?: 'csv' | 'ndjson' }) =>
+    exportUrl('/studies/export/', params),
+  doctorLoadsUrl: (params: { date_from?: string; date_to?: string; export_format?: 'csv' | 'ndjson' }) =>
+    exportUrl('/doctors/export_loads/', params),
+};
@@ -48,6 +48,51 @@ export interface Study {
   diagnostician?: Doctor;
 }
 
+// Исследование в серверной очереди с учётом SLA (/studies/queue/)
+export interface QueuedStudy extends Study {
+  position: number;
+  priority_rank: number;
+  sla_due_at: string;
+  overdue: boolean;
+}
+
+export interface SlaSummary {
+  checked_at: string;
+  pending: number;
+  breached: number;
+  priorities: {
+    priority: string;
+    sla_minutes: number;
+    pending: number;
+    breached: number;
+    oldest_created_at: string | null;
+  }[];
+}
+
+export interface ReportCounters {
+  studies: number;
+  signed: number;
+  up: number;
+  signed_up: number;
+  up_per_study: number;
+}
+
+export interface ReportPlan {
+  plan_up: number;
+  fulfillment: number | null;
+}
+
+export interface Report {
+  date_from: string;
+  date_to: string;
+  totals: ReportCounters & ReportPlan & { shifts: number; doctors: number; unassigned: number };
+  modalities: (ReportCounters & ReportPlan & { modality: string | null; share: number })[];
+  study_types: (ReportCounters & { id: number | null; name: string | null; modality: string | null; up_value: number })[];
+  doctors: (ReportCounters & ReportPlan & { id: number; fio_alias: string; modality: string[]; shifts: number })[];
+  computed_at: string;
+  age_seconds: number;
+}
+
 export interface DashboardStats {
   total_studies: number;
   completed_studies: number;
@@ -64,6 +109,95 @@ export interface ChartData {
   actual: number;
 }
 
+export interface WeekGridCell {
+  date: string;
+  schedule: Schedule | null;
+  planned_up: number;
+  actual_up: number;
+  study_count: number;
+  load_percentage: number;
+  load_status: 'normal' | 'warning' | 'overload' | 'empty';
+}
+
+export interface WeekGrid {
+  dates: string[];
+  rows: {
+    doctor_id: number;
+    fio_alias: string;
+    max_up_per_day: number;
+    cells: WeekGridCell[];
+  }[];
+  stats: {
+    total_doctors: number;
+    total_possible_shifts: number;
+    filled_shifts: number;
+    warning_shifts: number;
+    overload_shifts: number;
+  };
+}
+
+export interface DemandForecastBand {
+  date: string;
+  studies: number;
+  studies_low: number;
+  studies_high: number;
+  up: number;
+  up_low: number;
+  up_high: number;
+}
+
+export interface DemandForecast {
+  date_from: string;
+  date_to: string;
+  history_from: string;
+  history_to: string;
+  interval: number;
+  computed_at: string;
+  modalities: (string | null)[];
+  series: (DemandForecastBand & {
+    modality: string | null;
+    actual_studies: number | null;
+    actual_up: number | null;
+  })[];
+  totals: DemandForecastBand[];
+}
+
+export interface ShiftPlanCoverage {
+  demand_up: number;
+  covered_up: number;
+  uncovered_up: number;
+  coverage_percentage: number;
+  staffed_up: number;
+  idle_up: number;
+  overstaffing_percentage: number;
+  proposed_shifts: number;
+  existing_shifts: number;
+}
+
+export interface ShiftPlan {
+  date_from: string;
+  date_to: string;
+  demand_source: string;
+  doctors: number;
+  schedules: {
+    doctor_id: number;
+    work_date: string;
+    time_start: string;
+    time_end: string;
+    is_day_off: number;
+    planned_up: number;
+    modalities: Record<string, number>;
+  }[];
+  coverage: ShiftPlanCoverage;
+  days: {
+    date: string;
+    demand_up: number;
+    covered_up: number;
+    staffed_up: number;
+    modalities: Record<string, { demand_up: number; covered_up: number }>;
+  }[];
+}
+
 export interface KPICardProps {
   title: string;
   value: string | number;